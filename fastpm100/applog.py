@@ -11,10 +11,23 @@ these log events to file and any any other defined logging location.
 """
 import os
 import sys
+import time
+import Queue
 import logging
+import logging.handlers
 import platform
+import threading
 import traceback
 import multiprocessing
+import multiprocessing.util
+
+from . import profiling
+
+# The MainLogger options are passed to every process in the environment, so
+# the queue handlers of spawned processes on Windows match the parent.
+LEVEL_ENVIRONMENT = "FASTPM100_LOG_LEVEL"
+FLUSH_ENVIRONMENT = "FASTPM100_LOG_FLUSH_INTERVAL"
+RATE_ENVIRONMENT = "FASTPM100_LOG_RATE_LIMIT"
 
 def get_location():
     """ Determine the location to store the log file. Current directory
@@ -59,12 +72,33 @@ def process_log_configure(log_queue):
     """
     root_log = logging.getLogger()
     if "Windows" in platform.platform():
-        queue_handler = QueueHandler(log_queue)
+        queue_handler = create_queue_handler(log_queue)
         root_log.addHandler(queue_handler)
-        root_log.setLevel(logging.DEBUG)
+        root_log.setLevel(configured_level())
 
     root_log.debug("Sub process setup configuration")
 
+def configured_level():
+    """ Return the log level set by the MainLogger, DEBUG by default.
+    """
+    level = os.environ.get(LEVEL_ENVIRONMENT, "DEBUG")
+    if level.isdigit():
+        return int(level)
+    return logging.getLevelName(level.upper())
+
+def create_queue_handler(log_queue):
+    """ Return a QueueHandler with the flush interval and rate limit set by
+    the MainLogger.
+    """
+    flush_interval = float(os.environ.get(FLUSH_ENVIRONMENT, 0.05))
+    queue_handler = QueueHandler(log_queue, flush_interval=flush_interval)
+
+    rate_limit = int(os.environ.get(RATE_ENVIRONMENT, 100))
+    if rate_limit > 0:
+        queue_handler.addFilter(RateLimitFilter(rate_limit))
+
+    return queue_handler
+
 def get_text_from_log():
     """ Mimic the capturelog style of just slurping the entire log
     file contents.
@@ -119,45 +153,246 @@ def explicit_log_close():
 
 
 
+class RateLimitFilter(logging.Filter):
+    """ Pass at most rate records per interval from each logging call, keyed
+    on the logger, level and message format string, and drop the rest. The
+    first record to pass after records were dropped notes how many.
+
+    Records of the exempt loggers, by default the structured event log
+    whose message is the event name, always pass unchanged.
+    """
+    def __init__(self, rate=100, interval=1.0, exempt=("fastpm100.events",)):
+        logging.Filter.__init__(self)
+        self.rate = rate
+        self.interval = interval
+        self.exempt = exempt
+        self.windows = {}
+
+    def filter(self, record):
+        if record.name in self.exempt:
+            return True
+
+        key = (record.name, record.levelno, record.msg)
+        window = self.windows.get(key)
+
+        if window is None or record.created - window[0] >= self.interval:
+            if len(self.windows) > 10000:
+                self.windows.clear()
+            self.windows[key] = [record.created, 1, 0]
+
+            if window is not None and window[2] > 0:
+                record.msg = "%s [%s similar suppressed]" % (record.msg,
+                                                             window[2])
+            return True
+
+        if window[1] < self.rate:
+            window[1] += 1
+            return True
+
+        window[2] += 1
+        return False
+
+
 class QueueHandler(logging.Handler):
     """
-    Copied verbatim from PlumberJack (see above)
+    Based on PlumberJack (see above)
     This is a logging handler which sends events to a multiprocessing queue.
 
-    The plan is to add it to Python 3.2, but this can be copy pasted into
-    user code for use with earlier Python versions.
+    Records are collected and put on the queue as a list every flush_interval
+    seconds, or as soon as capacity records or an ERROR record are waiting,
+    so a busy process pickles one message per batch instead of one per
+    record. Set flush_interval to zero to put each record as it is emitted.
     """
 
-    def __init__(self, log_queue):
+    def __init__(self, log_queue, flush_interval=0.05, capacity=100):
         """
         Initialise an instance, using the passed queue.
         """
         logging.Handler.__init__(self)
         self.log_queue = log_queue
+        self.flush_interval = flush_interval
+        self.capacity = capacity
+
+        self.pid = None
+        self.buffer = []
+
+    def start(self):
+        """ Reset the buffer, lock and flush thread of a forked copy of this
+        handler, which inherits the parent's records and possibly a held
+        lock, but not the thread. Register a stop on exit ahead of the
+        multiprocessing queue finalizer.
+        """
+        self.pid = os.getpid()
+        self.buffer = []
+        self.createLock()
+
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.flush_loop,
+                                       args=(self.stopped,))
+        self.thread.daemon = True
+        self.thread.start()
+
+        multiprocessing.util.Finalize(self, self.stop, exitpriority=20)
+
+    def flush_loop(self, stopped):
+        while not stopped.wait(self.flush_interval):
+            self.flush()
+
+    def stop(self):
+        """ End the flush thread before the interpreter shuts down, then
+        flush the remaining records.
+        """
+        if self.pid != os.getpid():
+            return
+
+        self.pid = None
+        self.stopped.set()
+        self.thread.join(1.0)
+        self.flush()
+
+    def handle(self, record):
+        if self.flush_interval and self.pid != os.getpid():
+            self.start()
+        return logging.Handler.handle(self, record)
+
+    def prepare(self, record):
+        """ Merge the arguments into the message and format the traceback
+        into the record text, as either may not pickle. One record that does
+        not pickle would lose the whole batch.
+        """
+        if record.exc_info:
+            dummy = self.format(record) # just to get traceback text into record.exc_text
+            record.exc_info = None  # not needed any more
+        record.msg = record.getMessage()
+        record.args = None
+        return record
 
     def emit(self, record):
         """
         Emit a record.
 
-        Writes the LogRecord to the queue.
+        Adds the LogRecord to the batch, or writes it to the queue when
+        batching is disabled.
         """
         try:
-            exc_info = record.exc_info
-            if exc_info:
-                dummy = self.format(record) # just to get traceback text into record.exc_text
-                record.exc_info = None  # not needed any more
-            self.log_queue.put_nowait(record)
+            record = self.prepare(record)
+            if not self.flush_interval:
+                self.log_queue.put_nowait(record)
+                return
+
+            self.buffer.append(record)
+            if len(self.buffer) >= self.capacity \
+               or record.levelno >= logging.ERROR:
+                self.flush()
         except (KeyboardInterrupt, SystemExit):
             raise
         except:
             self.handleError(record)
 
+    def flush(self):
+        """ Put the waiting records on the queue as a single list.
+        """
+        self.acquire()
+        try:
+            records = self.buffer
+            self.buffer = []
+            if records:
+                self.log_queue.put_nowait(records)
+        except (KeyboardInterrupt, SystemExit):
+            raise
+        except:
+            print >> sys.stderr, "Problem flushing %s log records" \
+                                 % len(records)
+        finally:
+            self.release()
+
+    def close(self):
+        if self.pid == os.getpid():
+            self.stop()
+        self.buffer = []
+        logging.Handler.close(self)
+
+
+class BufferedFileHandlerMixin(object):
+    """ Write records through the file buffer instead of flushing after
+    each one, flushing at most every flush_interval seconds. The listener
+    calls flush when the queue is idle, so no record waits longer than about
+    flush_interval to reach the disk.
+    """
+    flush_interval = 0.2
+    last_flush = 0.0
+
+    def flush(self):
+        now = time.time()
+        if now - self.last_flush < self.flush_interval:
+            return
+        self.last_flush = now
+        super(BufferedFileHandlerMixin, self).flush()
+
+    def close(self):
+        self.last_flush = 0.0
+        super(BufferedFileHandlerMixin, self).close()
+
+
+class BufferedRotatingFileHandler(BufferedFileHandlerMixin,
+                                  logging.handlers.RotatingFileHandler):
+    """ Roll over to numbered backups when the file reaches max_bytes.
+    """
+
+
+class BufferedTimedRotatingFileHandler(
+        BufferedFileHandlerMixin, logging.handlers.TimedRotatingFileHandler):
+    """ Roll over to dated backups at each interval, see
+    logging.handlers.TimedRotatingFileHandler for the values of when.
+    """
+
+
+def create_file_handler(filename, max_bytes=10 * 1024 * 1024, backup_count=5,
+                        when=None):
+    """ Return a buffered file handler that rotates by size, or by time when
+    when is set. The log of the previous run is rotated to a backup first, so
+    the file only holds the current run as before.
+    """
+    if os.path.exists(filename) and os.path.getsize(filename) > 0 \
+       and backup_count > 0:
+        rollover = logging.handlers.RotatingFileHandler(
+            filename, backupCount=backup_count, delay=True)
+        rollover.doRollover()
+        rollover.close()
+
+    if when is not None:
+        return BufferedTimedRotatingFileHandler(filename, when=when,
+                                                backupCount=backup_count)
+
+    return BufferedRotatingFileHandler(filename, maxBytes=max_bytes,
+                                       backupCount=backup_count)
+
 
 class MainLogger(object):
     """ Sub process that will read logging events off the queue, and handle them
     appropriately.  This is so the main program will never block waiting for a
-    logging event to be handled."""
-    def __init__(self):
+    logging event to be handled.
+
+    Records below the level are discarded in the process that logs them,
+    before they are formatted or pickled. The level, flush interval and rate
+    limit apply to the child processes started afterwards.
+
+    The listener writes to a buffered file handler that keeps backup_count
+    previous logs, rotated at max_bytes or at the interval set by when, and
+    echoes to stdout unless console is False.
+    """
+    def __init__(self, level=logging.DEBUG, flush_interval=0.05,
+                 rate_limit=100, max_bytes=10 * 1024 * 1024, backup_count=5,
+                 when=None, console=True):
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.when = when
+        self.console = console
+
+        os.environ[LEVEL_ENVIRONMENT] = str(level)
+        os.environ[FLUSH_ENVIRONMENT] = str(flush_interval)
+        os.environ[RATE_ENVIRONMENT] = str(rate_limit or 0)
+
         self.log_queue = multiprocessing.Queue(-1)
 
         args = (self.log_queue, self.listener_configurer)
@@ -168,10 +403,10 @@ class MainLogger(object):
 
         # Remember you have to add a local log configurator for each
         # process, including this, the parent process
-        top_handler = QueueHandler(self.log_queue)
+        self.top_handler = create_queue_handler(self.log_queue)
         root_log = logging.getLogger()
-        root_log.addHandler(top_handler)
-        root_log.setLevel(logging.DEBUG)
+        root_log.addHandler(self.top_handler)
+        root_log.setLevel(level)
         root_log.debug("Top level log configuration")
 
     def listener_configurer(self):
@@ -182,43 +417,73 @@ class MainLogger(object):
         log_dir = get_location()
 
         root = logging.getLogger()
-        file_handler = logging.FileHandler(log_dir, 'w') # Overwrite previous run
+        file_handler = create_file_handler(log_dir, self.max_bytes,
+                                           self.backup_count, self.when)
         # Original format string:
         #frmt_str = "%(asctime)s %(processName)-10s ...
         frmt_str = "%(processName)-10s %(name)s %(levelname)-8s %(message)s"
         frmt = logging.Formatter(frmt_str)
         file_handler.setFormatter(frmt)
         root.addHandler(file_handler)
+        self.listener_handlers = [file_handler]
 
         # Specifing stderr as the log output location will cause the creation of
         # a _module_name_.exe.log file when run as a post-freeze windows
         # executable.
-        strm = logging.StreamHandler(sys.stdout)
-        strm.setFormatter(frmt)
-        root.addHandler(strm)
-
+        if self.console:
+            strm = logging.StreamHandler(sys.stdout)
+            strm.setFormatter(frmt)
+            root.addHandler(strm)
+            self.listener_handlers.append(strm)
+
+        # Performance events go to their own json lines file only
+        from . import events
+        event_handler = events.create_event_handler(
+            backup_count=self.backup_count)
+        event_logger = logging.getLogger(events.EVENT_LOGGER)
+        event_logger.propagate = False
+        event_logger.addHandler(event_handler)
+        self.listener_handlers.append(event_handler)
+
+    @profiling.profiled("log_listener")
     def listener_process(self, log_queue, configurer):
         """ This is the listener process top-level loop: wait for logging events
         (LogRecords)on the queue and handle them, quit when you get a None for a
-        LogRecord.
+        LogRecord. Flush the buffered handlers whenever the queue is idle,
+        and close them on exit as this process does not run the logging
+        module shutdown.
         """
         configurer()
         while True:
             try:
-                record = log_queue.get()
+                try:
+                    record = log_queue.get(
+                        timeout=BufferedFileHandlerMixin.flush_interval)
+                except Queue.Empty:
+                    for handler in self.listener_handlers:
+                        handler.flush()
+                    continue
+
                 if record is None: # We send this as a sentinel to tell the listener to quit.
                     break
-                logger = logging.getLogger(record.name)
-                logger.handle(record) # No level or filter logic applied - just do it!
+                if not isinstance(record, list):
+                    record = [record]
+                for item in record:
+                    logger = logging.getLogger(item.name)
+                    logger.handle(item) # No level or filter logic applied - just do it!
             except (KeyboardInterrupt, SystemExit):
                 raise
             except:
                 print >> sys.stderr, 'Whoops! Problem:'
                 traceback.print_exc(file=sys.stderr)
 
+        for handler in self.listener_handlers:
+            handler.close()
+
     def close(self):
         """ Wrapper to add a None poison pill to the listener process queue to
-        ensure it exits.
+        ensure it exits, after the records waiting in this process.
         """
+        self.top_handler.flush()
         self.log_queue.put_nowait(None)
         self.listener.join()
@@ -0,0 +1,505 @@
+""" Measure the throughput and latency of the acquisition and render paths,
+save the results as json and flag regressions against a previous run.
+
+Reads per second and read latency only need the acquisition process. The
+render measurements import PySide when they run, and need a display: use
+QT_QPA_PLATFORM=offscreen where Qt supports it, or run under xvfb-run on
+the Qt4 hosts.
+
+Metric names ending in _per_second are better when higher, all others are
+times that are better when lower.
+"""
+
+import os
+import csv
+import sys
+import json
+import time
+import platform
+import tempfile
+import threading
+import multiprocessing
+
+import numpy
+
+from . import applog, history, ingest, loadgen, lowjitter, procstats, \
+    wrapper
+
+import logging
+log = logging.getLogger(__name__)
+
+PRELOAD_COLUMNS = ["CCD", "Laser Temperature", "Laser Power",
+                   "Yellow Thermistor", "Blue Thermistor", "Amps"]
+
+
+def percentiles(samples):
+    """ Return a dictionary of the median, 95th and 99th percentile and
+    maximum of the samples, in milliseconds.
+    """
+    samples = numpy.asarray(samples) * 1000.0
+    if len(samples) == 0:
+        return {}
+
+    return {"p50_ms": float(numpy.percentile(samples, 50)),
+            "p95_ms": float(numpy.percentile(samples, 95)),
+            "p99_ms": float(numpy.percentile(samples, 99)),
+            "max_ms": float(samples.max())}
+
+
+def get_application():
+    """ Return the running QApplication, creating one if required.
+    """
+    from PySide import QtGui
+    app = QtGui.QApplication.instance()
+    if app is None:
+        app = QtGui.QApplication([])
+    return app
+
+
+def read_latest(sub_proc, timeout=10.0):
+    """ Discard the result waiting on the queue, which may have been read
+    long ago, and return the next one.
+    """
+    sub_proc.read(timeout=timeout)
+    return sub_proc.read(timeout=timeout)
+
+
+def measure_read_rate(log_queue, duration=2.0, device_name="SimulatedPM100",
+                      device_kwargs=None):
+    """ Return the reads per second through a SubProcess, from the read
+    counts reported at the start and end of the duration.
+    """
+    sub_proc = wrapper.SubProcess(log_queue, device_name=device_name,
+                                  device_kwargs=device_kwargs)
+    try:
+        first = read_latest(sub_proc)
+        start_time = time.time()
+        time.sleep(duration)
+
+        last = read_latest(sub_proc)
+        elapsed = time.time() - start_time
+    finally:
+        sub_proc.close()
+
+    return {"reads_per_second": (last[0] - first[0]) / elapsed}
+
+
+def measure_read_latency(log_queue, duration=2.0, history_size=3000,
+                         device_name="SimulatedPM100", render=True):
+    """ Return the percentiles of the time from a read in the acquisition
+    process to the end of setData on a StripWindow curve with the latest
+    sample appended. One sample batches stand in for the latest sample
+    mode, so the read time travels with the value. Set render to False to
+    stop at the queue read, without Qt.
+    """
+    form = None
+    if render:
+        from . import views
+        app = get_application()
+        form = views.StripWindow()
+
+    history = numpy.zeros(history_size)
+    latencies = []
+
+    sub_proc = wrapper.SubProcess(log_queue, device_name=device_name,
+                                  batch_size=1, queue_size=1)
+    try:
+        sub_proc.read(timeout=10.0)
+        start_time = time.time()
+        while time.time() - start_time < duration:
+            result = sub_proc.read()
+            if result is None:
+                continue
+
+            timestamps, values = result[1]
+            history = numpy.roll(history, -1)
+            history[-1] = values[-1, 0]
+            if form is not None:
+                form.curve.setData(history)
+            latencies.append(time.time() - timestamps[-1])
+
+            if form is not None:
+                app.processEvents()
+    finally:
+        sub_proc.close()
+        if form is not None:
+            form.close()
+
+    results = percentiles(latencies)
+    results["samples"] = len(latencies)
+    return results
+
+
+def measure_jitter(log_queue, duration=2.0, device_name="SimulatedPM100",
+                   low_jitter=None):
+    """ Return the distribution of the gaps between reads in the
+    acquisition process from its run report, while every batch is read, with
+    or without the low jitter settings.
+    """
+    sub_proc = wrapper.SubProcess(log_queue, device_name=device_name,
+                                  batch_size=1000, measure_jitter=True,
+                                  low_jitter=low_jitter)
+    try:
+        start_time = time.time()
+        while time.time() - start_time < duration:
+            sub_proc.read(timeout=0.1)
+    finally:
+        sub_proc.close()
+
+    report = sub_proc.report or {}
+    gaps = report.get("gap_ms", {})
+    return {"gap_p50_ms": gaps.get("p50"),
+            "gap_p99_ms": gaps.get("p99"),
+            "gap_p999_ms": gaps.get("p999"),
+            "gap_max_ms": gaps.get("max"),
+            "jitter_ms": report.get("jitter_ms"),
+            "reads_per_second": report.get("reads_per_second")}
+
+
+def measure_backend(log_queue, backend="process", duration=2.0,
+                    device_name="SimulatedPM100", device_kwargs=None):
+    """ Return the time from creating an acquisition backend, see
+    wrapper.create, to its first result, the percentiles of the time from a
+    read to its arrival here, the reads per second, and the memory the
+    backend adds. For the process backend that is the resident size of the
+    acquisition process, which on Linux includes pages still shared with
+    this one after the fork. For the thread backend it is the growth of
+    this process.
+    """
+    memory_before = procstats.memory_usage()
+    start_time = time.time()
+    sub_proc = wrapper.create(log_queue, backend=backend,
+                              device_name=device_name,
+                              device_kwargs=device_kwargs,
+                              batch_size=1, queue_size=1)
+    latencies = []
+    try:
+        result = sub_proc.read(timeout=10.0)
+        startup = time.time() - start_time
+
+        info = result[2]
+        start_time = time.time()
+        while time.time() - start_time < duration:
+            result = sub_proc.read(timeout=1.0)
+            if result is None:
+                continue
+
+            timestamps, values = result[1]
+            latencies.append(time.time() - timestamps[-1])
+            info = result[2]
+
+        memory = info["process"]["memory"]
+        threaded = isinstance(sub_proc, wrapper.ThreadedSubProcess)
+        if threaded and memory is not None:
+            memory -= memory_before
+    finally:
+        sub_proc.close()
+
+    results = percentiles(latencies)
+    results["samples"] = len(latencies)
+    results["startup_ms"] = startup * 1000.0
+    results["memory_bytes"] = memory
+    results["reads_per_second"] = (sub_proc.report or {}).get(
+        "reads_per_second")
+    return results
+
+
+def measure_ingest(log_queue, publishers=12, rate=500, duration=2.0,
+                   port=6700, backend="process"):
+    """ Return the samples per second delivered by a single IngestEngine
+    subscribed to a number of load generators publishing six value
+    messages at the rate each, with the fraction of messages lost.
+    """
+    generators = [loadgen.LoadGenerator(port=port + index, rate=rate,
+                                        seed=index)
+                  for index in range(publishers)]
+    sources = [ingest.ZMQSource("board%s" % index,
+                                "tcp://127.0.0.1:%s" % (port + index))
+               for index in range(publishers)]
+    engine = ingest.IngestEngine(log_queue, sources, backend=backend)
+
+    threads = [threading.Thread(target=generator.run, args=(duration,))
+               for generator in generators]
+    samples = 0
+    try:
+        # Let the subscriptions reach the publishers
+        time.sleep(0.5)
+        for thread in threads:
+            thread.start()
+
+        start_time = time.time()
+        while any([thread.is_alive() for thread in threads]):
+            result = engine.read(timeout=0.1)
+            if result is not None:
+                samples += sum([len(timestamps) for timestamps, values
+                                in result[1].values()])
+        elapsed = time.time() - start_time
+    finally:
+        for thread in threads:
+            thread.join()
+        engine.close()
+        for generator in generators:
+            generator.close()
+
+    sent = sum([generator.sent for generator in generators])
+    return {"samples_per_second": samples / elapsed,
+            "lost_fraction": max(0.0, 1.0 - float(samples) / max(sent, 1))}
+
+
+def measure_render(history_sizes=(300, 3000, 30000), repeats=50):
+    """ Return the milliseconds per setData and repaint of the StripWindow
+    curve and all AllStripWindow curves, at each history size.
+    """
+    from . import views
+    app = get_application()
+
+    random_state = numpy.random.RandomState(0)
+    results = {}
+    for name, window_class in [("strip", views.StripWindow),
+                               ("all", views.AllStripWindow)]:
+        form = window_class()
+        if hasattr(form, "plots"):
+            curves = [curve for plot, curve in form.plots]
+        else:
+            curves = [form.curve]
+
+        for size in history_sizes:
+            data = random_state.normal(60.0, 1.0, size)
+            app.processEvents()
+
+            start_time = time.time()
+            for count in range(repeats):
+                for curve in curves:
+                    curve.setData(data)
+                form.repaint()
+                app.processEvents()
+            elapsed = time.time() - start_time
+
+            results["%s_%s_ms" % (name, size)] = elapsed * 1000.0 / repeats
+
+        form.close()
+
+    return results
+
+
+def write_preload_csv(filename, rows):
+    """ Write a combined log csv file of the specified rows, in the format
+    read by history.load_csv.
+    """
+    header = ["Timestamp"]
+    for column in PRELOAD_COLUMNS:
+        min_name = "%s Min" % column
+        if column in ("Yellow Thermistor", "Blue Thermistor"):
+            min_name = "%s min" % column.replace("Thermistor", "thermistor")
+        header.extend([min_name, "%s Max" % column, "%s Average" % column])
+
+    random_state = numpy.random.RandomState(0)
+    with open(filename, "wb") as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(header)
+        for row in range(rows):
+            values = random_state.normal(30.0, 1.0, len(header) - 1)
+            writer.writerow([row] + ["%0.6f" % val for val in values])
+
+
+def time_load_csv(count, repeats=1):
+    """ Return the fastest of repeats seconds for history.load_csv to parse a
+    generated csv file of count rows.
+    """
+    handle, filename = tempfile.mkstemp(suffix=".csv")
+    os.close(handle)
+    try:
+        write_preload_csv(filename, count)
+
+        elapsed = []
+        for repeat in range(repeats):
+            start_time = time.time()
+            history.load_csv(filename)
+            elapsed.append(time.time() - start_time)
+        return min(elapsed)
+    finally:
+        os.remove(filename)
+
+
+def measure_preload_csv(rows=10000, scale=2, sizes=5, repeats=3,
+                        target_rows=1000000):
+    """ Return the seconds for history.load_csv, as used by
+    AllController.preload_csv, to parse generated csv files of rows, and of
+    scale, scale ** 2 and up to sizes times as many rows, the fastest of
+    repeats parses each. A least squares fit of the power law to all the
+    sizes gives the scaling exponent. The seconds for a million rows are
+    timed directly on target_rows, and only scaled by the exponent if
+    target_rows is not a million.
+    """
+    counts = [rows * scale ** step for step in range(sizes)]
+    times = [time_load_csv(count, repeats) for count in counts]
+    exponent = numpy.polyfit(numpy.log(counts), numpy.log(times), 1)[0]
+
+    target_seconds = time_load_csv(target_rows)
+    per_million = target_seconds * (1e6 / target_rows) ** exponent
+    return {"preload_seconds": times[0],
+            "preload_seconds_scaled": times[-1],
+            "preload_scaling_exponent": float(exponent),
+            "preload_seconds_target": target_seconds,
+            "preload_seconds_per_million_rows": float(per_million)}
+
+
+def measure_history_store(reads=100000, rate=2000.0):
+    """ Return the reads per second into a history store of the three
+    default dashboard views, with bins closed as if reads arrived at rate
+    per second, its memory, and the milliseconds to decimate each view for
+    drawing. The same for a store per view, like one FastPM100 process per
+    window, shows what sharing saves.
+    """
+    specs = [history.parse_view(text) for text in history.DEFAULT_VIEWS]
+    random_state = numpy.random.RandomState(0)
+    readings = random_state.normal(30.0, 1.0, (reads, len(history.CHANNELS)))
+
+    results = {}
+    layouts = [("shared", [specs]), ("separate", [[spec] for spec in specs])]
+    for name, groups in layouts:
+        stores = [history.HistoryStore(group) for group in groups]
+        for store in stores:
+            store.start(0.0)
+
+        start_time = time.time()
+        for count in range(reads):
+            now = count / rate
+            for store in stores:
+                store.add(readings[count])
+                store.update(now)
+        elapsed = time.time() - start_time
+
+        # Fill every level to show the cost of drawing full views
+        for store in stores:
+            for level in store.levels:
+                level.history.extend(random_state.normal(
+                    30.0, 1.0, (len(history.CHANNELS), level.history.size)))
+
+        start_time = time.time()
+        for store in stores:
+            for spec in specs:
+                if spec.interval in store.by_interval:
+                    history.decimate(store.latest(spec.interval, spec.size),
+                                     spec.max_points)
+        decimate_time = time.time() - start_time
+
+        results["%s_reads_per_second" % name] = reads / elapsed
+        results["%s_memory_bytes" % name] = sum([store.nbytes()
+                                                 for store in stores])
+        results["%s_decimate_ms" % name] = decimate_time * 1000.0
+
+    return results
+
+
+def run_all(log_queue, duration=2.0, history_sizes=(300, 3000, 30000),
+            preload_rows=10000, render=True):
+    """ Run every benchmark and return the results with a description of the
+    host. Set render to False to skip the measurements that need Qt.
+    """
+    results = {}
+    results["read_rate"] = measure_read_rate(log_queue, duration)
+    results["read_latency"] = measure_read_latency(log_queue, duration,
+                                                   render=render)
+    results["jitter"] = measure_jitter(log_queue, duration)
+
+    cpu = multiprocessing.cpu_count() - 1
+    low_jitter = lowjitter.LowJitter(cpus=[cpu])
+    results["jitter_low"] = measure_jitter(log_queue, duration,
+                                           low_jitter=low_jitter)
+
+    for backend in ("process", "thread"):
+        results["backend_%s" % backend] = measure_backend(log_queue, backend,
+                                                          duration)
+    results["ingest"] = measure_ingest(log_queue, duration=duration)
+    results["history_store"] = measure_history_store()
+    results["preload_csv"] = measure_preload_csv(preload_rows)
+    if render:
+        results["render"] = measure_render(history_sizes)
+
+    return {"time": time.time(),
+            "host": platform.node(),
+            "platform": platform.platform(),
+            "python": sys.version.split()[0],
+            "numpy": numpy.__version__,
+            "results": results}
+
+
+def save(report, filename):
+    with open(filename, "w") as json_file:
+        json.dump(report, json_file, indent=2, sort_keys=True)
+
+
+def load(filename):
+    with open(filename) as json_file:
+        return json.load(json_file)
+
+
+def compare(baseline, current, tolerance=0.1):
+    """ Return a list of (benchmark, metric, baseline, current) for every
+    metric in both reports that is worse than the baseline by more than the
+    tolerance fraction.
+    """
+    regressions = []
+    for name, metrics in sorted(current["results"].items()):
+        baseline_metrics = baseline["results"].get(name, {})
+        for metric, value in sorted(metrics.items()):
+            if metric == "samples" or metric not in baseline_metrics:
+                continue
+
+            previous = baseline_metrics[metric]
+            if previous is None or value is None:
+                continue
+
+            if metric.endswith("_per_second"):
+                worse = value < previous * (1.0 - tolerance)
+            else:
+                worse = value > previous * (1.0 + tolerance)
+
+            if worse:
+                regressions.append((name, metric, previous, value))
+
+    return regressions
+
+
+def main(argv=None):
+    """ Run the benchmarks, save the results and compare to a baseline.
+    Returns non zero if any regressions are found.
+    """
+    import argparse
+    parser = argparse.ArgumentParser(description="benchmark acquisition"
+                                                 " and render paths")
+    parser.add_argument("-o", "--output", type=str,
+                        default="fastpm100_benchmark.json",
+                        help="Json file to save the results to")
+    parser.add_argument("-b", "--baseline", type=str, default=None,
+                        help="Json results of a previous run to compare to")
+    parser.add_argument("-t", "--tolerance", type=float, default=0.1,
+                        help="Fraction worse than baseline to flag")
+    parser.add_argument("-d", "--duration", type=float, default=2.0,
+                        help="Seconds per acquisition measurement")
+    parser.add_argument("--no-render", action="store_true",
+                        help="Skip the measurements that need Qt")
+    args = parser.parse_args(argv)
+
+    main_logger = applog.MainLogger()
+    try:
+        report = run_all(main_logger.log_queue, args.duration,
+                         render=not args.no_render)
+    finally:
+        main_logger.close()
+
+    save(report, args.output)
+    print json.dumps(report["results"], indent=2, sort_keys=True)
+
+    if args.baseline is None:
+        return 0
+
+    regressions = compare(load(args.baseline), report, args.tolerance)
+    for name, metric, previous, value in regressions:
+        print "Regression %s %s: %0.3f -> %0.3f" % (name, metric, previous,
+                                                   value)
+    return len(regressions) > 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
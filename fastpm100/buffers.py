@@ -0,0 +1,96 @@
+""" A bounded buffer between exactly one producer thread and one consumer
+thread of the same process, without the lock and condition variables of
+Queue.Queue.
+
+Appending to and popping from opposite ends of a collections.deque are
+each atomic under the GIL, and with a single producer the length check
+before an append can't be invalidated by another append, only relieved by
+the consumer. Blocking calls poll instead of waiting on a condition, which
+on Python 2 polls itself, with sleeps of up to 50 ms when given a timeout.
+The polls start FIRST_POLL seconds apart and back off to poll_interval, so
+an item that arrives at once is seen at once, and a long wait wakes up
+about a thousand times a second rather than ten thousand.
+
+The methods follow Queue.Queue and multiprocessing.Queue, so the
+acquisition loop of wrapper.SubProcess runs on either.
+"""
+
+import time
+import Queue
+import collections
+
+import logging
+log = logging.getLogger(__name__)
+
+# Seconds between the first polls of a blocking call
+FIRST_POLL = 0.0001
+
+
+class SingleProducerBuffer(object):
+    """ Hold up to maxsize items, or any number if maxsize is 0. A put on a
+    full buffer raises Queue.Full instead of dropping the oldest item, as
+    the multiprocessing queues do.
+    """
+    def __init__(self, maxsize=0, poll_interval=0.001):
+        super(SingleProducerBuffer, self).__init__()
+        self.maxsize = maxsize
+        self.poll_interval = poll_interval
+        self.items = collections.deque()
+
+    def qsize(self):
+        return len(self.items)
+
+    def empty(self):
+        return not self.items
+
+    def full(self):
+        return self.maxsize > 0 and len(self.items) >= self.maxsize
+
+    def put(self, item, block=True, timeout=None):
+        """ Add the item, waiting up to timeout seconds for room, or
+        forever if None. Raises Queue.Full if there is no room.
+        """
+        if self.full():
+            self.wait(self.full, block, timeout, Queue.Full)
+        self.items.append(item)
+
+    def get(self, block=True, timeout=None):
+        """ Remove and return the oldest item, waiting up to timeout seconds
+        for one, or forever if None. Raises Queue.Empty if there is none.
+        """
+        try:
+            return self.items.popleft()
+        except IndexError:
+            pass
+
+        while True:
+            self.wait(self.empty, block, timeout, Queue.Empty)
+            try:
+                return self.items.popleft()
+            except IndexError:
+                pass
+
+    def put_nowait(self, item):
+        return self.put(item, block=False)
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    def wait(self, condition, block, timeout, exception):
+        """ Poll until the condition is false, raising the exception if it
+        is still true when not blocking or after the timeout. The sleeps
+        between polls double from FIRST_POLL up to poll_interval.
+        """
+        if not block:
+            raise exception
+
+        end_time = None
+        if timeout is not None:
+            end_time = time.time() + timeout
+
+        delay = min(FIRST_POLL, self.poll_interval)
+        while condition():
+            if end_time is not None and time.time() >= end_time:
+                raise exception
+            time.sleep(delay)
+            delay = min(delay * 2, self.poll_interval)
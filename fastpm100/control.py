@@ -1,15 +1,17 @@
 """ Application level controller for demonstration program. Handles data model
 and UI updates with MVC style architecture.
 """
-import csv
 import time
+import functools
+import threading
 import numpy
 import random
 from PySide import QtCore
 
 from collections import deque
 
-from . import views, wrapper
+from . import events, history, ingest, metrics, procstats, profiling, \
+    views, wrapper
 
 import logging
 log = logging.getLogger(__name__)
@@ -23,10 +25,17 @@ class Controller(object):
                  history_size=30, title="FastPM100",
                  geometry=[200, 200, 600, 600],
                  filename=None,
-                 update_time_interval=0):
+                 update_time_interval=0,
+                 device_kwargs=None,
+                 publish_address=None,
+                 metrics_exporter=None,
+                 device_choices=None,
+                 low_jitter=None,
+                 backend="process"):
         log.debug("Control startup")
 
         self.history_size = history_size
+        self.metrics_exporter = metrics_exporter
         self.title = title
         self.geometry = geometry
         self.filename = filename
@@ -40,18 +49,32 @@ class Controller(object):
         self.create_data_model(self.history_size)
         self.create_signals()
 
+        # Devices to offer for switching at runtime
+        if device_choices:
+            self.form.add_device_selector(device_choices, device_name)
+
         self.bind_view_signals()
 
         delay_time = None
-        self.device = wrapper.SubProcess(log_queue,
+        collect_metrics = metrics_exporter is not None
+        self.device = self.create_device(log_queue, backend=backend,
                                          delay_time=delay_time,
-                                         device_name=device_name)
+                                         device_name=device_name,
+                                         device_kwargs=device_kwargs,
+                                         publish_address=publish_address,
+                                         collect_metrics=collect_metrics,
+                                         low_jitter=low_jitter)
         self.total_spectra = 0
 
         self.form.ui.actionContinue.setChecked(True)
 
         self.setup_main_event_loop()
 
+    def create_device(self, log_queue, backend, **kwargs):
+        """ Return the acquisition the event loop reads from.
+        """
+        return wrapper.create(log_queue, backend=backend, **kwargs)
+
     def create_data_model(self, history_size):
         """ Create data structures for application specific storage of reads.
         """
@@ -73,6 +96,22 @@ class Controller(object):
         self.last_reported = 0
         self.last_rend = 0
 
+        # Latest message delivery counters reported by zmq devices
+        self.stream_stats = None
+
+        # Latest resource use reported by the acquisition process
+        self.process_usage = None
+
+        # Render timings of this process, and the time the latest frame was
+        # read and the latest metrics of the acquisition process
+        self.metrics = metrics.Registry()
+        self.frame_read_time = None
+        self.acquisition_metrics = None
+
+        # Summary of a fixed duration run, see start_benchmark
+        self.benchmark_start = None
+        self.benchmark_results = None
+
         self.live_updates = True
 
     def create_signals(self):
@@ -91,6 +130,25 @@ class Controller(object):
         self.form.ui.actionPause.triggered[bool].connect(self.on_pause)
         self.form.ui.actionContinue.triggered[bool].connect(self.on_continue)
 
+        if hasattr(self.form.ui, "comboDevice"):
+            self.form.ui.comboDevice.activated[str].connect(self.switch_device)
+
+    def switch_device(self, device_name, device_kwargs=None):
+        """ Switch the acquisition process to another device, keeping the
+        history on the graph. Returns False if the switch was not requested.
+        """
+        device_name = str(device_name)
+        if device_name == self.device.device_name \
+           and self.device.switch_pending is None:
+            return False
+
+        log.info("Switch device to %s", device_name)
+        if not self.device.switch_device(device_name, device_kwargs):
+            return False
+
+        self.stream_stats = None
+        return True
+
     def setup_main_event_loop(self):
         """ Create a timer for a continuous event loop, trigger the start.
         """
@@ -98,9 +156,18 @@ class Controller(object):
         self.continue_loop = True
         self.main_timer = QtCore.QTimer()
         self.main_timer.setSingleShot(True)
-        self.main_timer.timeout.connect(self.event_loop)
+
+        # Accumulate a profile of every event loop pass when enabled
+        self.profiler = profiling.Profiler("view")
+        if self.profiler.enabled:
+            self.main_timer.timeout.connect(self.profiled_event_loop)
+        else:
+            self.main_timer.timeout.connect(self.event_loop)
         self.main_timer.start(0)
 
+    def profiled_event_loop(self):
+        self.profiler.runcall(self.event_loop)
+
     def event_loop(self):
         """ Process queue events, interface events, then update views.
         """
@@ -109,8 +176,7 @@ class Controller(object):
         if result is not None:
 
             #log.debug("raw frame: %s", result)
-            self.read_frames += 1
-            self.reported_frames = result[0]
+            self.record_frame(result)
 
             if len(self.current) >= self.size:
                 self.current = numpy.roll(self.current, -1)
@@ -125,21 +191,60 @@ class Controller(object):
         if self.continue_loop:
             self.main_timer.start(self.update_time_interval)
 
+    def record_frame(self, result):
+        """ Update the frame counters and supplementary device information
+        from a result read off the sub process.
+        """
+        self.read_frames += 1
+        self.reported_frames = result[0]
+
+        stream = result[2].get("stream")
+        if stream is not None:
+            self.stream_stats = stream
+
+        usage = result[2].get("process")
+        if usage is not None:
+            self.process_usage = usage
+
+        self.frame_read_time = result[2].get("read_time")
+        acquisition_metrics = result[2].get("metrics")
+        if acquisition_metrics is not None:
+            self.acquisition_metrics = acquisition_metrics
+
+    def set_curve_data(self, name, curve, data, **kwargs):
+        """ Update the data of a curve, recording how long it took.
+        """
+        start_time = time.time()
+        curve.setData(data, **kwargs)
+        self.metrics.observe("set_data_%s" % name, time.time() - start_time)
+
+    def record_render(self, render_start):
+        """ Record the duration of a render_graph call, and the time from the
+        read of the frame it shows to the end of the render.
+        """
+        now = time.time()
+        self.metrics.observe("render", now - render_start)
+        if self.frame_read_time is not None:
+            self.metrics.observe("read_to_render", now - self.frame_read_time)
+            self.frame_read_time = None
+
     def render_graph(self):
         """ Update the graph data, indicate minimum and maximum values.
         """
         if not self.live_updates:
             return
 
-        self.form.curve.setData(self.current)
+        render_start = time.time()
+        self.set_curve_data("power", self.form.curve, self.current)
 
         if len(self.current) > 0:
-            min_text = "%0.3f mw" % numpy.min(self.current)
-            max_text = "%0.3f mw" % numpy.max(self.current)
+            min_text = "%0.3f mw" % numpy.nanmin(self.current)
+            max_text = "%0.3f mw" % numpy.nanmax(self.current)
             self.form.ui.labelMinimum.setText(min_text)
             self.form.ui.labelMaximum.setText(max_text)
 
         self.total_rend += 1
+        self.record_render(render_start)
 
     def update_performance_metrics(self):
         """ Compute the data frames per second and render frames per second,
@@ -166,6 +271,21 @@ class Controller(object):
             sfu.labelRenderFPS.setText("%s" % rend_per_second)
             sfu.labelSkipFPS.setText("%s" % skip_per_second)
 
+            self.form.ui.labelState.setText(self.device.poll_state())
+            self.show_device()
+
+            if self.stream_stats is not None:
+                self.update_stream_metrics()
+
+            self.metrics.set_gauge("data_fps", data_per_second)
+            self.metrics.set_gauge("render_fps", rend_per_second)
+            self.metrics.set_gauge("skip_fps", skip_per_second)
+            events.emit("view", data_fps=data_per_second,
+                        render_fps=rend_per_second,
+                        skip_fps=skip_per_second)
+            if self.metrics_exporter is not None:
+                self.export_metrics()
+
             self.second_time = time.time()
             self.last_reported = self.reported_frames
             self.last_rend = self.total_rend
@@ -173,11 +293,127 @@ class Controller(object):
 
         self.start_time = time.time()
 
+    def show_device(self):
+        """ Select the device the acquisition process reads from in the
+        device list, such as the previous one after a failed switch.
+        """
+        combo = getattr(self.form.ui, "comboDevice", None)
+        if combo is None or self.device.switch_pending is not None:
+            return
+
+        index = combo.findText(self.device.device_name)
+        if index >= 0 and index != combo.currentIndex():
+            combo.setCurrentIndex(index)
+
+    def update_stream_metrics(self):
+        """ Show the message delivery and reconnect counters, latency and
+        memory use reported by zmq devices, along with the memory use of
+        this process.
+        """
+        stats = self.stream_stats
+        sfu = self.form.ui
+        sfu.labelLost.setText("%s" % stats["lost"])
+        sfu.labelDuplicate.setText("%s" % stats["duplicated"])
+        sfu.labelOutOfOrder.setText("%s" % stats["out_of_order"])
+        sfu.labelReconnect.setText("%s" % stats["reconnects"])
+
+        if stats["latency"] is not None:
+            sfu.labelLatency.setText("%0.1f/%0.1f ms"
+                                     % (stats["latency"],
+                                        stats["latency_max"]))
+
+        view_memory = procstats.memory_usage()
+        if view_memory is not None and stats["memory"] is not None:
+            sfu.labelMemory.setText("%d/%d MB" % (view_memory / 1e6,
+                                                  stats["memory"] / 1e6))
+
+    def export_metrics(self):
+        """ Export the metrics of this process, and the latest reported by
+        the acquisition process.
+        """
+        self.metrics.set_gauge("memory", procstats.memory_usage())
+        self.metrics.set_gauge("cpu_time", procstats.cpu_time())
+
+        snapshots = {"view": self.metrics.snapshot()}
+        if self.acquisition_metrics is not None:
+            snapshots["acquisition"] = self.acquisition_metrics
+        self.metrics_exporter.export(snapshots)
+
+    def start_benchmark(self, duration):
+        """ Run for the duration in seconds, then store the average data,
+        render and skip rates, cpu use and peak memory of each process in
+        benchmark_results, log them and close.
+        """
+        log.info("Benchmark for %s seconds", duration)
+        self.benchmark_start = {"time": time.time(),
+                                "reported": self.reported_frames,
+                                "rend": self.total_rend,
+                                "cpu_time": procstats.cpu_time(),
+                                "process": self.process_usage}
+
+        self.benchmark_timer = QtCore.QTimer()
+        self.benchmark_timer.setSingleShot(True)
+        self.benchmark_timer.timeout.connect(self.finish_benchmark)
+        self.benchmark_timer.start(int(duration * 1000))
+
+    def finish_benchmark(self):
+        """ Compute the benchmark results since start_benchmark, then close.
+        The acquisition is closed first, for the acquisition cpu and memory
+        to come from the usage in its run report at exit. They are None on
+        the thread backend, where the acquisition shares the view's process.
+        """
+        start = self.benchmark_start
+        elapsed = time.time() - start["time"]
+
+        data_fps = (self.reported_frames - start["reported"]) / elapsed
+        render_fps = (self.total_rend - start["rend"]) / elapsed
+
+        view_cpu = procstats.cpu_time() - start["cpu_time"]
+        results = {"device": self.device.device_name,
+                   "duration": elapsed,
+                   "data_fps": data_fps,
+                   "render_fps": render_fps,
+                   "skip_fps": data_fps - render_fps,
+                   "cpu_percent": {"view": 100.0 * view_cpu / elapsed,
+                                   "acquisition": None},
+                   "peak_memory": {"view": procstats.peak_memory_usage(),
+                                   "acquisition": None}}
+
+        self.device.close()
+
+        usage = None
+        if self.device.report is not None:
+            usage = self.device.report.get("usage")
+        if usage is not None and self.acquisition_in_process():
+            # The usage at the start is refreshed once per second, so take
+            # the rate over the times of the samples rather than elapsed
+            start_usage = start["process"]
+            if start_usage is None:
+                start_usage = {"time": start["time"], "cpu_time": 0.0}
+            acquisition_cpu = usage["cpu_time"] - start_usage["cpu_time"]
+            cpu_elapsed = usage["time"] - start_usage["time"]
+            results["cpu_percent"]["acquisition"] = \
+                100.0 * acquisition_cpu / cpu_elapsed
+            results["peak_memory"]["acquisition"] = usage["peak_memory"]
+
+        self.benchmark_results = results
+        log.info("Benchmark results: %s", results)
+        self.close()
+
+    def acquisition_in_process(self):
+        """ Return True if the acquisition runs in a process of its own,
+        so its resource use is separate from the view's.
+        """
+        return not isinstance(self.device.proc, threading.Thread)
+
     def close(self):
         """ Issue control commands to the sub process device, as well as the qt
         view.  """
         self.continue_loop = False
         self.device.close()
+        if self.metrics_exporter is not None:
+            self.metrics_exporter.close()
+        self.profiler.dump()
         log.debug("Control level close")
         self.control_exit_signal.exit.emit("Control level close")
 
@@ -233,8 +469,7 @@ class DualController(Controller):
         if result is not None:
             #print "raw result: ", result
 
-            self.read_frames += 1
-            self.reported_frames = result[0]
+            self.record_frame(result)
 
             if len(self.current) >= self.size:
                 self.current = numpy.roll(self.current, -1)
@@ -258,16 +493,22 @@ class DualController(Controller):
         if not self.live_updates:
             return
 
-        self.form.curve.setData(self.current)
-        self.form.curve_two.setData(self.second)
+        render_start = time.time()
+
+        # Break the lines at the NaN gaps of zmq receive timeouts
+        self.set_curve_data("power", self.form.curve, self.current,
+                            connect="finite")
+        self.set_curve_data("temperature", self.form.curve_two, self.second,
+                            connect="finite")
 
         if len(self.current) > 0:
-            min_text = "%0.3f mw" % numpy.min(self.current)
-            max_text = "%0.3f mw" % numpy.max(self.current)
+            min_text = "%0.3f mw" % numpy.nanmin(self.current)
+            max_text = "%0.3f mw" % numpy.nanmax(self.current)
             self.form.ui.labelMinimum.setText(min_text)
             self.form.ui.labelMaximum.setText(max_text)
 
         self.total_rend += 1
+        self.record_render(render_start)
 
 
 class AllController(Controller):
@@ -316,78 +557,24 @@ class AllController(Controller):
     def preload_csv(self, filename, interval, size):
         """ Assumes csv file is update every 10 seconds.
         """
-        log.info("Attempting to open: %s", filename)
-
-        # if 10 second gaps for 1 day:
-        # read every entry, if total size of temp arr is greater than 8640
-        # slice off the last 8640, put in current array
-        total_rows = 0
-        with open(filename) as csv_file:
-            combined_reader = csv.DictReader(csv_file, delimiter=",")
-            for row in combined_reader:
-
-                # Smooth graphs with average
-                self.hist_assign(row, name="Average")
-                total_rows += 1
-
-        log.info("Read %s rows ", total_rows)
+        # Parse every row into one array, then keep a row per channel
+        block = history.load_csv(filename, name="Average")
+        self.hist = [row for row in block]
 
         # Assumes that if you specify 8640 10 second readings, you want one day
         # of data
         if interval == 10000 and size == 8640:
             log.info("Displaying last 8640 readings (one day)")
-
-            self.hist[0] = self.hist[0][-8640:]
-            self.hist[1] = self.hist[1][-8640:]
-            self.hist[2] = self.hist[2][-8640:]
-            self.hist[3] = self.hist[3][-8640:]
-            self.hist[4] = self.hist[4][-8640:]
-            self.hist[5] = self.hist[5][-8640:]
+            self.hist = [row[-8640:] for row in self.hist]
 
         # Assumes that if you specify 144000 60 second readings, you want 100
         # days of data
         if interval == 60000 and size == 144000:
             log.info("Displaying last 144000 readings (100 days)")
-            self.hist[0] = self.hist[0][0::6]
-            self.hist[1] = self.hist[1][0::6]
-            self.hist[2] = self.hist[2][0::6]
-            self.hist[3] = self.hist[3][0::6]
-            self.hist[4] = self.hist[4][0::6]
-            self.hist[5] = self.hist[5][0::6]
-
+            self.hist = [row[0::6] for row in self.hist]
 
         self.render_graph()
 
-    def hist_assign(self, row, name="Average"):
-        """ Assign the various min, max, or average values
-        """
-        self.hist[0] = numpy.append(self.hist[0],
-                                    float(row["CCD %s" % name]))
-
-        self.hist[1] = numpy.append(self.hist[1],
-                                    float(row["Laser Temperature %s" % name]))
-
-        self.hist[2] = numpy.append(self.hist[2],
-                                    float(row["Laser Power %s" % name]))
-
-        if name == "Min":
-            # CSV file header has lower case thermistor for min
-            self.hist[3] = numpy.append(self.hist[3],
-                                        float(row["Yellow thermistor min"]))
-
-            self.hist[4] = numpy.append(self.hist[4],
-                                        float(row["Blue thermistor min"]))
-
-        else:
-            self.hist[3] = numpy.append(self.hist[3],
-                                        float(row["Yellow Thermistor %s" % name]))
-
-            self.hist[4] = numpy.append(self.hist[4],
-                                        float(row["Blue Thermistor %s" % name]))
-
-        self.hist[5] = numpy.append(self.hist[5],
-                                    float(row["Amps %s" % name]))
-
     def bind_custom_actions(self):
         """ Toggle the display of graph curve items when the action buttons are
         checked in the action bar.
@@ -458,8 +645,7 @@ class AllController(Controller):
         if result is not None:
             #print "raw result: ", result
 
-            self.read_frames += 1
-            self.reported_frames = result[0]
+            self.record_frame(result)
             #log.debug("Frame: %s", result)
 
             hist_count = 0
@@ -512,7 +698,8 @@ class AllController(Controller):
         #log.info("update history")
         hist_count = 0
         for item in self.hist:
-            local_avg = numpy.average(self.local[hist_count])
+            # Ignore the NaN gaps of zmq receive timeouts in the average
+            local_avg = numpy.nanmean(self.local[hist_count])
 
             temp_array = self.hist[hist_count]
             if len(temp_array) >= self.history_size:
@@ -538,38 +725,278 @@ class AllController(Controller):
         if not self.live_updates:
             return
 
-        # display order is different then recording order
+        render_start = time.time()
+
+        # display order is different then recording order. Break the lines
+        # at the NaN gaps of zmq receive timeouts.
         # display zero is collection 2 (laser power)
         curve = self.form.plots[0][1]
-        curve.setData(self.hist[2])
+        self.set_curve_data("laser_power", curve, self.hist[2],
+                            connect="finite")
 
         # Display one is collection 1 (laser temperature)
         curve = self.form.plots[1][1]
-        curve.setData(self.hist[1])
+        self.set_curve_data("laser_temperature", curve, self.hist[1],
+                            connect="finite")
 
         # Display two is collection 0 (ccd temperature)
         curve = self.form.plots[2][1]
-        curve.setData(self.hist[0])
+        self.set_curve_data("ccd_temperature", curve, self.hist[0],
+                            connect="finite")
 
         # Display three is collection three (yellow therm)
         curve = self.form.plots[3][1]
-        curve.setData(self.hist[3])
+        self.set_curve_data("yellow_therm", curve, self.hist[3],
+                            connect="finite")
 
         # Display four is collection four (blue therm)
         curve = self.form.plots[4][1]
-        curve.setData(self.hist[4])
+        self.set_curve_data("blue_therm", curve, self.hist[4],
+                            connect="finite")
 
         # Display five is collection five (amps)
         curve = self.form.plots[5][1]
-        curve.setData(self.hist[5])
+        self.set_curve_data("amps", curve, self.hist[5], connect="finite")
 
 
         current_array = self.hist[2] # collection 2 is laser power
         if len(current_array) > 0:
-            min_text = "%0.3f mw" % numpy.min(current_array)
-            max_text = "%0.3f mw" % numpy.max(current_array)
+            min_text = "%0.3f mw" % numpy.nanmin(current_array)
+            max_text = "%0.3f mw" % numpy.nanmax(current_array)
             self.form.ui.labelMinimum.setText(min_text)
             self.form.ui.labelMaximum.setText(max_text)
 
         self.total_rend += 1
+        self.record_render(render_start)
+
+
+
+class DashboardView(object):
+    """ One window of a DashboardController, with the curve toggles of the
+    all data display.
+    """
+    def __init__(self, spec):
+        super(DashboardView, self).__init__()
+        self.spec = spec
+        self.form = views.AllStripWindow(title=spec.title,
+                                         geometry=spec.geometry)
+
+        ui = self.form.ui
+        actions = [ui.actionLaser_Power, ui.actionLaser_Temp,
+                   ui.actionCCD_Temp, ui.actionYellow_Therm,
+                   ui.actionBlue_Therm, ui.actionAmps]
+        for index, action in enumerate(actions):
+            action.setChecked(True)
+            action.triggered[bool].connect(functools.partial(
+                self.toggle_curve, index))
+
+        ui.actionContinue.setChecked(True)
+        self.live_updates = True
+
+    def toggle_curve(self, index, action):
+        log.debug("Action %s, index: %s", action, index)
+        if action == False:
+            self.form.plots[index][1].hide()
+        else:
+            self.form.plots[index][1].show()
+
+
+class DashboardController(Controller):
+    """ Show several views of the all data display, such as the last 3000
+    reads, one day of ten second averages and 100 days of one minute
+    averages, over a single acquisition process and a single
+    history.HistoryStore. Each view draws its own level of the store,
+    decimated to its max_points.
+
+    Specify ingest sources to read them all with an ingest.IngestEngine
+    instead of the device, with a HistoryStore per source. Each view shows
+    the source named by its spec, the first source by default. The rows of
+    the sources are in the recording order of history.CHANNELS.
+    """
+    # Display order of the curves, as indexes of the recording order
+    display_channels = [2, 1, 0, 3, 4, 5]
+    curve_names = ["laser_power", "laser_temperature", "ccd_temperature",
+                   "yellow_therm", "blue_therm", "amps"]
+
+    def __init__(self, log_queue, view_specs=None, preload_interval=10000,
+                 sources=None, **kwargs):
+        if not view_specs:
+            view_specs = [history.parse_view(text)
+                          for text in history.DEFAULT_VIEWS]
+        kwargs.setdefault("device_name", "AllValueZMQ")
+
+        self.sources = sources
+        self.default_source = None
+        if sources:
+            self.default_source = sources[0].name
+
+        names = [source.name for source in sources or []]
+        for spec in view_specs:
+            if spec.source is not None and spec.source not in names:
+                raise ValueError("Unknown source %s of %s, use one of %s"
+                                 % (spec.source, spec, names))
+
+        self.dashboard_views = []
+        super(DashboardController, self).__init__(log_queue, **kwargs)
+        log.debug("Dashboard startup: %s", view_specs)
+
+        self.stores = {}
+        for name in names or [None]:
+            specs = [spec for spec in view_specs
+                     if self.view_source(spec) == name]
+            if specs:
+                self.stores[name] = history.HistoryStore(specs)
+
+        # The csv log is of the device, or of the first source
+        self.store = self.stores.get(self.default_source)
+        if self.filename != None and self.store is not None:
+            self.store.preload(history.load_csv(self.filename),
+                               preload_interval)
+
+        self.dashboard_views = [DashboardView(spec) for spec in view_specs]
+        self.form = self.dashboard_views[0].form
+
+        self.create_signals()
+        self.bind_view_signals()
+
+        for view in self.dashboard_views:
+            self.render_view(view)
+
+    def create_device(self, log_queue, backend, **kwargs):
+        """ Return an ingest.IngestEngine of the sources if specified,
+        otherwise the acquisition of the device.
+        """
+        if not self.sources:
+            return super(DashboardController, self).create_device(
+                log_queue, backend, **kwargs)
+
+        if backend != "thread":
+            backend = "process"
+        return ingest.IngestEngine(log_queue, self.sources, backend=backend)
+
+    def view_source(self, spec):
+        if spec.source is None:
+            return self.default_source
+        return spec.source
+
+    def bind_view_signals(self):
+        """ Connect the signals of every window. Closing any of them closes
+        the dashboard, and pause and continue apply to that window only.
+        """
+        for view in self.dashboard_views:
+            ui = view.form.ui
+            view.form.exit_signal.exit.connect(self.close)
+            ui.actionPause.triggered[bool].connect(
+                functools.partial(self.on_view_pause, view))
+            ui.actionContinue.triggered[bool].connect(
+                functools.partial(self.on_view_continue, view))
+
+    def on_view_continue(self, view, action):
+        log.info("Continue live updates of %s", view.spec)
+        if action == False:
+            view.form.ui.actionContinue.setChecked(True)
+
+        view.form.ui.actionPause.setChecked(False)
+        view.live_updates = True
+        self.render_view(view)
+
+    def on_view_pause(self, view, action):
+        log.info("Pause live updates of %s: %s", view.spec, action)
+        if action == False:
+            view.form.ui.actionPause.setChecked(True)
+
+        view.form.ui.actionContinue.setChecked(False)
+        view.live_updates = False
+
+    def event_loop(self):
+        """ Add the latest read, or batches of the ingest sources, to the
+        stores, close the bins of any elapsed intervals, then render the
+        views of the levels that changed.
+        """
+        changed = dict([(name, []) for name in self.stores])
+        result = self.device.read()
+        if result is not None and self.sources:
+            self.record_batches(result)
+            for name, (timestamps, values) in result[1].items():
+                store = self.stores.get(name)
+                if store is None:
+                    continue
+                if values.shape[1] != len(history.CHANNELS):
+                    log.warning("Skip %s rows of %s, expected %s values",
+                                len(values), name, len(history.CHANNELS))
+                    continue
+                if store.add_rows(values):
+                    changed[name].append(0)
+        elif result is not None:
+            self.record_frame(result)
+            if self.store.add(result[1]):
+                changed[None].append(0)
+
+        for name, store in self.stores.items():
+            changed[name].extend(store.update())
+        for view in self.dashboard_views:
+            if view.spec.interval in changed[self.view_source(view.spec)]:
+                self.render_view(view)
+
+        self.update_performance_metrics()
+
+        if self.continue_loop:
+            self.main_timer.start(0)
+
+    def record_batches(self, result):
+        """ Update the frame counters with the samples of an
+        ingest.IngestEngine result, see record_frame.
+        """
+        samples = sum([len(timestamps)
+                       for timestamps, values in result[1].values()])
+        self.read_frames += samples
+        self.reported_frames += samples
+
+        info = result[2]
+        if info.get("process") is not None:
+            self.process_usage = info["process"]
+        self.frame_read_time = info.get("read_time")
+
+    def render_graph(self):
+        for view in self.dashboard_views:
+            self.render_view(view)
+
+    def render_view(self, view):
+        """ Update the curves of a view with the latest values of its level,
+        indicate the minimum and maximum laser power.
+        """
+        if not view.live_updates:
+            return
+
+        render_start = time.time()
+
+        store = self.stores[self.view_source(view.spec)]
+        latest = store.latest(view.spec.interval, view.spec.size)
+        positions, values = history.decimate(latest, view.spec.max_points)
+
+        # Break the lines at the NaN gaps of zmq receive timeouts
+        for index, channel in enumerate(self.display_channels):
+            curve = view.form.plots[index][1]
+            self.set_curve_data(self.curve_names[index], curve,
+                                values[channel], x=positions,
+                                connect="finite")
+
+        power = values[2]
+        if len(power) > 0 and not numpy.isnan(power).all():
+            min_text = "%0.3f mw" % numpy.nanmin(power)
+            max_text = "%0.3f mw" % numpy.nanmax(power)
+            view.form.ui.labelMinimum.setText(min_text)
+            view.form.ui.labelMaximum.setText(max_text)
+
+        self.total_rend += 1
+        self.record_render(render_start)
+
+    def close(self):
+        """ Close every window along with the acquisition process, once.
+        """
+        if not self.continue_loop:
+            return
 
+        super(DashboardController, self).close()
+        for view in self.dashboard_views:
+            view.form.close()
@@ -3,65 +3,275 @@ with simulated delays for simulated spectrometer readings. Long-polling
 multiprocessing wrappers.
 """
 
+import os
 import sys
 import time
 import logging
 import platform
 
 import zmq
-import visa
+import numpy
+import pyvisa as visa
 import serial
 
 from ThorlabsPM100 import ThorlabsPM100, USBTMC
 
+from . import discovery, events, procstats, zmqstream
+
 log = logging.getLogger(__name__)
 
+# Errors of the USBTMC file, serial port, VISA session or zmq socket that
+# a reopen of the device may recover from, such as an unplugged meter
+CONNECTION_ERRORS = (EnvironmentError, serial.SerialException,
+                     visa.VisaIOError, zmq.ZMQError)
+
+# Errors parsing a single bad response, where the next read may succeed
+DATA_ERRORS = (ValueError, IndexError)
+
+
+def classify_error(exc):
+    """ Return "connection" for errors where reopening the device may
+    recover, "data" for a bad single reading, and "fatal" for anything
+    else, such as a programming error.
+    """
+    if isinstance(exc, CONNECTION_ERRORS):
+        return "connection"
+    if isinstance(exc, DATA_ERRORS):
+        return "data"
+    return "fatal"
+
 
 class ThorlabsMeter(object):
     """ Create a simulated laser power output meter.
+
+    Averaging count, power range and auto-range are written to the meter
+    once at startup and cached on the host, so they are never re-queried
+    during acquisition. Set pipelined to True to issue the next
+    measurement request as soon as the current result is transferred,
+    which overlaps the next conversion with the parsing and queueing of
+    the current one.
+
+    The backend defaults to USBTMC on linux and VISA everywhere else.
+    Specify backend="visa" with a visa_library such as
+    "tests/pm100_sim.yaml@sim" to run against a simulated resource.
+
+    Select one of several meters with serial_number, or open a known
+    USBTMC node or VISA resource name directly with address, as filled in
+    by discovery.resolve.
     """
-    def __init__(self):
+    # Reads wait on USB transfers, see wrapper.backend_class
+    releases_gil = True
+
+    def __init__(self, wavelength=785.0, average_count=None,
+                 power_range=None, auto_range=None, pipelined=False,
+                 serial_number=None, backend=None, visa_library=None,
+                 address=None):
         super(ThorlabsMeter, self).__init__()
         log.debug("%s setup", self.__class__.__name__)
 
-        if "Linux" in platform.platform():
+        self.pipelined = pipelined
+        self.initiated = False
+        self.settings = {}
+
+        if backend is None:
+            backend = "visa"
+            if "Linux" in platform.platform():
+                backend = "usbtmc"
+
+        if backend == "usbtmc":
             self.linux = True
-            self.power_meter = self.create_usbtmc()
+            self.power_meter = self.create_usbtmc(serial_number, address)
         else:
             self.linux = False
-            self.power_meter = self.create_visa()
+            self.power_meter = self.create_visa(serial_number,
+                                                visa_library, address)
+
+        self.configure(wavelength=wavelength,
+                       average_count=average_count,
+                       power_range=power_range,
+                       auto_range=auto_range)
 
-    def create_visa(self):
+        if self.pipelined:
+            self.initiate()
+
+    def create_visa(self, serial_number=None, visa_library=None,
+                    address=None):
         """ Use VISA to create a connection to the thorlabs pm100usb
         power meter on windows. See FastPM100/Readme.md for details on
-        setup.
+        setup. The serial number is part of the USB resource name, e.g.
+        USB0::0x1313::0x8072::P2000343::INSTR, use it to pick one meter
+        out of several. Without either, the first Thorlabs resource is
+        opened.
         """
-        resource_man = visa.ResourceManager()
-        dev_list = resource_man.list_resources()
-        log.debug("Dev list %s", dev_list)
-
-        device = resource_man.open_resource(dev_list[0])
+        resource_man = discovery.resource_manager(visa_library)
+
+        if address is None:
+            dev_list = discovery.list_visa(resource_man)
+            log.debug("Dev list %s", dev_list)
+
+            if serial_number is not None:
+                dev_list = [name for name in dev_list
+                            if "::%s::" % serial_number in name]
+                if not dev_list:
+                    log.critical("No visa device with serial %s",
+                                 serial_number)
+                    raise ValueError("No visa device with serial %s"
+                                     % serial_number)
+
+            if not dev_list:
+                raise IOError("No Thorlabs visa device found")
+            address = dev_list[0]
+
+        device = resource_man.open_resource(address)
+        device.read_termination = "\n"
+        device.write_termination = "\n"
         log.debug("Created visa device: %s", device)
 
         return device
 
-    def create_usbtmc(self):
+    def close(self):
+        """ Release the meter, so it can be opened again by this or another
+        process.
+        """
+        if self.linux:
+            os.close(self.inst.FILE)
+        else:
+            self.power_meter.close()
+
+    def create_usbtmc(self, serial_number=None, address=None):
         """ Use USBTMC to create a connection to the thorlabs pm100usb
-        on linux.
+        on linux. The device nodes don't carry the serial number, so all
+        of them are identified to pick one meter out of several. Without
+        either, the first node is opened.
         """
-        self.inst = USBTMC(device="/dev/usbtmc0")
+        if address is None:
+            address = self.find_usbtmc(serial_number)
+
+        log.debug("Open usbtmc node %s", address)
+        self.inst = USBTMC(device=address)
         power_meter = ThorlabsPM100(inst=self.inst)
-        power_meter.sense.correction.wavelength = 785.0
         return power_meter
 
+    def find_usbtmc(self, serial_number=None):
+        """ Return the USBTMC node of the meter with the serial number, or
+        the first node if None.
+        """
+        if serial_number is None:
+            nodes = discovery.list_usbtmc()
+            if not nodes:
+                return "/dev/usbtmc0"
+            return nodes[0]
+
+        meter = discovery.find(discovery.discover(backend="usbtmc"),
+                               serial_number)
+        if meter is None:
+            log.critical("No usbtmc device with serial %s", serial_number)
+            raise ValueError("No usbtmc device with serial %s"
+                             % serial_number)
+        return meter["address"]
+
+    def configure(self, wavelength=None, average_count=None,
+                  power_range=None, auto_range=None):
+        """ Write the specified measurement settings to the meter. Values
+        of None are left untouched, and values that match the host side
+        cache are not sent again. Specifying a power range in watts turns
+        off auto-range, as the meter would otherwise ignore it.
+
+        A conversion initiated by the pipelined cycle is fetched and
+        discarded first, as its result was measured with the previous
+        settings and would be read as the reply to the next query. The
+        cycle starts again after the settings are written.
+        """
+        if power_range is not None:
+            auto_range = False
+
+        requested = [("wavelength", wavelength),
+                     ("average_count", average_count),
+                     ("auto_range", auto_range),
+                     ("power_range", power_range)]
+        changes = [(name, value) for name, value in requested
+                   if value is not None and self.settings.get(name) != value]
+        if not changes:
+            return self.settings
+
+        pending = self.initiated
+        if pending:
+            log.debug("Discard the pending result before changing settings")
+            self.fetch_pending()
+
+        for name, value in changes:
+            log.debug("Set %s to %s", name, value)
+            self.write_setting(name, value)
+            self.settings[name] = value
+
+        if pending:
+            self.initiate()
+        return self.settings
+
+    def write_setting(self, name, value):
+        """ Send a single measurement setting to the meter with the
+        ThorlabsPM100 interface on linux, or plain SCPI over VISA.
+        """
+        if self.linux:
+            sense = self.power_meter.sense
+            if name == "wavelength":
+                sense.correction.wavelength = value
+            elif name == "average_count":
+                sense.average.count = value
+            elif name == "auto_range":
+                sense.power.dc.range.auto = int(value)
+            elif name == "power_range":
+                sense.power.dc.range.upper = value
+            return
+
+        commands = {"wavelength": "SENS:CORR:WAV %s",
+                    "average_count": "SENS:AVER:COUN %d",
+                    "auto_range": "SENS:POW:RANG:AUTO %d",
+                    "power_range": "SENS:POW:RANG:UPP %s"}
+        self.power_meter.write(commands[name] % value)
+
+    def initiate(self):
+        """ Start the next conversion on the meter without waiting for the
+        result. Used to prime and continue the pipelined cycle: INIT on
+        USBTMC, or an unanswered MEAS:POW? on VISA.
+        """
+        if self.linux:
+            self.power_meter.initiate.immediate()
+        else:
+            self.power_meter.write("MEAS:POW?")
+        self.initiated = True
+
+    def fetch_pending(self):
+        """ Return the raw result of the last initiated conversion.
+        """
+        if self.linux:
+            result = self.power_meter.fetch
+        else:
+            result = self.power_meter.read()
+
+        self.initiated = False
+        return result
+
+    def fetch(self):
+        """ Return the raw result of the last initiated conversion, then
+        immediately start the next one before the result is parsed.
+        """
+        result = self.fetch_pending()
+        self.initiate()
+        return result
+
     def read(self):
         """ Perform the expected USBTMC or visa acquisition from the device.
         """
+        if self.pipelined:
+            result = self.fetch()
+            return float(result) * 1000.0
+
         if self.linux:
             result = float(self.power_meter.read) * 1000.0
             return result
         else:
-            result = self.power_meter.ask("MEAS:POW?\n")
+            result = self.power_meter.query("MEAS:POW?")
             result = float(result) * 1000.0
             return float(result)
 
@@ -89,40 +299,401 @@ class SimulatedPM100(object):
         """
         return self.increment_counter()
 
+class SimulatedUnplugPM100(SimulatedPM100):
+    """ A simulated meter that is unplugged while the unplug_file exists:
+    reads and opens raise IOError, as the USBTMC file of a real meter does.
+    Remove the file to plug it back in.
+    """
+    def __init__(self, unplug_file, sleep_factor=0.001):
+        if os.path.exists(unplug_file):
+            raise IOError("No meter at %s" % unplug_file)
+
+        super(SimulatedUnplugPM100, self).__init__(sleep_factor=sleep_factor)
+        self.unplug_file = unplug_file
+
+    def read(self):
+        if os.path.exists(self.unplug_file):
+            raise IOError("Meter unplugged")
+        return super(SimulatedUnplugPM100, self).read()
+
+
+class PowerTraceGenerator(object):
+    """ Generate realistic laser power traces in vectorized blocks. The
+    trace is a baseline power in mW modulated into pulses, with slow
+    thermal drift, gaussian noise, mode hops between discrete power
+    levels, and short dropouts to near zero. All randomness comes from a
+    single seeded RandomState so a given seed and sequence of block sizes
+    always produces the same trace.
+    """
+    def __init__(self, sample_rate=10000, seed=None, baseline=60.0,
+                 noise=0.05, drift=0.5, drift_period=300.0,
+                 pulse_frequency=2.0, pulse_duty=0.5, pulse_floor=0.0,
+                 mode_hop_rate=0.2, mode_hop_size=0.8,
+                 dropout_rate=0.05, dropout_duration=0.005):
+        super(PowerTraceGenerator, self).__init__()
+
+        self.sample_rate = float(sample_rate)
+        self.baseline = baseline
+        self.noise = noise
+        self.drift = drift
+        self.drift_period = drift_period
+        self.pulse_frequency = pulse_frequency
+        self.pulse_duty = pulse_duty
+        self.pulse_floor = pulse_floor
+
+        # Event rates are per second, convert to per sample probabilities
+        self.mode_hop_chance = mode_hop_rate / self.sample_rate
+        self.mode_levels = numpy.array([-1.0, 0.0, 1.0]) * mode_hop_size
+        self.dropout_chance = dropout_rate / self.sample_rate
+        self.dropout_samples = max(1, int(dropout_duration * self.sample_rate))
+
+        self.random = numpy.random.RandomState(seed)
+        self.drift_phase = self.random.uniform(0, 2 * numpy.pi)
+
+        self.sample_count = 0
+        self.mode_level = 0.0
+        self.dropout_remaining = 0
+
+    def block(self, size):
+        """ Return the next size samples of the trace as a numpy array.
+        """
+        index = numpy.arange(size)
+        times = (self.sample_count + index) / self.sample_rate
+
+        trace = numpy.empty(size)
+        trace.fill(self.baseline)
+
+        if self.pulse_frequency:
+            phase = numpy.mod(times * self.pulse_frequency, 1.0)
+            off = phase >= self.pulse_duty
+            trace[off] = self.baseline * self.pulse_floor
+
+        pulse_on = trace > 0
+        angle = 2 * numpy.pi * times / self.drift_period + self.drift_phase
+        trace[pulse_on] += self.drift * numpy.sin(angle[pulse_on])
+        trace[pulse_on] += self.mode_offsets(size)[pulse_on]
+
+        trace += self.random.normal(0, self.noise, size)
+
+        trace[self.dropout_mask(size)] = 0.0
+        numpy.clip(trace, 0.0, None, out=trace)
+
+        self.sample_count += size
+        return trace
+
+    def mode_offsets(self, size):
+        """ Pick a new discrete power level at every mode hop event, and
+        hold it until the next event. Carries the level across blocks.
+        """
+        index = numpy.arange(size)
+        hops = self.random.random_sample(size) < self.mode_hop_chance
+        choices = self.random.randint(len(self.mode_levels), size=size)
+
+        # Index of the most recent hop at or before every sample, -1 when
+        # no hop has occurred yet in this block
+        last_hop = numpy.maximum.accumulate(numpy.where(hops, index, -1))
+
+        offsets = numpy.empty(size)
+        offsets.fill(self.mode_level)
+        hopped = last_hop >= 0
+        offsets[hopped] = self.mode_levels[choices[last_hop[hopped]]]
+
+        self.mode_level = offsets[-1]
+        return offsets
+
+    def dropout_mask(self, size):
+        """ Return a boolean array marking dropped samples. A dropout
+        started near the end of the previous block continues into this one.
+        """
+        index = numpy.arange(size)
+        starts = self.random.random_sample(size) < self.dropout_chance
+
+        # Before the first start of the block, far enough back that no
+        # sample of the block falls within a dropout
+        no_start = -self.dropout_samples - size
+        last_start = numpy.maximum.accumulate(numpy.where(starts, index,
+                                                          no_start))
+
+        dropped = (index - last_start) < self.dropout_samples
+        dropped[:self.dropout_remaining] = True
+
+        carry = self.dropout_remaining - size
+        if starts.any():
+            carry = max(carry, last_start[-1] + self.dropout_samples - size)
+        self.dropout_remaining = max(0, carry)
+
+        return dropped
+
+
+class SimulatedLaserPM100(SimulatedPM100):
+    """ Like SimulatedPM100, but return a realistic power trace from the
+    PowerTraceGenerator at the specified sample rate. Samples are
+    generated and paced one block at a time, 100 blocks per second, so
+    rates up to 100k samples per second are practical. Set sample_rate to
+    None to generate as fast as possible.
+    """
+    def __init__(self, sample_rate=10000, seed=None, block_size=None,
+                 sleep_factor=None, **trace_options):
+        super(SimulatedLaserPM100, self).__init__(sleep_factor=sleep_factor)
+
+        self.sample_rate = sample_rate
+        generator_rate = sample_rate or 100000
+        self.generator = PowerTraceGenerator(sample_rate=generator_rate,
+                                             seed=seed, **trace_options)
+
+        if block_size is None:
+            block_size = max(1, int(generator_rate / 100))
+        self.block_size = block_size
+
+        self.start_time = None
+        self.blocks = 0
+        self.values = []
+
+    def read_block(self):
+        """ Return the acquisition times and values of the next block of
+        samples, sleeping as required to hold the sample rate.
+        """
+        if self.start_time is None:
+            self.start_time = time.time()
+
+        self.blocks += 1
+        if self.sample_rate is not None:
+            due = self.start_time \
+                  + self.blocks * self.block_size / float(self.sample_rate)
+            wait = due - time.time()
+            if wait > 0:
+                time.sleep(wait)
+
+        if self.sleep_factor is not None:
+            time.sleep(self.sleep_factor)
+
+        values = self.generator.block(self.block_size)
+        period = 1.0 / self.generator.sample_rate
+        stamps = time.time() - period * numpy.arange(self.block_size)[::-1]
+        return stamps, values
+
+    def read(self):
+        """ Return the next single sample, generating a new block when the
+        current one is exhausted.
+        """
+        if not self.values:
+            stamps, values = self.read_block()
+            self.values = values.tolist()
+            self.values.reverse()
+
+        return self.values.pop()
+
 class TriValueZMQ(object):
     """ Read three values off a zmq publisher queue with a subscriber
     interface, wrap in the "read" nomenclature for use in the fastpm100
-    type visualization.
+    type visualization. Messages with sequence numbers (see
+    fastpm100.zmqstream) are counted for lost, duplicated and out of order
+    deliveries, available from stats().
+
+    The receive high water mark and buffer size bound how many stale
+    messages a slow viewer can queue up. With conflate set, only the most
+    recent message is kept. Reconnect intervals are in milliseconds. Any
+    option left as None uses the libzmq default.
+
+    A read waits at most receive_timeout ms for a message, then returns
+    NaN for every value so the outage shows up as a gap in the data. When
+    nothing has arrived for heartbeat_timeout seconds, the socket is
+    closed and subscribed again, which recovers from publisher restarts
+    without restarting this process. Set receive_timeout to None to block
+    forever as before.
     """
+    # Reads wait on the socket, see wrapper.backend_class
+    releases_gil = True
+
     def __init__(self, ip_address="127.0.0.1", port="6545",
-                 topic="temperatures_and_power"):
+                 topic="temperatures_and_power", rcvhwm=None, rcvbuf=None,
+                 conflate=False, reconnect_ivl=None, reconnect_ivl_max=None,
+                 receive_timeout=1000, heartbeat_timeout=5.0):
         super(TriValueZMQ, self).__init__()
         log.debug("%s setup", self.__class__.__name__)
 
-        self.context = zmq.Context()
-        self.socket = self.context.socket(zmq.SUB)
+        self.sequence = zmqstream.SequenceTracker()
+        self.reset_latency()
+        self.latency_period = (None, None)
+        self.memory = None
+        self.memory_time = 0
+
+        self.receive_timeout = receive_timeout
+        self.heartbeat_timeout = heartbeat_timeout
+        self.timeouts = 0
+        self.reconnects = 0
 
-        connect_str = "tcp://%s:%s" % (ip_address, port)
-        log.debug("Connecting to: %s, topic: %s", connect_str, topic)
-        self.socket.connect(connect_str)
-        self.socket.setsockopt(zmq.SUBSCRIBE, topic)
+        # Number of NaN values to return on timeout, updated from every
+        # message received. Defaults to the six value BoardTester format.
+        self.channels = 6
+
+        self.options = [(zmq.RCVHWM, rcvhwm),
+                        (zmq.RCVBUF, rcvbuf),
+                        (zmq.RECONNECT_IVL, reconnect_ivl),
+                        (zmq.RECONNECT_IVL_MAX, reconnect_ivl_max)]
+        if conflate:
+            self.options.append((zmq.CONFLATE, 1))
+
+        self.connect_str = "tcp://%s:%s" % (ip_address, port)
+        self.topic = topic
+
+        self.context = zmq.Context()
+        self.create_socket()
+        self.last_message_time = time.time()
 
         socket_wait = 1.0
         log.debug("Wait %s seconds for socket", socket_wait)
         time.sleep(socket_wait)
+        self.latency_time = time.time()
+
+    def create_socket(self):
+        """ Create the subscriber socket with the configured options and
+        connect it to the publisher. Where libzmq supports ZMTP heartbeats,
+        use them to detect dead connections underneath the subscription.
+        """
+        self.socket = self.context.socket(zmq.SUB)
+
+        for option, value in self.options:
+            if value is not None:
+                log.debug("Socket option %s: %s", option, value)
+                self.socket.setsockopt(option, value)
+
+        if self.heartbeat_timeout and hasattr(zmq, "HEARTBEAT_IVL"):
+            heartbeat_ms = int(self.heartbeat_timeout * 1000)
+            try:
+                self.socket.setsockopt(zmq.HEARTBEAT_IVL, heartbeat_ms / 2)
+                self.socket.setsockopt(zmq.HEARTBEAT_TIMEOUT, heartbeat_ms)
+            except zmq.ZMQError as exc:
+                log.debug("No ZMTP heartbeat support: %s", exc)
+
+        log.debug("Connecting to: %s, topic: %s", self.connect_str,
+                  self.topic)
+        self.socket.connect(self.connect_str)
+        self.socket.setsockopt(zmq.SUBSCRIBE, self.topic)
+
+    def close(self):
+        self.socket.close(linger=0)
+        self.context.term()
+
+    def reconnect(self):
+        """ Throw away the current socket and any messages queued on it,
+        then subscribe again. The sequence accounting starts over, as a
+        restarted publisher begins a new sequence.
+        """
+        log.warning("No messages for %s seconds, reconnect to %s",
+                    self.heartbeat_timeout, self.connect_str)
+        self.socket.close(linger=0)
+        self.create_socket()
+
+        self.sequence.reset()
+        self.reconnects += 1
+        self.last_message_time = time.time()
+        events.emit("reconnect", address=self.connect_str,
+                    reconnects=self.reconnects,
+                    heartbeat_timeout=self.heartbeat_timeout)
+
+    def receive(self):
+        """ Wait up to the receive timeout for the next message, update the
+        sequence accounting and return the list of values. Return a list of
+        NaN on timeout, and reconnect if the heartbeat timeout has passed.
+        """
+        message = self.receive_message()
+        if message is None:
+            return [float("nan")] * self.channels
+
+        values, sequence, send_time = zmqstream.decode(message)
+        self.channels = len(values)
+        self.account(sequence, send_time)
+        return values
+
+    def receive_message(self):
+        """ Wait up to the receive timeout for the next raw message. Return
+        None on timeout, and reconnect if the heartbeat timeout has passed.
+        """
+        if not self.socket.poll(self.receive_timeout):
+            self.timeouts += 1
+            silence = time.time() - self.last_message_time
+            if self.heartbeat_timeout and silence >= self.heartbeat_timeout:
+                self.reconnect()
+            return None
+
+        self.last_message_time = time.time()
+        return self.socket.recv()
+
+    def account(self, sequence, send_time):
+        """ Update the sequence and latency accounting with the header of a
+        received message.
+        """
+        if sequence is None:
+            return
+
+        self.sequence.update(sequence)
+
+        latency = time.time() - send_time
+        self.latency_total += latency
+        self.latency_count += 1
+        self.latency_max = max(self.latency_max, latency)
+
+    def reset_latency(self):
+        """ Start a new period of publisher to subscriber latency
+        accounting.
+        """
+        self.latency_total = 0.0
+        self.latency_count = 0
+        self.latency_max = 0.0
+
+    def latency_summary(self):
+        """ Return the mean and maximum latency in ms of the messages of
+        the current period, or None for both without messages.
+        """
+        if not self.latency_count:
+            return None, None
+        return (1000.0 * self.latency_total / self.latency_count,
+                1000.0 * self.latency_max)
+
+    def stats(self):
+        """ Return the message delivery, timeout and reconnect counters of
+        this subscription, the mean and maximum latency in ms of the
+        messages received over the latest whole second, and the memory use
+        of this process in bytes. The latency periods start once per second
+        however often this is called, and until a period with messages has
+        ended the latency is that of the messages so far.
+        """
+        # Memory use changes slowly, don't read it on every call
+        now = time.time()
+        if now - self.memory_time >= 1.0:
+            self.memory = procstats.memory_usage()
+            self.memory_time = now
+
+        stats = self.sequence.stats()
+        stats["memory"] = self.memory
+        stats["timeouts"] = self.timeouts
+        stats["reconnects"] = self.reconnects
+
+        if now - self.latency_time >= 1.0:
+            self.latency_period = self.latency_summary()
+            self.reset_latency()
+            self.latency_time = now
+
+        latency, latency_max = self.latency_period
+        if latency is None:
+            latency, latency_max = self.latency_summary()
+        stats["latency"] = latency
+        stats["latency_max"] = latency_max
+
+        return stats
 
     def read(self):
         """ Read off the publisher queue, return just the spectrometer
         temps and laser power
         """
-        string = self.socket.recv()
-        values = string.split(" ")[1]
+        values = self.receive()
 
-        ccd_temp = values.split(",")[0]
-        laser_temp = values.split(",")[1]
-        laser_power = values.split(",")[2]
+        ccd_temp = values[0]
+        laser_temp = values[1]
+        laser_power = values[2]
 
-        return float(ccd_temp), float(laser_temp), float(laser_power)
+        return ccd_temp, laser_temp, laser_power
 
 class DualTriValueZMQ(TriValueZMQ):
     """ Read three values off a zmq publisher queue with a subscriber
@@ -138,14 +709,12 @@ class DualTriValueZMQ(TriValueZMQ):
         """ Like read above, return a tuple in combined_log order of average
         laser temp, average laser power.
         """
+        values = self.receive()
 
-        string = self.socket.recv()
-        values = string.split(" ")[1]
+        ltemp_value = values[-2]
+        power_value = values[-1]
 
-        ltemp_value = values.split(",")[-2]
-        power_value = values.split(",")[-1]
-
-        return float(ltemp_value), float(power_value)
+        return ltemp_value, power_value
 
 
 class AllValueZMQ(TriValueZMQ):
@@ -162,15 +731,45 @@ class AllValueZMQ(TriValueZMQ):
         """ Like read above, return a tuple in combined_log order of average
         laser temp, average laser power.
         """
+        return self.receive()
 
-        string = self.socket.recv()
-        values = string.split(" ")[1]
 
-        float_values = []
-        for item in values.split(","):
-            float_values.append(float(item))
+class RebroadcastZMQ(TriValueZMQ):
+    """ Subscribe to the batches of timestamped samples published by the
+    acquisition process of another FastPM100 instance, see the
+    publish_address option of wrapper.SubProcess. Any number of viewers
+    can share one device this way. Read returns the most recent sample,
+    read_block returns every sample of the next batch.
+    """
+    def __init__(self, ip_address="127.0.0.1", port="6546",
+                 topic="fastpm100", *args, **kwargs):
+        super(RebroadcastZMQ, self).__init__(ip_address, port, topic,
+                                             *args, **kwargs)
 
-        return float_values
+        log.debug("%s setup", self.__class__.__name__)
+        self.channels = 1
+
+    def read(self):
+        """ Return the most recent sample of the next batch, as a single
+        number for single value devices like the power meters.
+        """
+        values = self.receive()
+        if len(values) == 1:
+            return values[0]
+        return values
+
+    def read_block(self):
+        """ Return the timestamps and rows of values of the next batch, or
+        None on receive timeout.
+        """
+        message = self.receive_message()
+        if message is None:
+            return None
+
+        timestamps, values, sequence = zmqstream.decode_batch(message)
+        self.channels = values.shape[1]
+        self.account(sequence, timestamps[-1])
+        return timestamps, values
 
 
 class SlapChopDevice(object):
@@ -178,6 +777,8 @@ class SlapChopDevice(object):
     acquisition command and receive three values comma delimited.
     Yellow (thermistor), Blue and current.
     """
+    # Reads wait on the serial port, see wrapper.backend_class
+    releases_gil = True
 
     def __init__(self):
         log.debug("%s setup", self.__class__.__name__)
@@ -198,8 +799,14 @@ class SlapChopDevice(object):
             log.critical("Problem close/open: %s", exc)
             raise exc
 
+    def close(self):
+        self.serial_port.close()
+
     def read(self):
         result = self.write_command("s")
+        if result is None:
+            raise IOError("No response from %s" % self.com_port)
+
         result = result.replace('\r\n','')
         result = result.replace(',','')
         temp_yellow = result.split(" ")[0]
@@ -214,10 +821,14 @@ class SlapChopDevice(object):
         of bytes returned.
         """
 
+        # Checked once per command, this runs for every sample
+        debug = log.isEnabledFor(logging.DEBUG)
+
         result = None
         try:
             fin_command = command + '\n'
-            log.debug("send command [%s]", fin_command)
+            if debug:
+                log.debug("send command [%s]", fin_command)
             result = self.serial_port.write(str(fin_command))
             self.serial_port.flush()
         except Exception as exc:
@@ -226,13 +837,15 @@ class SlapChopDevice(object):
 
         try:
             result = self.serial_port.read(read_bytes)
-            log.debug("Serial read result [%r]" % result)
+            if debug:
+                log.debug("Serial read result [%r]", result)
 
         except Exception as exc:
             log.critical("Problem reading from port: %s", exc)
             return result
 
-        log.debug("command write/read successful")
+        if debug:
+            log.debug("command write/read successful")
         return result
 
 
@@ -0,0 +1,329 @@
+""" Find every attached Thorlabs PM100 power meter, as USBTMC device nodes
+on Linux or VISA resources elsewhere, and query the identity of each: model,
+serial number, firmware and sensor. The queries run in parallel, so a bench
+of four meters takes about as long to identify as one.
+
+    python -m fastpm100.discovery
+
+lists the meters with a device spec that selects each by serial number,
+such as ThorlabsMeter:serial_number=P2000343, for the --device option of
+the scripts. parse_spec splits a spec into the device name and keyword
+arguments, and resolve fills in the address of every meter selected by
+serial number from a single discovery. The acquisition processes then open
+their meters concurrently, without each one probing every node.
+"""
+
+import os
+import re
+import ast
+import sys
+import glob
+import platform
+import functools
+
+from multiprocessing.pool import ThreadPool
+
+import pyvisa as visa
+
+from ThorlabsPM100 import USBTMC
+
+import logging
+log = logging.getLogger(__name__)
+
+THORLABS_VENDOR = "0x1313"
+
+USBTMC_PATTERN = "/dev/usbtmc*"
+
+# Spec options that name a device, kept as text so a serial number like
+# 0123456 isn't read as an octal or decimal number.
+STRING_OPTIONS = ("serial_number", "address")
+
+
+def default_backend():
+    if "Linux" in platform.platform():
+        return "usbtmc"
+    return "visa"
+
+
+def node_number(node):
+    """ Sort key of device nodes by their trailing number, so usbtmc10
+    comes after usbtmc2.
+    """
+    match = re.search(r"(\d+)$", node)
+    if match is None:
+        return (node, -1)
+    return (node[:match.start()], int(match.group(1)))
+
+
+def list_usbtmc(pattern=USBTMC_PATTERN):
+    """ Return the USBTMC device nodes in numeric order. The nodes don't
+    say which instrument they belong to, see identify_usbtmc.
+    """
+    return sorted(glob.glob(pattern), key=node_number)
+
+
+def resource_manager(visa_library=None):
+    if visa_library is None:
+        return visa.ResourceManager()
+    return visa.ResourceManager(visa_library)
+
+
+def list_visa(resource_man):
+    """ Return the VISA resource names of the Thorlabs instruments, such as
+    USB0::0x1313::0x8072::P2000343::INSTR.
+    """
+    marker = "::%s::" % THORLABS_VENDOR
+    return [name for name in resource_man.list_resources()
+            if marker in name.lower()]
+
+
+def parse_identity(idn):
+    """ Return a dictionary of the manufacturer, model, serial number and
+    firmware fields of an *IDN? response.
+    """
+    fields = [field.strip() for field in idn.strip().split(",")]
+    fields += [None] * (4 - len(fields))
+    return {"manufacturer": fields[0],
+            "model": fields[1],
+            "serial_number": fields[2],
+            "firmware": fields[3]}
+
+
+def query_sensor(query):
+    """ Return the model and serial number of the attached sensor as
+    "S121C 1234567" with the query function of a session, or None if the
+    meter does not answer SYST:SENS:IDN?.
+    """
+    try:
+        fields = query("SYST:SENS:IDN?").strip().split(",")
+    except (EnvironmentError, visa.VisaIOError) as exc:
+        log.debug("No sensor identity: %s", exc)
+        return None
+
+    if len(fields) < 2:
+        return None
+    return "%s %s" % (fields[0].strip(), fields[1].strip())
+
+
+def identify_usbtmc(node):
+    """ Return the identity of the meter on a USBTMC device node.
+    """
+    inst = USBTMC(device=node)
+    try:
+        identity = parse_identity(inst.query("*IDN?"))
+        identity["sensor"] = query_sensor(inst.query)
+    finally:
+        os.close(inst.FILE)
+
+    identity["address"] = node
+    identity["backend"] = "usbtmc"
+    return identity
+
+
+def identify_visa(resource, visa_library=None):
+    """ Return the identity of the meter with a VISA resource name.
+    """
+    device = resource_manager(visa_library).open_resource(resource)
+    try:
+        device.read_termination = "\n"
+        device.write_termination = "\n"
+        identity = parse_identity(device.query("*IDN?"))
+        identity["sensor"] = query_sensor(device.query)
+    finally:
+        device.close()
+
+    identity["address"] = resource
+    identity["backend"] = "visa"
+    return identity
+
+
+def run_parallel(func, items, workers=8):
+    """ Return the results of func for every item, called concurrently on
+    up to workers threads. The calls wait on USB transfers, which release
+    the GIL.
+    """
+    if not items:
+        return []
+
+    pool = ThreadPool(min(workers, len(items)))
+    try:
+        return pool.map(func, items)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def identify_safely(identify, backend, address):
+    """ Return the identity of the meter at the address, or a dictionary
+    with the error for a meter that can't be queried, such as one in use.
+    """
+    try:
+        return identify(address)
+    except Exception as exc:
+        log.warning("Can't identify %s: %s", address, exc)
+        return {"address": address, "backend": backend,
+                "error": "%s: %s" % (exc.__class__.__name__, exc)}
+
+
+def discover(backend=None, visa_library=None, pattern=USBTMC_PATTERN,
+             workers=8):
+    """ Return a list of the identity dictionaries of every attached
+    meter, queried in parallel, in address order. Each has the address and
+    backend to open it with, see ThorlabsMeter, and an error entry instead
+    of the identity fields if it could not be queried.
+    """
+    if backend is None:
+        backend = default_backend()
+
+    if backend == "usbtmc":
+        addresses = list_usbtmc(pattern)
+        identify = identify_usbtmc
+    else:
+        addresses = list_visa(resource_manager(visa_library))
+        identify = functools.partial(identify_visa,
+                                     visa_library=visa_library)
+
+    log.debug("Identify %s meters on %s", len(addresses), backend)
+    return run_parallel(functools.partial(identify_safely, identify,
+                                          backend),
+                        addresses, workers)
+
+
+def find(meters, serial_number):
+    """ Return the identity with the serial number from the list of
+    discovered meters, or None.
+    """
+    for meter in meters:
+        if meter.get("serial_number") == str(serial_number):
+            return meter
+    return None
+
+
+def parse_value(value):
+    """ Return a spec value as a python literal where it is one, otherwise
+    as a string.
+    """
+    try:
+        return ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        return value
+
+
+def parse_spec(spec):
+    """ Return the device name and keyword arguments of a device spec of
+    the form Name or Name:key=value,key=value, for example
+    ThorlabsMeter:serial_number=P2000343,wavelength=633. The STRING_OPTIONS
+    are always strings, the other values python literals where possible.
+    """
+    name, separator, options = spec.partition(":")
+    kwargs = {}
+    for option in options.split(","):
+        if not option.strip():
+            continue
+
+        key, separator, value = option.partition("=")
+        if not separator:
+            raise ValueError("Expected key=value, not %s in %s"
+                             % (option, spec))
+        key, value = key.strip(), value.strip()
+        if key in STRING_OPTIONS:
+            kwargs[key] = value
+        else:
+            kwargs[key] = parse_value(value)
+
+    return name.strip(), kwargs
+
+
+def resolve(specs, **discover_kwargs):
+    """ Return a copy of the list of (device name, keyword arguments)
+    specs, with the address and backend filled in for every ThorlabsMeter
+    selected by serial number without an address. Discovery only runs if
+    there are any, and only once. A serial number that isn't found is left
+    for the meter to report when it opens.
+    """
+    resolved = [(name, dict(kwargs)) for name, kwargs in specs]
+    pending = [kwargs for name, kwargs in resolved
+               if name == "ThorlabsMeter" and "serial_number" in kwargs
+               and "address" not in kwargs]
+    if not pending:
+        return resolved
+
+    for key in ("backend", "visa_library"):
+        if key in pending[0] and key not in discover_kwargs:
+            discover_kwargs[key] = pending[0][key]
+    meters = discover(**discover_kwargs)
+
+    for kwargs in pending:
+        meter = find(meters, kwargs["serial_number"])
+        if meter is None:
+            log.error("No meter with serial %s found",
+                      kwargs["serial_number"])
+            continue
+
+        log.info("Meter %s is %s", kwargs["serial_number"], meter["address"])
+        kwargs["address"] = meter["address"]
+        kwargs["backend"] = meter["backend"]
+
+    return resolved
+
+
+def open_devices(specs, workers=8):
+    """ Open the devices of a list of spec strings concurrently in this
+    process, and return them in the same order. If any fails to open, the
+    others are closed and the first error is raised.
+    """
+    from . import devices
+
+    def open_device(spec):
+        name, kwargs = spec
+        try:
+            return getattr(devices, name)(**kwargs)
+        except Exception as exc:
+            log.warning("Open %s(%s) failed: %s", name, kwargs, exc)
+            return exc
+
+    resolved = resolve([parse_spec(spec) for spec in specs])
+    opened = run_parallel(open_device, resolved, workers)
+
+    failures = [item for item in opened if isinstance(item, Exception)]
+    if failures:
+        for item in opened:
+            if not isinstance(item, Exception) and hasattr(item, "close"):
+                item.close()
+        raise failures[0]
+
+    return opened
+
+
+def main(argv=None):
+    """ Print the identity and device spec of every attached meter.
+    """
+    import argparse
+    parser = argparse.ArgumentParser(description="list attached PM100"
+                                                 " power meters")
+    parser.add_argument("--backend", type=str, default=None,
+                        choices=["usbtmc", "visa"],
+                        help="USBTMC on Linux and VISA elsewhere by default")
+    parser.add_argument("--visa-library", type=str, default=None,
+                        help="VISA library, such as a pyvisa-sim yaml"
+                             " file@sim")
+    args = parser.parse_args(argv)
+
+    meters = discover(backend=args.backend, visa_library=args.visa_library)
+    if not meters:
+        print "No meters found"
+        return 1
+
+    for meter in meters:
+        if "error" in meter:
+            print "%s  %s" % (meter["address"], meter["error"])
+            continue
+
+        print "%s  %s %s firmware %s sensor %s" \
+              % (meter["address"], meter["model"], meter["serial_number"],
+                 meter["firmware"], meter["sensor"])
+        print "    ThorlabsMeter:serial_number=%s" % meter["serial_number"]
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,137 @@
+""" Structured performance events, such as acquisition rates, read gaps and
+reconnects, kept apart from the text log for post run analysis.
+
+Any process calls emit with an event name and numeric values. The event
+travels as a record of the fastpm100.events logger through the same
+QueueHandler batches as the text log, and the MainLogger listener writes it
+as one json object per line to fastpm100_events.jsonl next to the text log:
+
+    {"time": 1452000000.1, "process": "Process-1", "name": "acquisition",
+     "values": {"reads_per_second": 195000.0, "max_gap_ms": 2.7}}
+
+Read the file back with read, or columns for numpy and plotting, or from
+the command line:
+
+    python -m fastpm100.events fastpm100_events.jsonl --name acquisition
+"""
+
+import os
+import sys
+import csv
+import json
+import logging
+
+from . import applog
+
+EVENT_LOGGER = "fastpm100.events"
+
+event_log = logging.getLogger(EVENT_LOGGER)
+
+# Events are recorded whatever level the text log is filtered to
+event_log.setLevel(logging.INFO)
+
+
+def get_location():
+    """ Return the events file name, in the directory of the text log.
+    """
+    directory = os.path.dirname(applog.get_location())
+    return os.path.join(directory, "fastpm100_events.jsonl")
+
+
+def emit(name, **values):
+    """ Record a named event with the current time and the keyword values,
+    which must be json serializable.
+    """
+    if event_log.isEnabledFor(logging.INFO):
+        event_log.info(name, extra={"event": values})
+
+
+class EventFormatter(logging.Formatter):
+    """ Format an event record as a single line json object.
+    """
+    def format(self, record):
+        return json.dumps({"time": record.created,
+                           "process": record.processName,
+                           "name": record.getMessage(),
+                           "values": getattr(record, "event", {})},
+                          sort_keys=True)
+
+
+def create_event_handler(filename=None, backup_count=5):
+    """ Return a buffered file handler for the events logger of the
+    listener process, rotated per run like the text log.
+    """
+    if filename is None:
+        filename = get_location()
+
+    handler = applog.create_file_handler(filename, backup_count=backup_count)
+    handler.setFormatter(EventFormatter())
+    return handler
+
+
+def read(filename=None, names=None):
+    """ Yield each event in the file as a dictionary, optionally only those
+    with a name in names. Lines that do not parse, such as a partial last
+    line of a crashed run, are skipped.
+    """
+    if filename is None:
+        filename = get_location()
+
+    with open(filename) as event_file:
+        for line in event_file:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+
+            if names is None or event["name"] in names:
+                yield event
+
+
+def columns(events):
+    """ Return a dictionary of time, process and every value name to a list
+    with one entry per event, None where an event has no such value.
+    """
+    events = list(events)
+    keys = set()
+    for event in events:
+        keys.update(event["values"].keys())
+
+    result = {"time": [event["time"] for event in events],
+              "process": [event["process"] for event in events]}
+    for key in keys:
+        result[key] = [event["values"].get(key) for event in events]
+    return result
+
+
+def main(argv=None):
+    """ Print the number of each event in the file, or the values of the
+    named events as csv.
+    """
+    import argparse
+    parser = argparse.ArgumentParser(description="read performance events")
+    parser.add_argument("filename", nargs="?", default=None,
+                        help="Events file, %s by default" % get_location())
+    parser.add_argument("-n", "--name", type=str, default=None,
+                        help="Write the values of these events as csv")
+    args = parser.parse_args(argv)
+
+    if args.name is None:
+        counts = {}
+        for event in read(args.filename):
+            counts[event["name"]] = counts.get(event["name"], 0) + 1
+        for name, count in sorted(counts.items()):
+            print "%s %s" % (name, count)
+        return 0
+
+    table = columns(read(args.filename, names=[args.name]))
+    header = ["time", "process"] + sorted([key for key in table
+                                           if key not in ("time", "process")])
+    writer = csv.writer(sys.stdout)
+    writer.writerow(header)
+    for row in zip(*[table[key] for key in header]):
+        writer.writerow(row)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,263 @@
+""" Acquire from wrapper.SubProcess devices at full rate without a display.
+Every sample read is delivered in batches, which are written to csv
+recorders, accumulated into running statistics and optionally republished
+on zmq for remote viewers. Nothing in here imports PySide or pyqtgraph, so
+acquisition starts quickly on rack machines with no display.
+"""
+
+import os
+import csv
+import time
+
+import numpy
+
+from . import discovery, events, profiling, wrapper
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class CSVRecorder(object):
+    """ Write every timestamped sample to a csv file, one row per sample
+    with the timestamp followed by the channel values.
+    """
+    def __init__(self, filename):
+        super(CSVRecorder, self).__init__()
+        log.debug("Record to %s", filename)
+        self.filename = filename
+        self.rows = 0
+        self.csv_file = open(filename, "wb")
+        self.writer = csv.writer(self.csv_file)
+
+    def write(self, timestamps, values):
+        """ Append a batch of samples, where values has one row per
+        timestamp.
+        """
+        rows = numpy.column_stack((timestamps, values))
+        self.writer.writerows(rows.tolist())
+        self.rows += len(rows)
+
+    def close(self):
+        self.csv_file.close()
+
+
+class RunningStatistics(object):
+    """ Accumulate the per channel count, mean, minimum and maximum of every
+    sample without keeping the samples. NaN values, such as zmq receive
+    timeouts, are ignored.
+    """
+    def __init__(self):
+        super(RunningStatistics, self).__init__()
+        self.count = None
+        self.mean = None
+        self.minimum = None
+        self.maximum = None
+
+    def update(self, values):
+        """ Combine a batch of samples, one row per sample, into the
+        statistics.
+        """
+        values = numpy.asarray(values, dtype=float)
+        valid = ~numpy.isnan(values)
+        count = valid.sum(axis=0)
+        if not count.any():
+            return
+
+        total = numpy.where(valid, values, 0.0).sum(axis=0)
+        minimum = numpy.where(valid, values, numpy.inf).min(axis=0)
+        maximum = numpy.where(valid, values, -numpy.inf).max(axis=0)
+
+        if self.count is None:
+            self.count = numpy.zeros(len(count), dtype=int)
+            self.mean = numpy.zeros(len(count))
+            self.minimum = numpy.empty(len(count))
+            self.minimum.fill(numpy.inf)
+            self.maximum = numpy.empty(len(count))
+            self.maximum.fill(-numpy.inf)
+
+        combined = self.count + count
+        weight = numpy.where(combined > 0, combined, 1)
+        self.mean = (self.mean * self.count + total) / weight
+        self.count = combined
+        self.minimum = numpy.minimum(self.minimum, minimum)
+        self.maximum = numpy.maximum(self.maximum, maximum)
+
+    def summary(self):
+        """ Return the statistics as a dictionary of per channel lists.
+        """
+        if self.count is None:
+            return {"count": [], "mean": [], "min": [], "max": []}
+
+        return {"count": self.count.tolist(),
+                "mean": self.mean.tolist(),
+                "min": self.minimum.tolist(),
+                "max": self.maximum.tolist()}
+
+
+class HeadlessAcquisition(object):
+    """ Run one batch mode SubProcess per device name, and process every
+    batch they deliver. Specify device_kwargs as a dictionary of device name
+    to keyword arguments for that device. Specify a record_directory to
+    write a csv file per device, and a publish_port to republish each
+    device in the acquisition process on consecutive ports from there.
+    Pass lowjitter.LowJitter settings as low_jitter to apply them to every
+    acquisition process. The backend applies to every device, use auto to
+    choose a thread or a process per device, see wrapper.backend_class.
+
+    Device names may be specs with keyword arguments, see
+    discovery.parse_spec, such as ThorlabsMeter:serial_number=P2000343 to
+    acquire from several meters. Meters selected by serial number are
+    found with a single discovery, then open concurrently in their own
+    acquisition processes.
+    """
+    def __init__(self, log_queue, device_names=("SimulatedPM100",),
+                 device_kwargs=None, record_directory=None,
+                 publish_port=None, batch_size=1000, queue_size=100,
+                 summary_interval=5.0, low_jitter=None, backend="process"):
+        super(HeadlessAcquisition, self).__init__()
+        log.debug("%s setup", self.__class__.__name__)
+
+        device_kwargs = device_kwargs or {}
+        self.summary_interval = summary_interval
+
+        specs = discovery.resolve([discovery.parse_spec(name)
+                                   for name in device_names])
+
+        self.sources = []
+        for index, (name, spec_kwargs) in enumerate(specs):
+            kwargs = dict(device_kwargs.get(name) or {})
+            kwargs.update(spec_kwargs)
+
+            publish_address = None
+            if publish_port is not None:
+                publish_address = "tcp://127.0.0.1:%s" \
+                                  % (int(publish_port) + index)
+
+            recorder = None
+            if record_directory is not None:
+                filename = os.path.join(record_directory,
+                                        "%s_%s.csv" % (index, name))
+                recorder = CSVRecorder(filename)
+
+            sub_proc = wrapper.create(log_queue, backend=backend,
+                                      device_name=name,
+                                      device_kwargs=kwargs,
+                                      publish_address=publish_address,
+                                      batch_size=batch_size,
+                                      queue_size=queue_size,
+                                      low_jitter=low_jitter)
+
+            self.sources.append({"name": device_names[index],
+                                 "device": sub_proc,
+                                 "recorder": recorder,
+                                 "statistics": RunningStatistics(),
+                                 "samples": 0,
+                                 "window_samples": 0,
+                                 "dropped": 0,
+                                 "info": {}})
+
+        self.start_time = time.time()
+        self.summary_time = self.start_time
+
+    def poll(self):
+        """ Process at most one batch from each device in turn, so a device
+        that delivers faster than it can be processed does not starve the
+        others. Return the number of samples processed.
+        """
+        processed = 0
+        for source in self.sources:
+            result = source["device"].read()
+            if result is not None:
+                processed += self.process(source, result)
+
+        return processed
+
+    def process(self, source, result):
+        """ Record a batch of a device and add it to the statistics. Return
+        the number of samples in it.
+        """
+        read_count, (timestamps, values), info = result
+        if source["recorder"] is not None:
+            source["recorder"].write(timestamps, values)
+        source["statistics"].update(values)
+
+        source["samples"] += len(timestamps)
+        source["window_samples"] += len(timestamps)
+        source["dropped"] = info.get("dropped", 0)
+        source["info"] = info
+        return len(timestamps)
+
+    def summary(self):
+        """ Return a list of per device dictionaries with the sample totals,
+        the sample rate since the last summary and the running statistics.
+        Restarts the rate window.
+        """
+        now = time.time()
+        elapsed = max(now - self.summary_time, 1e-6)
+        self.summary_time = now
+
+        summaries = []
+        for source in self.sources:
+            entry = {"device": source["name"],
+                     "samples": source["samples"],
+                     "rate": source["window_samples"] / elapsed,
+                     "dropped": source["dropped"]}
+            entry.update(source["statistics"].summary())
+            if "stream" in source["info"]:
+                entry["stream"] = source["info"]["stream"]
+            source["window_samples"] = 0
+            summaries.append(entry)
+
+        return summaries
+
+    def log_summary(self):
+        """ Log a one line rate summary per device.
+        """
+        for entry in self.summary():
+            log.info("%s: %0.1f samples/s, %s total, %s dropped, mean %s",
+                     entry["device"], entry["rate"], entry["samples"],
+                     entry["dropped"],
+                     ",".join(["%0.4f" % val for val in entry["mean"]]))
+            events.emit("headless_summary", device=entry["device"],
+                        samples_per_second=entry["rate"],
+                        samples=entry["samples"], dropped=entry["dropped"])
+
+    @profiling.profiled("headless")
+    def run(self, duration=None):
+        """ Process batches until the duration in seconds has elapsed, or
+        forever if None, logging a summary every summary_interval seconds.
+        """
+        log.debug("Run headless acquisition for %s seconds", duration)
+        start_time = time.time()
+        try:
+            while duration is None or time.time() - start_time < duration:
+                if self.poll() == 0:
+                    time.sleep(0.001)
+
+                if time.time() - self.summary_time >= self.summary_interval:
+                    self.log_summary()
+
+        except KeyboardInterrupt:
+            log.info("Interrupted")
+
+        self.log_summary()
+
+    def close(self):
+        """ Stop every device, process the batches it delivered up to the
+        end, then close the recorders. Logs a summary if any arrived.
+        """
+        processed = 0
+        for source in self.sources:
+            source["device"].close()
+            while True:
+                result = source["device"].read()
+                if result is None:
+                    break
+                processed += self.process(source, result)
+
+            if source["recorder"] is not None:
+                source["recorder"].close()
+
+        if processed:
+            log.info("Processed %s samples delivered at close", processed)
+            self.log_summary()
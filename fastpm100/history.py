@@ -0,0 +1,345 @@
+""" Shared history of the all data display, at every update interval of the
+views of a dashboard. One acquisition feeds the store, and each view draws
+the latest part of the level at its own interval.
+
+A level of interval zero keeps every read. The other levels average the
+reads over their interval, and close their bins on boundaries aligned to a
+common start time. A level whose interval is a multiple of a finer level
+is fed that level's bin sums instead of every read, so a read is only
+accumulated once. The csv log of the temperature logger is parsed once for
+all levels, see load_csv and HistoryStore.preload.
+"""
+
+import csv
+import time
+
+import numpy
+
+import logging
+log = logging.getLogger(__name__)
+
+# Recording order of the channels of AllValueZMQ, with the csv columns of
+# the temperature logger that hold them
+CHANNELS = ["CCD", "Laser Temperature", "Laser Power", "Yellow Thermistor",
+            "Blue Thermistor", "Amps"]
+
+
+class RingHistory(object):
+    """ Preallocated rolling window of the latest size values of every
+    channel. Appending is constant time, unlike numpy.roll or numpy.append.
+    """
+    def __init__(self, size, channels=len(CHANNELS)):
+        super(RingHistory, self).__init__()
+        self.size = size
+        self.values = numpy.empty((channels, size))
+        self.position = 0
+        self.count = 0
+
+    def append(self, values):
+        self.values[:, self.position] = values
+        self.position = (self.position + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+
+    def extend(self, block):
+        """ Append a (channels, samples) array.
+        """
+        block = block[:, -self.size:]
+        samples = block.shape[1]
+        first = min(samples, self.size - self.position)
+        self.values[:, self.position:self.position + first] = block[:, :first]
+        self.values[:, :samples - first] = block[:, first:]
+        self.position = (self.position + samples) % self.size
+        self.count = min(self.count + samples, self.size)
+
+    def latest(self, size=None):
+        """ Return a (channels, samples) array of up to the latest size
+        values in time order. The array is a view of the window until it
+        wraps, after that a copy.
+        """
+        count = self.count
+        if size is not None:
+            count = min(count, size)
+
+        start = self.position - count
+        if start >= 0:
+            return self.values[:, start:self.position]
+        return numpy.concatenate((self.values[:, start:],
+                                  self.values[:, :self.position]), axis=1)
+
+    def __len__(self):
+        return self.count
+
+
+class HistoryLevel(object):
+    """ History of a single update interval in milliseconds, with the sums
+    and counts of the readings of the open bin. NaN readings of zmq receive
+    timeouts are left out of the averages, and a bin without any readings
+    closes as NaN to break the line on the graph.
+    """
+    def __init__(self, interval, size, channels=len(CHANNELS)):
+        super(HistoryLevel, self).__init__()
+        self.interval = interval
+        self.history = RingHistory(size, channels)
+        self.sums = numpy.zeros(channels)
+        self.counts = numpy.zeros(channels)
+        self.parents = []
+        self.bins = 0
+
+    def add(self, values):
+        """ Add a single reading of every channel.
+        """
+        if self.interval == 0:
+            self.history.append(values)
+            return
+
+        values = numpy.asarray(values, dtype=float)
+        valid = ~numpy.isnan(values)
+        self.sums[valid] += values[valid]
+        self.counts += valid
+
+    def add_rows(self, rows):
+        """ Add a (samples, channels) array of readings, such as a batch of
+        an ingest.IngestEngine source.
+        """
+        if self.interval == 0:
+            self.history.extend(rows.T)
+            return
+
+        valid = ~numpy.isnan(rows)
+        self.sums += numpy.where(valid, rows, 0.0).sum(axis=0)
+        self.counts += valid.sum(axis=0)
+
+    def add_sums(self, sums, counts):
+        self.sums += sums
+        self.counts += counts
+
+    def close_bin(self):
+        """ Append the average of the open bin to the history, pass the
+        sums on to the coarser levels and start a new bin.
+        """
+        with numpy.errstate(invalid="ignore", divide="ignore"):
+            self.history.append(self.sums / self.counts)
+
+        for parent in self.parents:
+            parent.add_sums(self.sums, self.counts)
+
+        self.sums = numpy.zeros_like(self.sums)
+        self.counts = numpy.zeros_like(self.counts)
+
+
+class HistoryStore(object):
+    """ One HistoryLevel per distinct interval of a list of ViewSpec, sized
+    for the largest view at that interval.
+    """
+    def __init__(self, views, channels=len(CHANNELS)):
+        super(HistoryStore, self).__init__()
+        sizes = {}
+        for view in views:
+            sizes[view.interval] = max(sizes.get(view.interval, 0), view.size)
+
+        self.levels = [HistoryLevel(interval, sizes[interval], channels)
+                       for interval in sorted(sizes)]
+        self.by_interval = dict([(level.interval, level)
+                                 for level in self.levels])
+
+        # Readings go to the realtime level and the finest level of each
+        # chain of multiples, the others are fed the bins of a finer level
+        self.fed = []
+        for index, level in enumerate(self.levels):
+            finer = [other for other in self.levels[:index]
+                     if other.interval > 0
+                     and level.interval % other.interval == 0]
+            if finer:
+                finer[-1].parents.append(level)
+            else:
+                self.fed.append(level)
+
+        log.debug("History levels: %s", [(level.interval, level.history.size)
+                                          for level in self.levels])
+        self.start(time.time())
+
+    def start(self, now):
+        """ Align the bin boundaries of every level to now.
+        """
+        self.start_time = now
+        for level in self.levels:
+            level.bins = 0
+
+    def next_close(self, level):
+        """ Return the time of the end of the open bin of a level. The
+        boundaries are computed from the start time rather than summed, so
+        those of levels that are multiples of each other coincide exactly.
+        """
+        return self.start_time + (level.bins + 1) * level.interval / 1000.0
+
+    def add(self, values):
+        """ Add a reading of every channel. Returns True if a realtime
+        level changed.
+        """
+        for level in self.fed:
+            level.add(values)
+        return 0 in self.by_interval
+
+    def add_rows(self, rows):
+        """ Add a (samples, channels) array of readings. Returns True if a
+        realtime level changed.
+        """
+        rows = numpy.asarray(rows, dtype=float)
+        if len(rows) == 0:
+            return False
+
+        for level in self.fed:
+            level.add_rows(rows)
+        return 0 in self.by_interval
+
+    def update(self, now=None):
+        """ Close the bins of every level whose interval has elapsed, finest
+        first, and return the list of the intervals that changed. After a
+        stall a level closes a single bin and skips ahead to the next
+        boundary, like the interval timers of AllController.
+        """
+        if now is None:
+            now = time.time()
+
+        changed = []
+        for level in self.levels:
+            if level.interval == 0 or now < self.next_close(level):
+                continue
+
+            level.close_bin()
+            elapsed = (now - self.start_time) * 1000.0 / level.interval
+            level.bins = max(level.bins + 1, int(elapsed))
+            changed.append(level.interval)
+        return changed
+
+    def latest(self, interval, size=None):
+        """ Return a (channels, samples) array of up to the latest size
+        values of the level at the interval.
+        """
+        return self.by_interval[interval].history.latest(size)
+
+    def preload(self, block, interval=10000):
+        """ Fill the levels from a (channels, rows) array of averages
+        logged every interval milliseconds, such as from load_csv. Levels
+        with a multiple of the interval get the averages of consecutive
+        groups of rows, aligned to the latest row. Finer levels are not
+        preloaded.
+        """
+        for level in self.levels:
+            if level.interval < interval or level.interval % interval != 0:
+                continue
+
+            group = level.interval // interval
+            usable = block.shape[1] - block.shape[1] % group
+            grouped = block[:, block.shape[1] - usable:]
+            if group > 1:
+                grouped = grouped.reshape(grouped.shape[0], -1, group)
+                with numpy.errstate(invalid="ignore"):
+                    grouped = numpy.nanmean(grouped, axis=2)
+
+            log.info("Preload %s values at %s ms", grouped.shape[1],
+                     level.interval)
+            level.history.extend(grouped)
+
+    def nbytes(self):
+        return sum([level.history.values.nbytes for level in self.levels])
+
+
+def load_csv(filename, name="Average"):
+    """ Return a (channels, rows) array of the Min, Max or Average columns
+    of a temperature logger csv file, in the order of CHANNELS.
+    """
+    columns = []
+    for channel in CHANNELS:
+        column = "%s %s" % (channel, name)
+        if name == "Min" and "Thermistor" in channel:
+            # CSV file header has lower case thermistor for min
+            column = "%s thermistor min" % channel.split()[0]
+        columns.append(column)
+
+    log.info("Attempting to open: %s", filename)
+    rows = []
+    with open(filename) as csv_file:
+        for row in csv.DictReader(csv_file, delimiter=","):
+            rows.append([float(row[column]) for column in columns])
+
+    log.info("Read %s rows ", len(rows))
+    return numpy.array(rows, dtype=float).reshape(-1, len(CHANNELS)).T
+
+
+def decimate(block, max_points):
+    """ Return the sample positions and a (channels, points) array of at
+    most max_points, with the minimum and maximum of each group of
+    consecutive samples so peaks stay visible. The oldest samples that don't
+    fill a group are left out. Groups of only NaN stay NaN, to keep the
+    gaps in the lines.
+    """
+    samples = block.shape[1]
+    positions = numpy.arange(samples)
+    if max_points is None or samples <= max_points:
+        return positions, block
+
+    group = int(numpy.ceil(samples / (max_points / 2.0)))
+    usable = samples - samples % group
+    start = samples - usable
+    grouped = block[:, start:].reshape(block.shape[0], -1, group)
+
+    decimated = numpy.empty((block.shape[0], grouped.shape[1] * 2))
+    decimated[:, 0::2] = numpy.fmin.reduce(grouped, axis=2)
+    decimated[:, 1::2] = numpy.fmax.reduce(grouped, axis=2)
+
+    positions = numpy.repeat(positions[start::group], 2)
+    positions[1::2] += group - 1
+    return positions, decimated
+
+
+class ViewSpec(object):
+    """ A view of a dashboard: the latest size values averaged over the
+    interval in milliseconds, zero for every read, in a window at the
+    geometry. Curves are decimated to max_points, twice the window width by
+    default. The source names the ingest source of the view, None for the
+    first one.
+    """
+    def __init__(self, size, interval=0, geometry=None, max_points=None,
+                 title=None, source=None):
+        super(ViewSpec, self).__init__()
+        self.size = size
+        self.interval = interval
+        self.geometry = geometry or [0, 0, 1920, 333]
+        self.max_points = max_points
+        if max_points is None:
+            self.max_points = 2 * self.geometry[2]
+
+        self.source = source
+        self.title = title
+        if title is None:
+            self.title = "Updated every %s ms for %s reads" % (interval, size)
+            if source is not None:
+                self.title = "%s %s" % (source, self.title)
+
+    def __repr__(self):
+        return "ViewSpec(%s, %s, %s)" % (self.size, self.interval,
+                                         self.geometry)
+
+
+def parse_view(text):
+    """ Return the ViewSpec of a SIZE,UPDATE or SIZE,UPDATE,X,Y,W,H option,
+    optionally followed by @SOURCE.
+    """
+    source = None
+    if "@" in text:
+        text, source = text.split("@", 1)
+
+    parts = [int(part) for part in text.split(",")]
+    if len(parts) not in (2, 6):
+        raise ValueError("Expected SIZE,UPDATE[,X,Y,W,H][@SOURCE], not %s"
+                         % text)
+    return ViewSpec(size=parts[0], interval=parts[1],
+                    geometry=parts[2:] or None, source=source)
+
+
+# The three windows of TripleVisualizer.bat: every read, ten second averages
+# for one day and one minute averages for 100 days
+DEFAULT_VIEWS = ["3000,0,0,25,1920,333",
+                 "8640,10000,0,385,1920,333",
+                 "144000,60000,0,740,1920,333"]
@@ -0,0 +1,774 @@
+""" Multiplex many data sources in one acquisition process: zmq
+subscriptions, serial ports and csv files followed as they grow, each with
+its own parser and rate accounting. A SubProcess per source does not scale
+to a dozen BoardTester publishers.
+
+Python 2 has no asyncio, so the event loop is a zmq.Poller, which waits on
+the zmq sockets and, on POSIX, the file descriptors of serial ports at the
+same time. Files are always readable to a poller, so csv tails, and serial
+ports on Windows, are read on every pass instead, at least every
+poll_interval seconds.
+
+    engine = ingest.IngestEngine(log_queue, [
+        ingest.ZMQSource("board1", "tcp://10.0.0.1:6545"),
+        ingest.ZMQSource("board2", "tcp://10.0.0.2:6545"),
+        ingest.CSVTailSource("combined", "combined_log.csv")])
+
+    result = engine.read(timeout=1.0)
+    if result is not None:
+        count, batches, info = result
+        for name, (timestamps, values) in batches.items():
+            print name, values.mean(axis=0)
+
+Create the sources with their settings only: they open their sockets,
+ports and files in the engine process. Every batch_interval seconds the
+rows received from every source are delivered together, so a reader
+makes one queue read per interval however many sources there are.
+"""
+
+import io
+import os
+import sys
+import time
+import json
+import Queue
+import struct
+import threading
+
+from collections import deque
+
+from multiprocessing import Queue as MPQueue
+from multiprocessing import Process
+
+import zmq
+import numpy
+import serial
+
+from . import applog, buffers, devices, events, procstats, profiling
+from . import zmqstream
+
+import logging
+log = logging.getLogger(__name__)
+
+# Messages and lines that fail to parse are counted and skipped
+PARSE_ERRORS = devices.DATA_ERRORS + (struct.error,)
+
+
+class CSVParser(object):
+    """ Parse a comma delimited line into a list of floats, skipping the
+    first skip_columns columns, such as the timestamp of the combined log.
+    Lines with other fields, like a header, raise ValueError.
+    """
+    def __init__(self, skip_columns=0, delimiter=","):
+        super(CSVParser, self).__init__()
+        self.skip_columns = skip_columns
+        self.delimiter = delimiter
+
+    def __call__(self, line):
+        fields = line.split(self.delimiter)[self.skip_columns:]
+        return [float(field) for field in fields]
+
+
+class Source(object):
+    """ Base class of the ingestion sources. Subclasses open their
+    connection in open, return the zmq socket or file descriptor to poll
+    from poll_target, or None to be read on every pass, and parse what
+    they receive in receive.
+
+    The parser turns one message or line into a list of values. Those it
+    can't parse, and rows with a different number of values than the rest
+    of the batch, are counted as errors and skipped.
+    """
+    def __init__(self, name, parser=None):
+        super(Source, self).__init__()
+        self.name = name
+        self.parser = parser
+
+        self.timestamps = []
+        self.values = []
+        self.partial = ""
+
+        self.messages = 0
+        self.received_bytes = 0
+        self.samples = 0
+        self.errors = 0
+        self.last_error = None
+        self.dropped = 0
+        self.rate = 0.0
+        self.interval_samples = 0
+
+        # Connection state, managed by the engine
+        self.connected = False
+        self.target = None
+        self.retry_time = None
+        self.backoff = 0.1
+        self.reconnects = 0
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def poll_target(self):
+        return None
+
+    def receive(self, now):
+        raise NotImplementedError
+
+    def parse(self, raw, now):
+        """ Count and decode a single message or line received at now.
+        """
+        self.messages += 1
+        self.received_bytes += len(raw)
+        try:
+            self.decode(raw, now)
+        except PARSE_ERRORS as exc:
+            self.error(exc)
+
+    def parse_lines(self, data, now):
+        """ Parse every complete line of the data, keeping a partial last
+        line until the rest arrives.
+        """
+        lines = (self.partial + data).split("\n")
+        self.partial = lines.pop()
+        for line in lines:
+            line = line.strip()
+            if line:
+                self.parse(line, now)
+
+    def decode(self, raw, now):
+        self.add(now, self.parser(raw))
+
+    def add(self, timestamp, row):
+        """ Add a row of values to the current batch.
+        """
+        self.add_rows([timestamp], [row])
+
+    def add_rows(self, timestamps, rows):
+        """ Add the rows of a message to the current batch, all of them or
+        none if any has a different number of values than the batch.
+        """
+        width = None
+        if self.values:
+            width = len(self.values[-1])
+        for row in rows:
+            if width is not None and len(row) != width:
+                raise ValueError("%s values, expected %s" % (len(row), width))
+            width = len(row)
+
+        self.timestamps.extend(timestamps)
+        self.values.extend(rows)
+        self.samples += len(rows)
+
+    def error(self, exc):
+        self.errors += 1
+        self.last_error = "%s: %s" % (exc.__class__.__name__, exc)
+
+    def take_batch(self):
+        """ Return the rows added since the last call as a tuple of
+        (timestamps, values) numpy arrays with one row of values per
+        timestamp, or None if there are none.
+        """
+        if not self.timestamps:
+            return None
+
+        timestamps = numpy.array(self.timestamps)
+        values = numpy.array(self.values, dtype=float)
+        values = values.reshape(len(timestamps), -1)
+        self.timestamps = []
+        self.values = []
+        return timestamps, values
+
+    def interval(self, elapsed):
+        """ Update the samples per second over the elapsed seconds since
+        the previous call.
+        """
+        self.rate = (self.samples - self.interval_samples) / elapsed
+        self.interval_samples = self.samples
+        return self.rate
+
+    def stats(self):
+        """ Return the counters as a dictionary suitable for pickling across
+        processes.
+        """
+        return {"connected": self.connected,
+                "messages": self.messages,
+                "bytes": self.received_bytes,
+                "samples": self.samples,
+                "samples_per_second": self.rate,
+                "errors": self.errors,
+                "last_error": self.last_error,
+                "dropped": self.dropped,
+                "reconnects": self.reconnects}
+
+
+class ZMQSource(Source):
+    """ Subscribe to a publisher of any zmqstream format: text, binary or
+    batch messages, with sequence accounting where the messages carry
+    sequence numbers. Specify a parser to decode the messages, topic
+    included, some other way. At most max_messages are read per pass, so a
+    busy publisher can't starve the other sources.
+    """
+    def __init__(self, name, address, topic="temperatures_and_power",
+                 parser=None, rcvhwm=None, max_messages=1000):
+        super(ZMQSource, self).__init__(name, parser)
+        self.address = address
+        self.topic = topic
+        self.rcvhwm = rcvhwm
+        self.max_messages = max_messages
+        self.socket = None
+        self.sequence = zmqstream.SequenceTracker()
+
+    def open(self):
+        self.socket = zmq.Context.instance().socket(zmq.SUB)
+        if self.rcvhwm is not None:
+            self.socket.setsockopt(zmq.RCVHWM, self.rcvhwm)
+        log.debug("Source %s connect to %s, topic: %s", self.name,
+                  self.address, self.topic)
+        self.socket.connect(self.address)
+        self.socket.setsockopt(zmq.SUBSCRIBE, self.topic)
+
+    def close(self):
+        if self.socket is not None:
+            self.socket.close(linger=0)
+            self.socket = None
+
+    def poll_target(self):
+        return self.socket
+
+    def receive(self, now):
+        for count in range(self.max_messages):
+            try:
+                message = self.socket.recv(zmq.NOBLOCK)
+            except zmq.Again:
+                return
+            self.parse(message, now)
+
+    def decode(self, message, now):
+        """ Add the samples of the message, with the timestamps of batch
+        messages and the receive time otherwise.
+        """
+        if self.parser is not None:
+            return super(ZMQSource, self).decode(message, now)
+
+        topic, payload = message.split(" ", 1)
+        if payload.startswith(zmqstream.BATCH_MARKER):
+            timestamps, values, sequence = zmqstream.decode_batch(message)
+            self.add_rows(timestamps.tolist(), values.tolist())
+        else:
+            values, sequence, send_time = zmqstream.decode(message)
+            self.add(now, values)
+
+        if sequence is not None:
+            self.sequence.update(sequence)
+
+    def stats(self):
+        stats = super(ZMQSource, self).stats()
+        stats["sequence"] = self.sequence.stats()
+        return stats
+
+
+class SerialSource(Source):
+    """ Read lines of values from a serial port, or any pyserial url such
+    as loop://, parsed as csv by default.
+    """
+    def __init__(self, name, port, baudrate=115200, parser=None,
+                 chunk_size=4096):
+        super(SerialSource, self).__init__(name, parser or CSVParser())
+        self.port = port
+        self.baudrate = baudrate
+        self.chunk_size = chunk_size
+        self.serial_port = None
+
+    def open(self):
+        self.partial = ""
+        self.serial_port = serial.serial_for_url(self.port,
+                                                 baudrate=self.baudrate,
+                                                 timeout=0)
+
+    def close(self):
+        if self.serial_port is not None:
+            self.serial_port.close()
+            self.serial_port = None
+
+    def poll_target(self):
+        """ Return the file descriptor of the port, or None on Windows and
+        for urls without one.
+        """
+        try:
+            return self.serial_port.fileno()
+        except AttributeError:
+            return None
+
+    def receive(self, now):
+        data = self.serial_port.read(self.chunk_size)
+        if data:
+            self.parse_lines(data, now)
+
+
+class CSVTailSource(Source):
+    """ Follow a csv file as lines are appended, like tail -f. Starts at
+    the end of the file unless from_start is set. A file that is replaced
+    or truncated, as by log rotation, is read again from the start.
+    """
+    def __init__(self, name, filename, parser=None, from_start=False,
+                 chunk_size=65536):
+        super(CSVTailSource, self).__init__(name, parser or CSVParser())
+        self.filename = filename
+        self.from_start = from_start
+        self.chunk_size = chunk_size
+        self.tail_file = None
+        self.opened = False
+
+    def open(self):
+        """ Open the file, at the end on the first attempt unless from_start
+        is set, as a file that appears later is all new. The io module is
+        used as stdio keeps returning end of file after reaching it once on
+        some platforms.
+        """
+        first = not self.opened
+        self.opened = True
+
+        self.partial = ""
+        self.tail_file = io.open(self.filename, "rb")
+        if first and not self.from_start:
+            self.tail_file.seek(0, os.SEEK_END)
+
+    def close(self):
+        if self.tail_file is not None:
+            self.tail_file.close()
+            self.tail_file = None
+
+    def receive(self, now):
+        data = self.tail_file.read(self.chunk_size)
+        if data:
+            self.parse_lines(data, now)
+            return
+
+        if self.replaced():
+            log.info("%s replaced, read from the start", self.filename)
+            self.close()
+            self.open()
+
+    def replaced(self):
+        """ Return True if the file name now refers to another file, or the
+        file is shorter than the position read to.
+        """
+        try:
+            current = os.stat(self.filename)
+        except OSError:
+            return False
+
+        opened = os.fstat(self.tail_file.fileno())
+        if current.st_ino != opened.st_ino:
+            return True
+        return current.st_size < self.tail_file.tell()
+
+
+class IngestEngine(object):
+    """ Read every source in a single event loop, on a process or, with
+    backend set to thread, on a daemon thread of this process. Every
+    batch_interval seconds the rows received from all sources are put on
+    the results queue as one result, see read. Up to queue_size results
+    are held for the reader, further ones are dropped and counted per
+    source.
+
+    A source that fails with a connection error, such as an unplugged
+    serial port or a missing file, is closed and opened again with backoff
+    up to max_backoff seconds, while the others carry on. A source that
+    fails otherwise is closed for good.
+
+    The samples per second of every source are recorded once per second
+    as "ingest" performance events, and the engine returns a report of
+    the whole run at close.
+
+    The engine has the read, poll_state, device_name and close of a
+    wrapper.SubProcess, so a controller can display its batches, see
+    control.DashboardController.
+    """
+    def __init__(self, log_queue, sources, batch_interval=0.05,
+                 queue_size=100, poll_interval=0.01, max_backoff=5.0,
+                 backend="process"):
+        super(IngestEngine, self).__init__()
+        log.debug("%s setup", self.__class__.__name__)
+
+        names = [source.name for source in sources]
+        if len(set(names)) != len(names):
+            raise ValueError("Source names must be unique: %s" % names)
+
+        if backend not in ("process", "thread"):
+            raise ValueError("Unknown backend %s, use process or thread"
+                             % backend)
+
+        self.log_queue = log_queue
+        self.sources = list(sources)
+        self.batch_interval = batch_interval
+        self.queue_size = queue_size
+        self.poll_interval = poll_interval
+        self.max_backoff = max_backoff
+        self.backend = backend
+
+        self.device_name = "IngestEngine"
+        self.switch_pending = None
+        self.closing = False
+        self.drained = deque()
+        self.count = 0
+        self.usage = None
+        self.source_stats = {}
+        self.report = None
+
+        self.start()
+
+    def start(self):
+        """ Start the event loop with new queues.
+        """
+        if self.backend == "thread":
+            self.results = buffers.SingleProducerBuffer(self.queue_size)
+            self.control = buffers.SingleProducerBuffer(maxsize=1)
+            self.reports = buffers.SingleProducerBuffer(maxsize=1)
+        else:
+            self.results = MPQueue(maxsize=self.queue_size)
+            self.control = MPQueue(maxsize=1)
+            self.reports = MPQueue(maxsize=1)
+
+        args = (self.log_queue, self.results, self.control, self.reports)
+        if self.backend == "thread":
+            self.proc = threading.Thread(target=self.run, args=args,
+                                         name="Ingest")
+            self.proc.daemon = True
+        else:
+            self.proc = Process(target=self.run, args=args)
+        self.proc.start()
+
+    @profiling.profiled("ingest")
+    def run(self, log_queue, results, control, reports):
+        """ Poll the sources until the poison pill arrives on the control
+        queue, delivering batches and rate events on the way, then put the
+        run report on the reports queue.
+        """
+        if self.backend == "process":
+            applog.process_log_configure(log_queue)
+        self.results = results
+
+        start_time = time.time()
+        poller = zmq.Poller()
+        for source in self.sources:
+            self.open_source(source, poller)
+
+        poll_ms = int(min(self.poll_interval, self.batch_interval) * 1000)
+        batch_time = time.time()
+        stats_time = batch_time
+        self.refresh_stats()
+
+        log.debug("Start of ingest loop with %s sources", len(self.sources))
+        while not control.full():
+
+            # An empty poller would return at once
+            if poller.sockets:
+                ready = dict(poller.poll(poll_ms))
+            else:
+                ready = {}
+                time.sleep(poll_ms / 1000.0)
+
+            now = time.time()
+            for source in self.sources:
+                if not source.connected:
+                    if source.retry_time is not None \
+                       and now >= source.retry_time:
+                        self.open_source(source, poller)
+                    continue
+
+                if source.target is not None and source.target not in ready:
+                    continue
+
+                try:
+                    source.receive(now)
+                except Exception as exc:
+                    self.source_failed(source, poller, exc)
+
+            if now - batch_time >= self.batch_interval:
+                self.put_batches(now)
+                batch_time = now
+
+            if now - stats_time >= 1.0:
+                self.emit_rates(now - stats_time)
+                self.refresh_stats()
+                stats_time = now
+
+        self.put_batches(time.time())
+        report = {"duration_s": time.time() - start_time,
+                  "results": self.count,
+                  "usage": procstats.process_usage(),
+                  "sources": dict([(source.name, source.stats())
+                                   for source in self.sources])}
+
+        for source in self.sources:
+            self.close_source(source, poller)
+        events.emit("ingest_report", **report)
+        try:
+            reports.put(report, block=False)
+        except Queue.Full:
+            log.warning("Ingest report already sent")
+
+        log.debug("End of ingest loop")
+
+    def open_source(self, source, poller):
+        """ Open the source and register it with the poller, or schedule
+        the next attempt if it fails.
+        """
+        try:
+            source.open()
+        except Exception as exc:
+            self.source_failed(source, poller, exc)
+            return
+
+        source.target = source.poll_target()
+        if source.target is not None:
+            poller.register(source.target, zmq.POLLIN)
+
+        source.connected = True
+        source.retry_time = None
+        source.backoff = 0.1
+        log.info("Source %s open", source.name)
+
+    def close_source(self, source, poller):
+        """ Unregister and close the source, logging any problem.
+        """
+        if source.target is not None:
+            poller.unregister(source.target)
+            source.target = None
+        source.connected = False
+
+        try:
+            source.close()
+        except Exception:
+            log.exception("Problem closing source %s", source.name)
+
+    def source_failed(self, source, poller, exc):
+        """ Close the source, and on a connection error retry it with
+        backoff. Other errors close the source for good.
+        """
+        source.error(exc)
+        self.close_source(source, poller)
+
+        if devices.classify_error(exc) != "connection":
+            log.error("Source %s failed, closed: %s", source.name,
+                      source.last_error)
+            source.retry_time = None
+            return
+
+        log.warning("Source %s: %s, retry in %0.1fs", source.name,
+                    source.last_error, source.backoff)
+        source.retry_time = time.time() + source.backoff
+        source.backoff = min(source.backoff * 2, self.max_backoff)
+        source.reconnects += 1
+        events.emit("ingest_reconnect", source=source.name,
+                    reconnects=source.reconnects, error=source.last_error)
+
+    def put_batches(self, now):
+        """ Put the rows received from every source since the last call
+        on the results queue as a single result, or count them as dropped
+        if the reader has fallen behind.
+        """
+        batches = {}
+        for source in self.sources:
+            batch = source.take_batch()
+            if batch is not None:
+                batches[source.name] = batch
+
+        if not batches:
+            return
+
+        self.count += 1
+        info = {"sources": self.source_stats, "process": self.usage,
+                "read_time": now}
+        try:
+            self.results.put((self.count, batches, info), block=False)
+        except Queue.Full:
+            for source in self.sources:
+                if source.name in batches:
+                    source.dropped += len(batches[source.name][0])
+
+    def emit_rates(self, elapsed):
+        """ Record the samples per second of every source over the elapsed
+        seconds as performance events.
+        """
+        for source in self.sources:
+            source.interval(elapsed)
+            events.emit("ingest", source=source.name,
+                        samples_per_second=source.rate,
+                        errors=source.errors, dropped=source.dropped,
+                        connected=source.connected)
+
+    def refresh_stats(self):
+        """ Update the source statistics and resource use sent with the
+        results, once per second.
+        """
+        self.usage = procstats.process_usage()
+        self.source_stats = dict([(source.name, source.stats())
+                                  for source in self.sources])
+
+    def read(self, timeout=None):
+        """ Return None if no result is waiting, or after the timeout in
+        seconds if specified. Otherwise return a tuple of the result count,
+        a dictionary of source name to a tuple of (timestamps, values)
+        arrays for every source that received rows, and a dictionary of the
+        per source statistics and the resource use of the engine. Results
+        received during close are returned first.
+        """
+        if self.drained:
+            result = self.drained.popleft()
+            self.source_stats = result[2]["sources"]
+            return result
+
+        try:
+            result = self.results.get(block=timeout is not None,
+                                      timeout=timeout)
+        except Queue.Empty:
+            return None
+
+        self.source_stats = result[2]["sources"]
+        return result
+
+    def poll_state(self):
+        """ Return stopped if the event loop has exited, reconnecting while
+        none of the sources is connected, and running otherwise, from the
+        source statistics of the latest result.
+        """
+        if not self.proc.is_alive():
+            return "stopped"
+
+        connected = [stats["connected"]
+                     for stats in self.source_stats.values()]
+        if connected and not any(connected):
+            return "reconnecting"
+        return "running"
+
+    def close(self):
+        """ Stop the event loop and wait for its report, available as the
+        report attribute and logged as a json summary. Further calls do
+        nothing.
+        """
+        if self.closing:
+            return
+
+        self.closing = True
+        log.debug("Add none to control poison pill")
+        try:
+            self.control.put(None, block=True, timeout=1.0)
+        except Queue.Full:
+            log.critical("Can't add poison pill")
+
+        self.report = self.receive_report()
+
+        # A process exits once the queue feeder has written every result,
+        # which may need room in the pipe
+        end_time = time.time() + 1.0
+        while self.proc.is_alive() and time.time() < end_time:
+            self.drain_results()
+            self.proc.join(timeout=0.01)
+        self.drain_results()
+
+        if self.proc.is_alive():
+            log.warning("Ingest event loop did not exit in 1 s")
+            if self.backend == "process":
+                self.proc.terminate()
+
+    def receive_report(self):
+        """ Wait for the report of the event loop, and log it as a json
+        summary. Returns None if no report arrives. Meanwhile keep the
+        results that arrive, for the final batches to have room and for
+        read to return after close, as in wrapper.SubProcess.
+        """
+        timeout = 2.0
+        if not self.proc.is_alive():
+            timeout = 0.1
+
+        end_time = time.time() + timeout
+        while True:
+            self.drain_results()
+            try:
+                report = self.reports.get(block=True, timeout=0.01)
+                break
+            except Queue.Empty:
+                if time.time() >= end_time:
+                    log.warning("No ingest report")
+                    return None
+
+        log.info("Ingest report: %s", json.dumps(report, sort_keys=True))
+        return report
+
+    def drain_results(self):
+        """ Move the results waiting on the results queue to drained.
+        """
+        while True:
+            try:
+                self.drained.append(self.results.get_nowait())
+            except Queue.Empty:
+                return
+
+
+def parse_source(kind, spec):
+    """ Return the source for a command line spec of name=target, or just
+    the target to use it as the name too.
+    """
+    name, target = spec, spec
+    if "=" in spec:
+        name, target = spec.split("=", 1)
+
+    if kind == "zmq":
+        return ZMQSource(name, target)
+    if kind == "serial":
+        return SerialSource(name, target)
+    return CSVTailSource(name, target)
+
+
+def main(argv=None):
+    """ Ingest from the specified sources and log the rate of each once
+    per second.
+    """
+    import argparse
+    parser = argparse.ArgumentParser(description="ingest from many sources"
+                                                 " in one process")
+    parser.add_argument("--zmq", type=str, action="append", default=[],
+                        help="name=tcp://host:port publisher, repeat for"
+                             " more")
+    parser.add_argument("--serial", type=str, action="append", default=[],
+                        help="name=port serial port of csv lines")
+    parser.add_argument("--tail", type=str, action="append", default=[],
+                        help="name=filename csv file to follow")
+    parser.add_argument("-t", "--duration", type=float, default=None,
+                        help="Seconds to ingest for, forever if not"
+                             " specified")
+    args = parser.parse_args(argv)
+
+    sources = [parse_source("zmq", spec) for spec in args.zmq] \
+        + [parse_source("serial", spec) for spec in args.serial] \
+        + [parse_source("tail", spec) for spec in args.tail]
+    if not sources:
+        parser.error("Specify at least one source")
+
+    main_logger = applog.MainLogger()
+    engine = IngestEngine(main_logger.log_queue, sources)
+    start_time = time.time()
+    summary_time = start_time
+    try:
+        while args.duration is None \
+              or time.time() - start_time < args.duration:
+            result = engine.read(timeout=0.1)
+            if result is not None and time.time() - summary_time >= 1.0:
+                summary_time = time.time()
+                for name, stats in sorted(result[2]["sources"].items()):
+                    log.info("%s %0.1f samples/s, %s errors, %s dropped",
+                             name, stats["samples_per_second"],
+                             stats["errors"], stats["dropped"])
+    except KeyboardInterrupt:
+        pass
+    finally:
+        engine.close()
+        main_logger.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
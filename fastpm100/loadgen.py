@@ -0,0 +1,129 @@
+""" High rate, deterministic zmq publisher for throughput testing of the
+zmq devices and the controllers that display them. See
+scripts/ZMQLoadGenerator.py for the command line interface.
+"""
+
+import time
+import logging
+
+import zmq
+import numpy
+
+from . import devices, zmqstream
+
+log = logging.getLogger(__name__)
+
+
+class LoadGenerator(object):
+    """ Publish a deterministic, seeded multi-channel signal at a fixed
+    message rate for throughput testing of the zmq devices. Each channel
+    is a PowerTraceGenerator trace without pulses, offset so the channels
+    are visually distinct. Messages are generated in blocks of one
+    hundredth of a second and sent on an absolute schedule, so a late
+    send is caught up with a burst instead of lowering the rate.
+    """
+    def __init__(self, port="6545", topic="temperatures_and_power",
+                 rate=1000, channels=6, binary=False, sequence=True,
+                 seed=None, send_hwm=None):
+        super(LoadGenerator, self).__init__()
+        log.debug("%s setup", self.__class__.__name__)
+
+        self.topic = topic
+        self.rate = rate
+        self.channels = channels
+        self.binary = binary
+        self.sequence = sequence
+        self.block_size = max(1, int(rate / 100))
+
+        self.generators = []
+        for channel in range(channels):
+            channel_seed = None
+            if seed is not None:
+                channel_seed = seed + channel
+            generator = devices.PowerTraceGenerator(
+                sample_rate=rate, seed=channel_seed,
+                baseline=30.0 + 5.0 * channel, pulse_frequency=None,
+                dropout_rate=0.0)
+            self.generators.append(generator)
+
+        self.context = zmq.Context()
+        self.socket = self.context.socket(zmq.PUB)
+        if send_hwm is not None:
+            self.socket.setsockopt(zmq.SNDHWM, send_hwm)
+
+        bind_str = "tcp://*:%s" % port
+        log.info("Setup zmq publisher on %s", bind_str)
+        self.socket.bind(bind_str)
+
+        self.sent = 0
+
+    def next_block(self):
+        """ Return the next block of samples as rows of messages by
+        columns of channels.
+        """
+        columns = [gen.block(self.block_size) for gen in self.generators]
+        return numpy.column_stack(columns)
+
+    def encode(self, values):
+        """ Build the next message in the configured format.
+        """
+        if self.binary:
+            return zmqstream.encode_binary(self.topic, values, self.sent)
+
+        sequence = None
+        if self.sequence:
+            sequence = self.sent
+        return zmqstream.encode_text(self.topic, values, sequence)
+
+    def run(self, duration=None, report_interval=1.0):
+        """ Publish until the duration in seconds has elapsed, or forever if
+        it is None. Log the achieved rate every report interval, and return
+        a summary dictionary of the whole run.
+        """
+        interval = 1.0 / self.rate
+        start_time = time.time()
+        report_time = start_time
+        report_sent = self.sent
+
+        # Checking the schedule costs as much as formatting a message, so
+        # only check it once per millisecond worth of messages
+        check_every = max(1, int(self.rate / 1000))
+
+        running = True
+        while running:
+            for values in self.next_block().tolist():
+                if self.sent % check_every == 0:
+                    wait = start_time + self.sent * interval - time.time()
+                    if wait > 0:
+                        time.sleep(wait)
+
+                self.socket.send(self.encode(values))
+                self.sent += 1
+
+            now = time.time()
+            if now - report_time >= report_interval:
+                achieved = (self.sent - report_sent) / (now - report_time)
+                log.info("Sent %s messages, %.0f msg/s", self.sent,
+                         achieved)
+                report_time = now
+                report_sent = self.sent
+
+            if duration is not None and now - start_time >= duration:
+                running = False
+
+        elapsed = time.time() - start_time
+        summary = {"sent": self.sent,
+                   "elapsed": elapsed,
+                   "rate": self.sent / elapsed,
+                   "requested_rate": self.rate,
+                   "channels": self.channels,
+                   "binary": self.binary}
+        log.info("Load generator summary: %s", summary)
+        return summary
+
+    def close(self):
+        """ Release the publisher socket without waiting for unsent
+        messages.
+        """
+        self.socket.close(linger=0)
+        self.context.term()
@@ -0,0 +1,135 @@
+""" Opt-in low jitter settings for the acquisition process on Linux: pin it
+to chosen cpus, raise its scheduling priority where permitted, and keep the
+cyclic garbage collector out of the read loop.
+
+Create the settings in the parent and pass them to wrapper.SubProcess, which
+applies them in the acquisition process. With the collector disabled,
+SubProcess calls safe_point once per second, between reads, to collect the
+youngest generation, and every full_interval safe points all generations.
+Python 2 has no gc.freeze, so long lived objects are still scanned by the
+full collections.
+"""
+
+import os
+import gc
+import time
+import ctypes
+import ctypes.util
+import platform
+
+import logging
+log = logging.getLogger(__name__)
+
+
+def libc():
+    return ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+
+
+def set_affinity(cpus):
+    """ Restrict the current process to the list of cpu numbers with
+    sched_setaffinity. Raises OSError if the kernel refuses.
+    """
+    mask = ctypes.c_ulonglong(sum([1 << cpu for cpu in cpus]))
+    result = libc().sched_setaffinity(0, ctypes.sizeof(mask),
+                                      ctypes.byref(mask))
+    if result != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno))
+
+
+def get_affinity():
+    """ Return the list of cpu numbers the current process may run on.
+    """
+    mask = ctypes.c_ulonglong(0)
+    result = libc().sched_getaffinity(0, ctypes.sizeof(mask),
+                                      ctypes.byref(mask))
+    if result != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno))
+
+    return [cpu for cpu in range(64) if mask.value & (1 << cpu)]
+
+
+class LowJitter(object):
+    """ Settings to apply in the acquisition process. Leave cpus as None to
+    keep the current affinity, and niceness as None to keep the priority.
+    Negative niceness raises the priority, which usually needs root or
+    CAP_SYS_NICE, otherwise it is logged and skipped.
+    """
+    def __init__(self, cpus=None, niceness=-10, disable_gc=True,
+                 full_interval=60):
+        super(LowJitter, self).__init__()
+        self.cpus = cpus
+        self.niceness = niceness
+        self.disable_gc = disable_gc
+        self.full_interval = full_interval
+
+        self.applied = {}
+        self.safe_points = 0
+        self.collections = 0
+        self.collect_time = 0.0
+        self.max_collect_time = 0.0
+
+    def apply(self):
+        """ Apply the settings to the current process, and return a
+        dictionary of those that took effect.
+        """
+        linux = "Linux" in platform.platform()
+
+        if self.cpus is not None:
+            if linux:
+                try:
+                    set_affinity(self.cpus)
+                    self.applied["cpus"] = get_affinity()
+                except OSError as exc:
+                    log.warning("Can't pin to cpus %s: %s", self.cpus, exc)
+            else:
+                log.warning("Cpu pinning is only supported on Linux")
+
+        if self.niceness is not None:
+            try:
+                self.applied["niceness"] = os.nice(self.niceness)
+            except (OSError, AttributeError) as exc:
+                log.warning("Can't change niceness by %s: %s",
+                            self.niceness, exc)
+
+        if self.disable_gc:
+            gc.collect()
+            gc.disable()
+            self.applied["gc_disabled"] = True
+
+        log.info("Low jitter settings applied: %s", self.applied)
+        return self.applied
+
+    def safe_point(self):
+        """ Collect garbage at a point of the loop where a pause does no
+        harm, when the collector is disabled.
+        """
+        if not self.disable_gc:
+            return
+
+        self.safe_points += 1
+        generation = 0
+        if self.safe_points % self.full_interval == 0:
+            generation = 2
+
+        start_time = time.time()
+        gc.collect(generation)
+        elapsed = time.time() - start_time
+
+        self.collections += 1
+        self.collect_time += elapsed
+        self.max_collect_time = max(self.max_collect_time, elapsed)
+
+    def restore(self):
+        if self.disable_gc:
+            gc.enable()
+
+    def report(self):
+        """ Return the applied settings and the safe point collection times
+        in milliseconds.
+        """
+        return {"applied": self.applied,
+                "collections": self.collections,
+                "collect_ms": self.collect_time * 1000.0,
+                "max_collect_ms": self.max_collect_time * 1000.0}
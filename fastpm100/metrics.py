@@ -0,0 +1,330 @@
+""" Latency histograms, counters and gauges collected in each process, and
+exported periodically for diagnosing slow viewers.
+
+Each process keeps its own Registry. The acquisition process sends a
+snapshot of its registry to the viewer along with its results, and the
+viewer exports both with a MetricsExporter: one json object per line to a
+file, a "metrics" topic message on a zmq PUB socket, and Prometheus text
+format on a local http port, each optional.
+"""
+
+import json
+import time
+import bisect
+import threading
+import BaseHTTPServer
+
+import zmq
+
+import logging
+log = logging.getLogger(__name__)
+
+# Upper bounds of the histogram buckets in milliseconds
+DEFAULT_BOUNDS = (0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0, 10.0,
+                  20.0, 50.0, 100.0, 200.0, 500.0, 1000.0)
+
+
+class Histogram(object):
+    """ Count durations into fixed millisecond buckets, with the sum and
+    maximum, so observing is cheap and snapshots are small.
+    """
+    def __init__(self, bounds=DEFAULT_BOUNDS):
+        super(Histogram, self).__init__()
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def observe(self, seconds):
+        """ Count a single duration in seconds.
+        """
+        value = seconds * 1000.0
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.maximum:
+            self.maximum = value
+
+    def quantile(self, fraction):
+        """ Return the upper bound of the bucket that holds the fraction of
+        observations, or the maximum for the overflow bucket.
+        """
+        if self.count == 0:
+            return None
+
+        target = fraction * self.count
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= target and count > 0:
+                if index < len(self.bounds):
+                    return min(self.bounds[index], self.maximum)
+                break
+        return self.maximum
+
+    def snapshot(self):
+        return {"count": self.count,
+                "sum_ms": self.total,
+                "max_ms": self.maximum,
+                "p50_ms": self.quantile(0.5),
+                "p99_ms": self.quantile(0.99),
+                "bounds": self.bounds,
+                "buckets": list(self.counts)}
+
+
+class Registry(object):
+    """ Named counters, gauges and histograms of a single process.
+    """
+    def __init__(self):
+        super(Registry, self).__init__()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+
+    def increment(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def set_gauge(self, name, value):
+        self.gauges[name] = value
+
+    def observe(self, name, seconds):
+        """ Add a duration in seconds to the named histogram.
+        """
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = Histogram()
+            self.histograms[name] = histogram
+        histogram.observe(seconds)
+
+    def snapshot(self):
+        """ Return all metrics as a dictionary suitable for pickling across
+        processes and writing as json.
+        """
+        return {"counters": dict(self.counters),
+                "gauges": dict(self.gauges),
+                "histograms": dict([(name, histogram.snapshot())
+                                    for name, histogram
+                                    in self.histograms.items()])}
+
+
+def prometheus_text(snapshots):
+    """ Return the Prometheus text exposition of a dictionary of process name
+    to registry snapshot.
+    """
+    lines = []
+    for process, snapshot in sorted(snapshots.items()):
+        label = 'process="%s"' % process
+
+        for name, value in sorted(snapshot["counters"].items()):
+            lines.append("fastpm100_%s_total{%s} %s" % (name, label, value))
+
+        for name, value in sorted(snapshot["gauges"].items()):
+            if value is not None:
+                lines.append("fastpm100_%s{%s} %s" % (name, label, value))
+
+        for name, histogram in sorted(snapshot["histograms"].items()):
+            metric = "fastpm100_%s_ms" % name
+            cumulative = 0
+            bounds = histogram["bounds"] + ["+Inf"]
+            for bound, count in zip(bounds, histogram["buckets"]):
+                cumulative += count
+                lines.append('%s_bucket{%s,le="%s"} %s'
+                             % (metric, label, bound, cumulative))
+            lines.append("%s_sum{%s} %s" % (metric, label,
+                                            histogram["sum_ms"]))
+            lines.append("%s_count{%s} %s" % (metric, label,
+                                              histogram["count"]))
+
+    return "\n".join(lines) + "\n"
+
+
+class MetricsExporter(object):
+    """ Export snapshots of every process to any of a json lines file, a zmq
+    PUB socket and a Prometheus text http endpoint on localhost.
+    """
+    def __init__(self, filename=None, publish_address=None, http_port=None):
+        super(MetricsExporter, self).__init__()
+        log.debug("%s setup", self.__class__.__name__)
+
+        self.metrics_file = None
+        if filename is not None:
+            self.metrics_file = open(filename, "a")
+
+        self.context = None
+        self.socket = None
+        if publish_address is not None:
+            self.context = zmq.Context()
+            self.socket = self.context.socket(zmq.PUB)
+            log.debug("Publish metrics on %s", publish_address)
+            self.socket.bind(publish_address)
+
+        self.text = ""
+        self.server = None
+        if http_port is not None:
+            self.server = self.create_server(http_port)
+
+    def create_server(self, port):
+        """ Serve the latest Prometheus text from a daemon thread.
+        """
+        exporter = self
+
+        class MetricsHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = exporter.text
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = BaseHTTPServer.HTTPServer(("127.0.0.1", int(port)),
+                                           MetricsHandler)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        log.debug("Serve metrics on http://127.0.0.1:%s/", port)
+        return server
+
+    def export(self, snapshots):
+        """ Export a dictionary of process name to registry snapshot.
+        """
+        record = {"time": time.time(), "processes": snapshots}
+        line = json.dumps(record, sort_keys=True)
+
+        if self.metrics_file is not None:
+            self.metrics_file.write(line + "\n")
+            self.metrics_file.flush()
+
+        if self.socket is not None:
+            self.socket.send("metrics %s" % line)
+
+        if self.server is not None:
+            self.text = prometheus_text(snapshots)
+
+    def close(self):
+        if self.metrics_file is not None:
+            self.metrics_file.close()
+            self.metrics_file = None
+
+        if self.socket is not None:
+            self.socket.close(linger=0)
+            self.context.term()
+            self.socket = None
+
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+# Device reads can take microseconds, so start the buckets lower
+READ_BOUNDS = (0.001, 0.002, 0.005) + DEFAULT_BOUNDS
+
+
+def log_bounds(low, high, ratio):
+    """ Return histogram bounds from low to at least high milliseconds,
+    each ratio times the previous one.
+    """
+    bounds = [low]
+    while bounds[-1] < high:
+        bounds.append(bounds[-1] * ratio)
+    return tuple(bounds)
+
+
+# The jitter is the difference of two gap quantiles, so the gap buckets
+# are 2% apart rather than the 2x steps of READ_BOUNDS
+GAP_BOUNDS = log_bounds(0.001, 10000.0, 1.02)
+
+
+class RunStatistics(object):
+    """ Cheap running statistics of an acquisition run: the read count and
+    read time distribution, the longest gap between reads, exceptions, and
+    the samples delivered to the reader versus skipped, when only the
+    latest read is delivered, or dropped with a batch. Set track_gaps to
+    also keep the distribution of the gaps between reads, to report the
+    read timing jitter.
+    """
+    def __init__(self, track_gaps=False):
+        super(RunStatistics, self).__init__()
+        self.start_time = time.time()
+        self.reads = 0
+        self.read_time = Histogram(READ_BOUNDS)
+        self.gaps = None
+        if track_gaps:
+            self.gaps = Histogram(GAP_BOUNDS)
+        self.last_read = None
+        self.max_gap = 0.0
+        self.interval_reads = 0
+        self.interval_gap = 0.0
+        self.exceptions = 0
+        self.last_exception = None
+        self.delivered = 0
+        self.skipped = 0
+        self.dropped = 0
+
+    def read(self, start, end):
+        """ Count a device read that started and ended at the times in
+        seconds.
+        """
+        self.reads += 1
+        self.read_time.observe(end - start)
+        if self.last_read is not None:
+            gap = end - self.last_read
+            if self.gaps is not None:
+                self.gaps.observe(gap)
+            if gap > self.interval_gap:
+                self.interval_gap = gap
+                if gap > self.max_gap:
+                    self.max_gap = gap
+        self.last_read = end
+
+    def interval(self):
+        """ Return the reads and the longest gap between reads in
+        milliseconds since the previous call, and start a new interval.
+        """
+        reads = self.reads - self.interval_reads
+        gap = self.interval_gap * 1000.0
+        self.interval_reads = self.reads
+        self.interval_gap = 0.0
+        return reads, gap
+
+    def exception(self, exc):
+        self.exceptions += 1
+        self.last_exception = "%s: %s" % (exc.__class__.__name__, exc)
+
+    def report(self):
+        """ Return the statistics as a dictionary suitable for pickling
+        across processes and writing as json.
+        """
+        duration = time.time() - self.start_time
+        histogram = self.read_time
+        report = {"duration_s": duration,
+                  "reads": self.reads,
+                  "reads_per_second": self.reads / max(duration, 1e-6),
+                  "read_time_ms": {"p50": histogram.quantile(0.5),
+                                   "p95": histogram.quantile(0.95),
+                                   "p99": histogram.quantile(0.99),
+                                   "max": histogram.maximum},
+                  "max_gap_ms": self.max_gap * 1000.0,
+                  "exceptions": self.exceptions,
+                  "last_exception": self.last_exception,
+                  "delivered": self.delivered,
+                  "skipped": self.skipped,
+                  "dropped": self.dropped}
+
+        if self.gaps is not None:
+            median = self.gaps.quantile(0.5)
+            tail = self.gaps.quantile(0.999)
+            report["gap_ms"] = {"p50": median,
+                                "p99": self.gaps.quantile(0.99),
+                                "p999": tail,
+                                "max": self.gaps.maximum}
+            report["jitter_ms"] = None
+            if median is not None:
+                report["jitter_ms"] = tail - median
+
+        return report
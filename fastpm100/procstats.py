@@ -0,0 +1,112 @@
+""" Cheap, dependency free process resource usage helpers. Used to report
+the memory and cpu cost of each FastPM100 process so viewers can be tuned
+per host.
+"""
+
+import os
+import time
+import platform
+
+import logging
+log = logging.getLogger(__name__)
+
+
+def memory_usage():
+    """ Return the resident set size of the current process in bytes, or
+    None if it can not be determined on this platform.
+    """
+    if "Linux" in platform.platform():
+        try:
+            with open("/proc/self/statm") as statm:
+                pages = int(statm.read().split()[1])
+            return pages * os.sysconf("SC_PAGE_SIZE")
+        except (IOError, OSError, ValueError) as exc:
+            log.debug("Problem reading statm: %s", exc)
+            return None
+
+    if "Windows" in platform.platform():
+        return windows_memory_usage()
+
+    return resource_peak_memory()
+
+
+def peak_memory_usage():
+    """ Return the peak resident set size of the current process in bytes,
+    or None if it can not be determined on this platform.
+    """
+    if "Linux" in platform.platform():
+        try:
+            with open("/proc/self/status") as status:
+                for line in status:
+                    if line.startswith("VmHWM:"):
+                        return int(line.split()[1]) * 1024
+        except (IOError, OSError, ValueError) as exc:
+            log.debug("Problem reading status: %s", exc)
+        return None
+
+    if "Windows" in platform.platform():
+        return windows_memory_usage("PeakWorkingSetSize")
+
+    return resource_peak_memory()
+
+
+def resource_peak_memory():
+    """ Return the peak resident set size from getrusage, reported in bytes
+    on Darwin.
+    """
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    except ImportError:
+        return None
+
+
+def windows_memory_usage(field="WorkingSetSize"):
+    """ Return the working set size, or another field of the memory
+    counters, of the current process in bytes with GetProcessMemoryInfo.
+    """
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD),
+                        ("PageFaultCount", wintypes.DWORD),
+                        ("PeakWorkingSetSize", ctypes.c_size_t),
+                        ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t),
+                        ("PeakPagefileUsage", ctypes.c_size_t)]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        ctypes.windll.psapi.GetProcessMemoryInfo(process,
+                                                 ctypes.byref(counters),
+                                                 counters.cb)
+        return getattr(counters, field)
+    except Exception as exc:
+        log.debug("Problem reading process memory: %s", exc)
+        return None
+
+
+def cpu_time():
+    """ Return the user plus system cpu seconds used by the current
+    process.
+    """
+    times = os.times()
+    return times[0] + times[1]
+
+
+def process_usage():
+    """ Return a dictionary of the cpu seconds, current and peak memory use
+    in bytes of the current process and the time of the sample, suitable
+    for pickling across processes.
+    """
+    return {"time": time.time(),
+            "cpu_time": cpu_time(),
+            "memory": memory_usage(),
+            "peak_memory": peak_memory_usage()}
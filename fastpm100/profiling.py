@@ -0,0 +1,91 @@
+""" Opt-in cProfile hooks for each FastPM100 process. Set the
+FASTPM100_PROFILE environment variable to a directory, or use the --profile
+option of the scripts, and the acquisition, viewer and log listener
+processes each write a <name>_<pid>.prof stats file there on clean exit.
+The environment is inherited by the child processes, so setting it in the
+parent before they start enables every process.
+
+Read the stats files with:
+
+    python -c "import pstats; pstats.Stats('acquisition_1234.prof')
+               .sort_stats('cumulative').print_stats(20)"
+"""
+
+import os
+import time
+import cProfile
+import functools
+
+import logging
+log = logging.getLogger(__name__)
+
+ENVIRONMENT = "FASTPM100_PROFILE"
+
+
+def profile_directory():
+    """ Return the directory to write stats files to, or None when
+    profiling is disabled.
+    """
+    return os.environ.get(ENVIRONMENT) or None
+
+
+def enable(directory):
+    """ Enable profiling of this process, and of every process started
+    from it afterwards.
+    """
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    os.environ[ENVIRONMENT] = os.path.abspath(directory)
+
+
+class Profiler(object):
+    """ Accumulate a profile over any number of calls when profiling is
+    enabled, otherwise call straight through.
+    """
+    def __init__(self, name, directory=None):
+        super(Profiler, self).__init__()
+        self.name = name
+        self.directory = directory or profile_directory()
+
+        self.profile = None
+        if self.directory is not None:
+            self.profile = cProfile.Profile()
+
+    @property
+    def enabled(self):
+        return self.profile is not None
+
+    def runcall(self, func, *args, **kwargs):
+        if self.profile is None:
+            return func(*args, **kwargs)
+        return self.profile.runcall(func, *args, **kwargs)
+
+    def dump(self):
+        """ Write the stats file, and return its name. Returns None when
+        profiling is disabled.
+        """
+        if self.profile is None:
+            return None
+
+        filename = os.path.join(self.directory, "%s_%s.prof"
+                                % (self.name, os.getpid()))
+        start_time = time.time()
+        self.profile.dump_stats(filename)
+        log.debug("Wrote profile %s in %0.3fs", filename,
+                  time.time() - start_time)
+        return filename
+
+
+def profiled(name):
+    """ Decorate the top level function of a process to profile it when
+    profiling is enabled, and write the stats file when it returns.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            profiler = Profiler(name)
+            result = profiler.runcall(func, *args, **kwargs)
+            profiler.dump()
+            return result
+        return wrapper
+    return decorator
@@ -0,0 +1,129 @@
+""" Use FastPM100 acquisition from python scripts and notebooks, without Qt.
+A Stream starts a device in a batch mode wrapper.SubProcess, and yields
+every sample read as numpy batches:
+
+    with stream.Stream("SimulatedLaserPM100") as power:
+        for timestamps, values in power.batches(duration=10.0):
+            print values.mean()
+
+By default the acquisition process holds up to queue_size batches, and
+drops and counts any more if the script falls behind. Set lossless to make
+acquisition wait for the script instead.
+"""
+
+import time
+
+import numpy
+
+from . import applog, wrapper
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class Stream(object):
+    """ Context manager around a batch mode SubProcess. A MainLogger is
+    created, and closed on exit, when no log_queue is specified. Set
+    backend to thread or auto to acquire on a thread, see
+    wrapper.backend_class.
+    """
+    def __init__(self, device_name="SimulatedPM100", device_kwargs=None,
+                 log_queue=None, batch_size=1000, batch_interval=0.05,
+                 queue_size=100, lossless=False, delay_time=None,
+                 backend="process"):
+        super(Stream, self).__init__()
+        log.debug("%s setup", self.__class__.__name__)
+
+        self.device_name = device_name
+        self.device_kwargs = device_kwargs
+        self.log_queue = log_queue
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.queue_size = queue_size
+        self.lossless = lossless
+        self.delay_time = delay_time
+        self.backend = backend
+
+        self.main_logger = None
+        self.device = None
+        self.samples = 0
+        self.info = {}
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def __iter__(self):
+        return self.batches()
+
+    def start(self):
+        """ Start the acquisition process.
+        """
+        log_queue = self.log_queue
+        if log_queue is None:
+            self.main_logger = applog.MainLogger()
+            log_queue = self.main_logger.log_queue
+
+        self.device = wrapper.create(log_queue, backend=self.backend,
+                                     delay_time=self.delay_time,
+                                     device_name=self.device_name,
+                                     device_kwargs=self.device_kwargs,
+                                     batch_size=self.batch_size,
+                                     batch_interval=self.batch_interval,
+                                     queue_size=self.queue_size,
+                                     lossless=self.lossless)
+
+    def batches(self, duration=None, timeout=0.1):
+        """ Yield (timestamps, values) batches, where values has one row per
+        timestamp, until the duration in seconds has elapsed or forever if
+        None. Stops early if the acquisition process exits and is not
+        respawned.
+        """
+        start_time = time.time()
+        while duration is None or time.time() - start_time < duration:
+            result = self.device.read(timeout=timeout)
+            if result is None:
+                if not self.device.respawn \
+                   and not self.device.proc.is_alive():
+                    log.warning("Acquisition process exited")
+                    return
+                continue
+
+            read_count, batch, self.info = result
+            self.samples += len(batch[0])
+            yield batch
+
+    def collect(self, duration):
+        """ Return a single (timestamps, values) batch of every sample read
+        for the duration in seconds.
+        """
+        collected = list(self.batches(duration))
+        if not collected:
+            return numpy.empty(0), numpy.empty((0, 0))
+
+        timestamps = numpy.concatenate([batch[0] for batch in collected])
+        values = numpy.concatenate([batch[1] for batch in collected])
+        return timestamps, values
+
+    @property
+    def dropped(self):
+        """ Number of samples dropped because the reader fell behind, as of
+        the latest batch. Always zero in lossless mode.
+        """
+        return self.info.get("dropped", 0)
+
+    def close(self):
+        """ Stop the acquisition process, and the logger if it was created
+        here.
+        """
+        if self.device is not None:
+            self.device.close()
+            self.device = None
+
+        if self.main_logger is not None:
+            self.main_logger.close()
+            self.main_logger = None
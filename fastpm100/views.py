@@ -24,6 +24,7 @@ class StripWindow(QtGui.QMainWindow):
         self.ui = layout.Ui_MainWindow()
         self.ui.setupUi(self)
 
+        self.add_stream_labels()
         self.add_graph()
         self.create_signals()
         # x, y, w, h
@@ -34,6 +35,49 @@ class StripWindow(QtGui.QMainWindow):
         self.setWindowTitle(title)
         self.show()
 
+    def add_stream_labels(self):
+        """ Add the acquisition state, the message delivery and reconnect
+        counters, latency and memory use of zmq devices below the render,
+        data and skip rates.
+        """
+        counters = [("State", "labelState"),
+                    ("Lost", "labelLost"),
+                    ("Duplicate", "labelDuplicate"),
+                    ("Reorder", "labelOutOfOrder"),
+                    ("Reconnect", "labelReconnect"),
+                    ("Latency", "labelLatency"),
+                    ("Memory", "labelMemory")]
+
+        for caption, name in counters:
+            caption_label = QtGui.QLabel(self.ui.frameRight)
+            caption_label.setText(caption)
+            self.ui.verticalLayout_2.addWidget(caption_label)
+
+            value_label = QtGui.QLabel(self.ui.frameRight)
+            value_label.setObjectName(name)
+            value_label.setText("0")
+            self.ui.verticalLayout.addWidget(value_label)
+            setattr(self.ui, name, value_label)
+
+        # The layout caps the frame at the height of the original six rows,
+        # grow it to show every counter instead of squeezing the labels.
+        frame = self.ui.frameRight
+        frame.setMaximumHeight(16777215)
+        frame.setMinimumHeight(frame.layout().sizeHint().height())
+
+    def add_device_selector(self, device_names, current=None):
+        """ Add a drop down list of devices to the toolbar, to switch the
+        acquisition device while running.
+        """
+        self.ui.toolBar.addSeparator()
+        combo = QtGui.QComboBox(self.ui.toolBar)
+        combo.setObjectName("comboDevice")
+        combo.addItems(list(device_names))
+        if current in device_names:
+            combo.setCurrentIndex(list(device_names).index(current))
+        self.ui.toolBar.addWidget(combo)
+        self.ui.comboDevice = combo
+
     def add_graph(self):
         """ Add the pyqtgraph control to the stacked widget and make it
         viewable.
@@ -2,102 +2,771 @@
 and hopefully faster communications on windows and linux.
 """
 
+import json
 import time
 import Queue
+import threading
+
+from collections import deque
+
+import numpy
 
 from multiprocessing import Queue as MPQueue
 from multiprocessing import Process
 
-from fastpm100 import applog, devices
+from fastpm100 import applog, buffers, devices, events, metrics, procstats
+from fastpm100 import profiling
+from fastpm100 import zmqstream
 
 import logging
 log = logging.getLogger(__name__)
 
+# Consecutive bad readings before the device is reopened
+DATA_ERROR_LIMIT = 10
+
+# Seconds to wait for the acquisition process to exit after the poison pill,
+# longer when it has a profile to write
+JOIN_TIMEOUT = 2.0
+PROFILE_JOIN_TIMEOUT = 30.0
+
+# Seconds to wait for room for the last batch on the way out
+FLUSH_TIMEOUT = 1.0
+
+BACKENDS = ("process", "thread", "auto")
+
+
+def backend_class(device_name, backend="process"):
+    """ Return the SubProcess class of the backend: process, thread, or
+    auto for a thread when the device class declares that its reads
+    release the GIL, and a process otherwise.
+    """
+    if backend == "auto":
+        device_class = getattr(devices, device_name)
+        backend = "process"
+        if getattr(device_class, "releases_gil", False):
+            backend = "thread"
+
+    if backend == "process":
+        return SubProcess
+    if backend == "thread":
+        return ThreadedSubProcess
+    raise ValueError("Unknown backend %s, use one of %s"
+                     % (backend, ", ".join(BACKENDS)))
+
+
+def create(log_queue, backend="process", **kwargs):
+    """ Return a SubProcess, or ThreadedSubProcess, of the backend for
+    the device_name keyword argument, see backend_class.
+    """
+    device_name = kwargs.get("device_name", "SimulatedPM100")
+    sub_class = backend_class(device_name, backend)
+    log.debug("Acquire from %s with %s", device_name, sub_class.__name__)
+    return sub_class(log_queue, **kwargs)
+
+
 class SubProcess(object):
     """ Create a multiprocessing device for non-blocking reads of the specified
-    hardware.  """
+    hardware. Specify a publish_address like tcp://127.0.0.1:6546 to also
+    publish every sample read, timestamped and in batches, for any number of
+    other viewers to subscribe to with devices.RebroadcastZMQ.
+
+    By default only the latest sample is made available to read. Specify a
+    batch_size to instead receive every sample read, as numpy arrays of up
+    to batch_size timestamps and values, delivered at least every
+    batch_interval seconds. Up to queue_size batches are held for the
+    reader, any further batches are dropped and counted. Set lossless to
+    instead wait for the reader to make room, which slows acquisition down
+    to the rate the reader keeps up with.
+
+    Set collect_metrics to time every device read, count skipped and
+    dropped samples and report them with the results once per second.
+
+    At close, the acquisition process returns a report of the whole run,
+    available as the report attribute and logged as a json summary. Its
+    reads are delivered, skipped in favor of a newer read while the reader
+    has yet to take the previous one, or dropped with their batch.
+
+    The acquisition process is long lived: use switch_device to close the
+    current device and open another in the same process, without a new
+    process start or losing the queues and read count.
+
+    Device errors are classified by devices.classify_error. Connection
+    errors close the device and reopen it with backoff up to max_backoff
+    seconds, repeated bad readings do the same, and other errors stop the
+    process. The process reports its state, see poll_state. If the process
+    dies and respawn is set, read starts a new one with backoff.
+
+    Pass lowjitter.LowJitter settings as low_jitter to pin the acquisition
+    process to cpus, raise its priority and move garbage collection to safe
+    points. Set measure_jitter, or low_jitter, to add the distribution of
+    the gaps between reads to the run report.
+
+    See ThreadedSubProcess for the same interface on a thread, and create
+    to choose between them per device.
+    """
     def __init__(self, log_queue, delay_time=None,
-                 device_name="SimulatedPM100"):
+                 device_name="SimulatedPM100", device_kwargs=None,
+                 publish_address=None, publish_topic="fastpm100",
+                 batch_size=None, batch_interval=0.05, queue_size=100,
+                 lossless=False, collect_metrics=False, respawn=True,
+                 max_backoff=5.0, low_jitter=None, measure_jitter=False):
         log.debug("%s startup", __name__)
 
         self.device_name = device_name
+        self.device_kwargs = device_kwargs or {}
+        self.publish_address = publish_address
+        self.publish_topic = publish_topic
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.lossless = lossless
+        self.collect_metrics = collect_metrics
+        self.low_jitter = low_jitter
+        self.measure_jitter = measure_jitter or low_jitter is not None
+        self.registry = None
         self.read_count = 0
+        self.received_count = 0
+        self.dropped = 0
+        self.usage = None
+        self.usage_time = 0
+        self.run_stats = None
+        self.report = None
+        self.drained = deque()
+
+        self.log_queue = log_queue
+        self.delay_time = delay_time
+        self.queue_size = queue_size
+        if batch_size is None:
+            self.queue_size = 1
+
+        self.respawn = respawn
+        self.max_backoff = max_backoff
+        self.restarts = 0
+        self.restart_time = 0
+        self.watch_time = time.time()
+        self.closing = False
+
+        self.state = "starting"
+        self.state_detail = None
+        self.switch_pending = None
 
-        self.results = MPQueue(maxsize=1)
+        self.start()
+
+    def start(self):
+        """ Start the acquisition process with new queues, as a process
+        that died may have left the previous ones unusable.
+        """
+        self.results = MPQueue(maxsize=self.queue_size)
         self.control = MPQueue(maxsize=1)
+        self.reports = MPQueue(maxsize=1)
+        self.states = MPQueue()
 
-        args = (log_queue, delay_time,
-                self.results, self.control)
+        args = (self.log_queue, self.delay_time,
+                self.results, self.control, self.reports, self.states)
         self.proc = Process(target=self.run, args=args)
         self.proc.start()
 
-    def run(self, log_queue, delay_time, results, control):
+    @profiling.profiled("acquisition")
+    def run(self, log_queue, delay_time, results, control, reports, states):
         """ Main infinite loop for acquiring from hardware device. Searches for
-        any entry on the control queue to indicate a poison pill.  Read from the
+        any entry on the control queue: a poison pill of None, or a command to
+        switch to another device.  Read from the
         hardware device at every pass, and if the current data queue is empty
         (by reading from it in a different process), add it to the data queue.
+        Put the run report on the reports queue on the way out, including
+        when a device read fails.
         """
 
-        applog.process_log_configure(log_queue)
+        self.configure_logging(log_queue)
+        self.states = states
+
+        if self.low_jitter is not None:
+            self.low_jitter.apply()
 
-        import_str = "devices.{0}()".format(self.device_name)
-        log.debug("Import of %s", import_str)
-        device = eval(import_str)
+        run_stats = metrics.RunStatistics(track_gaps=self.measure_jitter)
+        self.run_stats = run_stats
+
+        try:
+            device = self.open_device(self.device_name, self.device_kwargs)
+            self.set_state("running")
+        except Exception as exc:
+            log.exception("Open %s failed", self.device_name)
+            run_stats.exception(exc)
+            device = None
+            if devices.classify_error(exc) == "connection":
+                device = self.reopen_device(None, control)
+            else:
+                self.set_state("stopped", run_stats.last_exception)
+
+        # zmq sockets must be created in the process that uses them
+        publisher = None
+        if self.publish_address is not None:
+            publisher = zmqstream.BatchPublisher(self.publish_address,
+                                                 self.publish_topic)
+
+        registry = None
+        if self.collect_metrics:
+            registry = metrics.Registry()
+            self.registry = registry
+
+        timestamps = []
+        values = []
+        batch_time = time.time()
+        data_errors = 0
 
         log.debug("Start of while loop with delay [%s]", delay_time)
-        while True:
+        while device is not None or control.full():
 
+            # Checking for a command is cheaper than reading the queue
             if control.full():
-                log.debug("Control queue full, exit poison pill")
-                self.print_exit_stats()
-                break
+                command = self.receive_command(control)
+                if command is None:
+                    log.debug("Control queue poison pill, exit")
+                    if timestamps:
+                        self.put_batch(results, control, timestamps, values,
+                                       device, final=True)
+                    self.print_exit_stats()
+                    break
+
+                if timestamps:
+                    self.put_batch(results, control, timestamps, values,
+                                   device)
+                    timestamps = []
+                    values = []
+
+                device = self.change_device(device, *command[1:])
+                if device is None:
+                    self.print_exit_stats()
+                    break
+                continue
 
             self.read_count += 1
-            msg = (self.read_count, device.read())
+            read_start = time.time()
+            try:
+                result = device.read()
+                data_errors = 0
+            except Exception as exc:
+                kind = devices.classify_error(exc)
+                run_stats.exception(exc)
+                events.emit("read_exception", device=self.device_name,
+                            exception=run_stats.last_exception, kind=kind)
+
+                if kind == "fatal":
+                    log.exception("Device read failed, stop acquisition")
+                    self.set_state("stopped", run_stats.last_exception)
+                    if timestamps:
+                        self.put_batch(results, control, timestamps, values,
+                                       device, final=True)
+                    self.print_exit_stats()
+                    break
+
+                data_errors += 1
+                if kind == "data" and data_errors < DATA_ERROR_LIMIT:
+                    log.warning("Bad reading from %s: %s", self.device_name,
+                                run_stats.last_exception)
+                    continue
+
+                log.warning("Device read failed: %s, reopen %s",
+                            run_stats.last_exception, self.device_name)
+                device = self.reopen_device(device, control)
+                data_errors = 0
+                continue
+
+            now = time.time()
+            run_stats.read(read_start, now)
+            if registry is not None:
+                registry.observe("read", now - read_start)
 
-            if results.empty():
+            if publisher is not None:
+                publisher.add(now, result)
+
+            if self.batch_size is not None:
+                timestamps.append(now)
+                values.append(result)
+
+                if len(timestamps) >= self.batch_size \
+                   or now - batch_time >= self.batch_interval:
+                    self.put_batch(results, control, timestamps, values,
+                                   device)
+                    timestamps = []
+                    values = []
+                    batch_time = now
+
+            elif results.empty():
+                msg = (self.read_count, result, self.device_info(device))
                 try:
                     results.put(msg, block=False)
+                    run_stats.delivered += 1
 
                 # Silent failures on exit if you don't catch this exception
                 except Queue.Full:
-                    pass
+                    run_stats.skipped += 1
+
+            else:
+                run_stats.skipped += 1
+                if registry is not None:
+                    registry.increment("skipped")
 
             if delay_time is not None:
                 time.sleep(delay_time)
 
+        if device is not None:
+            self.close_device(device)
+
+        if publisher is not None:
+            publisher.close()
+
+        report = run_stats.report()
+        report["device"] = self.device_name
+        report["usage"] = procstats.process_usage()
+        if self.low_jitter is not None:
+            self.low_jitter.restore()
+            report["low_jitter"] = self.low_jitter.report()
+        events.emit("run_report", **report)
+        try:
+            reports.put(report, block=False)
+        except Queue.Full:
+            log.warning("Run report already sent")
+
         log.debug("End of run while")
 
+    def configure_logging(self, log_queue):
+        """ Send the log records of the acquisition process to the
+        listener of the main logger.
+        """
+        applog.process_log_configure(log_queue)
+
+    def set_state(self, state, detail=None, device=None):
+        """ Report the state of the acquisition process to the parent, and
+        after a switch the (name, kwargs) of the device now open.
+        """
+        self.states.put((time.time(), state, detail, device))
+
+    def reopen_device(self, device, control):
+        """ Close the device and try to open it again, waiting twice as long
+        after each failure up to max_backoff seconds. Returns the reopened
+        device, or None if a command arrives on the control queue first.
+        """
+        self.set_state("reconnecting", self.run_stats.last_exception)
+        if device is not None:
+            self.close_device(device)
+
+        start_time = time.time()
+        backoff = 0.1
+        attempts = 0
+        while not control.full():
+            attempts += 1
+            try:
+                device = self.open_device(self.device_name, self.device_kwargs)
+            except Exception as exc:
+                log.warning("Reopen %s attempt %s failed: %s, retry in %0.1fs",
+                            self.device_name, attempts, exc, backoff)
+                self.wait_for_command(control, backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+                continue
+
+            duration_ms = (time.time() - start_time) * 1000.0
+            log.info("Reopened %s after %s attempts", self.device_name,
+                     attempts)
+            events.emit("reopen", device=self.device_name, attempts=attempts,
+                        duration_ms=duration_ms)
+            self.set_state("running")
+            return device
+
+        return None
+
+    def wait_for_command(self, control, timeout):
+        """ Sleep for up to the timeout in seconds, returning early if a
+        command arrives.
+        """
+        end_time = time.time() + timeout
+        while time.time() < end_time and not control.full():
+            time.sleep(0.01)
+
+    def open_device(self, device_name, device_kwargs):
+        log.debug("Import of devices.%s(%s)", device_name, device_kwargs)
+        device_class = getattr(devices, device_name)
+        return device_class(**device_kwargs)
+
+    def close_device(self, device):
+        """ Release the hardware or sockets of devices that hold any.
+        """
+        close = getattr(device, "close", None)
+        if close is None:
+            return
+
+        try:
+            close()
+        except Exception:
+            log.exception("Problem closing %s", self.device_name)
+
+    def receive_command(self, control):
+        """ Return the command waiting on the control queue, or None to
+        exit. A full control queue may take a moment to deliver.
+        """
+        try:
+            return control.get(block=True, timeout=1.0)
+        except Queue.Empty:
+            log.critical("Control queue full but no command, exit")
+            return None
+
+    def change_device(self, device, device_name, device_kwargs):
+        """ Close the current device and open the specified one in this
+        process. If it fails to open, reopen the previous device. Returns
+        the device to read from, or None if neither will open.
+        """
+        start_time = time.time()
+        log.info("Switch from %s to %s(%s)", self.device_name, device_name,
+                 device_kwargs)
+        self.close_device(device)
+
+        try:
+            device = self.open_device(device_name, device_kwargs)
+        except Exception as exc:
+            log.exception("Open %s failed, reopen %s", device_name,
+                          self.device_name)
+            detail = "Switch to %s failed: %s: %s" \
+                     % (device_name, exc.__class__.__name__, exc)
+            events.emit("device_switch_failed", device=device_name,
+                        exception="%s: %s" % (exc.__class__.__name__, exc))
+            try:
+                device = self.open_device(self.device_name,
+                                          self.device_kwargs)
+            except Exception:
+                log.exception("Reopen %s failed, stop acquisition",
+                              self.device_name)
+                self.set_state("stopped", detail)
+                return None
+
+            self.set_state("running", detail,
+                           (self.device_name, self.device_kwargs))
+            return device
+
+        self.device_name = device_name
+        self.device_kwargs = device_kwargs
+        self.set_state("running", device=(device_name, device_kwargs))
+        duration_ms = (time.time() - start_time) * 1000.0
+        log.info("Switched to %s in %0.1f ms", device_name, duration_ms)
+        events.emit("device_switch", device=device_name,
+                    duration_ms=duration_ms)
+        return device
+
+    def put_batch(self, results, control, timestamps, values, device,
+                  final=False):
+        """ Add the collected samples to the results queue as a tuple of the
+        read count of the last sample, a tuple of (timestamps, values) numpy
+        arrays with one row of values per timestamp, and the supplementary
+        device information. Drop the batch if the reader has fallen behind,
+        or in lossless mode wait for room until the poison pill arrives.
+        The final batch, after the poison pill or a fatal read error, waits
+        up to FLUSH_TIMEOUT seconds for room in either mode.
+        """
+        timestamps = numpy.array(timestamps)
+        values = numpy.array(values, dtype=float).reshape(len(timestamps), -1)
+        msg = (self.read_count, (timestamps, values), self.device_info(device))
+
+        if self.lossless or final:
+            deadline = time.time() + FLUSH_TIMEOUT
+            while time.time() < deadline if final else not control.full():
+                try:
+                    results.put(msg, block=True, timeout=0.1)
+                    self.run_stats.delivered += len(timestamps)
+                    return
+                except Queue.Full:
+                    pass
+        else:
+            try:
+                results.put(msg, block=False)
+                self.run_stats.delivered += len(timestamps)
+                return
+            except Queue.Full:
+                pass
+
+        self.dropped += len(timestamps)
+        self.run_stats.dropped += len(timestamps)
+        if self.registry is not None:
+            self.registry.increment("dropped", len(timestamps))
+
+    def device_info(self, device):
+        """ Return a dictionary of supplementary device state to send along
+        with a result, such as the zmq stream delivery counters, and the
+        resource use and metrics of this process refreshed once per second.
+        """
+        now = time.time()
+        if now - self.usage_time >= 1.0:
+            if self.usage_time:
+                self.emit_rate_event(now - self.usage_time)
+            self.usage = procstats.process_usage()
+            self.usage_time = now
+            if self.low_jitter is not None:
+                self.low_jitter.safe_point()
+            if self.registry is not None:
+                self.registry.set_gauge("queue_occupancy",
+                                        self.queue_occupancy())
+                self.registry.set_gauge("memory", self.usage["memory"])
+                self.registry.set_gauge("cpu_time", self.usage["cpu_time"])
+                self.metrics_snapshot = self.registry.snapshot()
+
+        info = {"process": self.usage, "read_time": now,
+                "device": self.device_name}
+        if self.registry is not None:
+            info["metrics"] = self.metrics_snapshot
+        if self.batch_size is not None:
+            info["dropped"] = self.dropped
+        if hasattr(device, "stats"):
+            info["stream"] = device.stats()
+        return info
+
+    def emit_rate_event(self, elapsed):
+        """ Record the read rate and longest gap between reads over the
+        elapsed seconds, with the delivery counters, as a performance event.
+        """
+        reads, max_gap_ms = self.run_stats.interval()
+        events.emit("acquisition", device=self.device_name,
+                    reads_per_second=reads / elapsed, max_gap_ms=max_gap_ms,
+                    delivered=self.run_stats.delivered,
+                    skipped=self.run_stats.skipped,
+                    dropped=self.run_stats.dropped,
+                    queue_occupancy=self.queue_occupancy())
+
+    def queue_occupancy(self):
+        """ Return the number of results waiting for the reader, or None
+        where the platform does not implement it.
+        """
+        try:
+            return self.results.qsize()
+        except NotImplementedError:
+            return None
+
     def print_exit_stats(self):
         """ Print summary statistics for this run.
         """
         log.debug("Total reads: %s", self.read_count)
+        if self.batch_size is not None:
+            log.debug("Dropped samples: %s", self.dropped)
+
+    def switch_device(self, device_name, device_kwargs=None, timeout=1.0):
+        """ Tell the acquisition process to close the current device and
+        open the specified one. Results carry the name of the device that
+        read them. device_name and device_kwargs change once poll_state
+        receives the confirmation of the acquisition process, and stay on
+        the previous device if the new one fails to open, which the process
+        then reopens. Until then switch_pending holds the requested name.
+        Returns False if a previous command is still waiting after the
+        timeout in seconds.
+        """
+        if not self.send_switch(device_name, device_kwargs or {}, timeout):
+            return False
+
+        self.switch_pending = device_name
+        return True
+
+    def send_switch(self, device_name, device_kwargs, timeout):
+        """ Put the switch command on the control queue. Returns False if
+        a previous command is still waiting after the timeout in seconds.
+        """
+        try:
+            self.control.put(("switch", device_name, device_kwargs),
+                             block=True, timeout=timeout)
+        except Queue.Full:
+            log.warning("Previous command pending, can't switch to %s",
+                        device_name)
+            return False
+        return True
+
+    def poll_state(self):
+        """ Return the latest state of the acquisition process: starting,
+        running, reconnecting, stopped or restarting. The reason for the
+        latest change, if any, is in state_detail. Also applies the device
+        confirmed by the process after a switch.
+        """
+        while True:
+            try:
+                state_time, self.state, self.state_detail, device = \
+                    self.states.get_nowait()
+            except Queue.Empty:
+                return self.state
+
+            if device is not None:
+                self.device_name, self.device_kwargs = device
+                self.switch_pending = None
+            elif self.state == "stopped":
+                self.switch_pending = None
+
+    def watchdog(self):
+        """ Start a new acquisition process if the current one has died,
+        waiting longer after each restart. Returns True on restart.
+        """
+        now = time.time()
+        if self.closing or self.proc.is_alive() or now < self.restart_time:
+            return False
+
+        self.poll_state()
+        self.restarts += 1
+        backoff = min(2 ** (self.restarts - 1), 30.0)
+
+        # Threads have no exit code
+        exitcode = getattr(self.proc, "exitcode", None)
+        log.critical("Acquisition process of %s exited with %s, restart %s,"
+                     " next restart after %s s", self.device_name,
+                     exitcode, self.restarts, backoff)
+        events.emit("restart", device=self.device_name,
+                    exitcode=exitcode, restarts=self.restarts)
+
+        self.restart_time = now + backoff
+        self.switch_pending = None
+        self.state = "restarting"
+        self.state_detail = "exit code %s" % exitcode
+
+        # Continue the read count of the results already received, so it
+        # only goes up across the restart
+        self.read_count = max(self.read_count, self.received_count)
+        self.start()
+        return True
 
     def close(self):
         """ Add the poison pill to the control queue. Join, then terminate the
-        threads on timeout.
+        threads on timeout. Further calls do nothing.
         """
+        if self.closing:
+            return
+
+        self.closing = True
         log.debug("Add none to control poison pill")
         try:
             self.control.put(None, block=True, timeout=1.0)
         except Queue.Full:
             log.critical("Can't add poison pill")
 
-        self.proc.join(timeout=0.1)
-        self.proc.terminate()
+        self.report = self.receive_report()
+        self.join()
+        self.drain_results()
 
         log.debug("Close completion post terminate")
 
-    def read(self):
+    def join(self):
+        """ Wait for the acquisition process to close its device, send its
+        report and write its profile, then terminate it only if it is still
+        running, such as when stuck in a device read.
+        """
+        timeout = JOIN_TIMEOUT
+        if profiling.profile_directory() is not None:
+            timeout = PROFILE_JOIN_TIMEOUT
+
+        self.proc.join(timeout=timeout)
+        if self.proc.is_alive():
+            log.warning("Acquisition process of %s did not exit in %s s,"
+                        " terminate", self.device_name, timeout)
+            self.proc.terminate()
+
+    def receive_report(self):
+        """ Wait for the run report from the acquisition process, and log it
+        as a json summary. Returns None if no report arrives. Meanwhile keep
+        the batches that arrive, for the final batch to have room and for
+        read to return after close.
+        """
+        timeout = 2.0
+        if not self.proc.is_alive():
+            timeout = 0.1
+
+        end_time = time.time() + timeout
+        while True:
+            self.drain_results()
+            try:
+                report = self.reports.get(block=True, timeout=0.01)
+                break
+            except Queue.Empty:
+                if time.time() >= end_time:
+                    log.warning("No run report from %s", self.device_name)
+                    return None
+
+        log.info("Run report: %s", json.dumps(report, sort_keys=True))
+        return report
+
+    def drain_results(self):
+        """ Move the batches waiting on the results queue to drained.
+        """
+        if self.batch_size is None:
+            return
+
+        while True:
+            try:
+                self.drained.append(self.results.get_nowait())
+            except Queue.Empty:
+                return
+
+    def read(self, timeout=None):
         """ Return None from the queue if it's ever empty.  Otherwise return the
-        actual value from the queue.
+        actual value from the queue: a tuple of the read count, the device
+        read result and a dictionary of supplementary device information.
+        In batch mode the result is a tuple of (timestamps, values) arrays.
+        Specify a timeout in seconds to wait for a result to arrive. While
+        no results arrive, check once per second that the acquisition process
+        is alive, see watchdog. Batches received during close are returned
+        first.
         """
+        if self.drained:
+            return self.drained.popleft()
+
         get_result = None
         try:
-            get_result = self.results.get(block=False)
+            get_result = self.results.get(block=timeout is not None,
+                                          timeout=timeout)
+            self.received_count = get_result[0]
         except Queue.Empty:
             #log.critical("Results queue is empty")
-            pass
+            if self.respawn and time.time() - self.watch_time >= 1.0:
+                self.watch_time = time.time()
+                self.watchdog()
 
         return get_result
 
+
+
+class ThreadedSubProcess(SubProcess):
+    """ Run the acquisition loop of SubProcess on a daemon thread of this
+    process instead, with the same interface. For devices whose reads wait
+    on I/O and release the GIL, such as the zmq subscribers and serial
+    ports, this saves the process start, the pickling of every result and
+    the memory of a second interpreter. Devices that compute in Python
+    compete with the reader for the GIL, and are better off in a process.
+
+    The queues are buffers.SingleProducerBuffer, which need no locks as
+    each has a single producer and a single consumer thread. Low jitter
+    settings apply to a whole process, so they are ignored with a warning.
+    A thread that stops on a fatal error is started again by the watchdog,
+    as a dead process would be.
+    """
+    def start(self):
+        """ Start the acquisition thread with new buffers.
+        """
+        if self.low_jitter is not None:
+            log.warning("Low jitter settings need the process backend,"
+                        " ignored for %s", self.device_name)
+            self.low_jitter = None
+
+        self.results = buffers.SingleProducerBuffer(maxsize=self.queue_size)
+        self.control = buffers.SingleProducerBuffer(maxsize=1)
+        self.reports = buffers.SingleProducerBuffer(maxsize=1)
+        self.states = buffers.SingleProducerBuffer()
+
+        args = (self.log_queue, self.delay_time,
+                self.results, self.control, self.reports, self.states)
+        self.proc = threading.Thread(target=self.run, args=args,
+                                     name="Acquisition-%s" % self.device_name)
+        self.proc.daemon = True
+        self.proc.start()
+
+    def configure_logging(self, log_queue):
+        """ The thread logs through the handlers of this process.
+        """
+        pass
+
+    def join(self):
+        """ Wait for the acquisition thread to exit. A thread can't be
+        terminated, so one stuck in a device read is left to end with this
+        process.
+        """
+        self.proc.join(timeout=1.0)
+        if self.proc.is_alive():
+            log.warning("Acquisition thread of %s still running",
+                        self.device_name)
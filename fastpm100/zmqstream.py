@@ -0,0 +1,256 @@
+""" Encode and decode the zmq message streams read by the TriValueZMQ
+family of devices.
+
+Every message starts with the topic and a single space, so prefix
+subscriptions work the same for all formats. Text messages follow with
+comma delimited values, and optionally a sequence number and send time:
+
+    temperatures_and_power 32.0,35.0,60.0,22.0,25.0,3560.0 1234 1457456.12
+
+Binary messages follow the space with a marker byte, a little endian
+header of sequence number, send time and value count, then the values as
+float64.
+
+Batch messages carry many timestamped samples at once, as published by
+the acquisition process for fan-out to other viewers. They follow the
+space with a different marker byte, a header of sequence number, row and
+column counts, then the float64 timestamps and the row major values.
+"""
+
+import time
+import struct
+import logging
+
+import zmq
+import numpy
+
+log = logging.getLogger(__name__)
+
+BINARY_MARKER = "\xfe"
+BINARY_HEADER = struct.Struct("<cQdH")
+
+BATCH_MARKER = "\xfd"
+BATCH_HEADER = struct.Struct("<cQII")
+
+
+def encode_text(topic, values, sequence=None, send_time=None):
+    """ Return the space delimited text message for the values. The
+    sequence number and send time are only appended when a sequence
+    number is specified.
+    """
+    message = "%s %s" % (topic, ",".join(["%.4f" % val for val in values]))
+    if sequence is not None:
+        if send_time is None:
+            send_time = time.time()
+        message = "%s %d %.6f" % (message, sequence, send_time)
+    return message
+
+
+def encode_binary(topic, values, sequence, send_time=None):
+    """ Return the topic prefixed binary message for the values.
+    """
+    if send_time is None:
+        send_time = time.time()
+    values = numpy.asarray(values, dtype="<f8")
+    header = BINARY_HEADER.pack(BINARY_MARKER, sequence, send_time,
+                                len(values))
+    return "%s %s%s" % (topic, header, values.tostring())
+
+
+def encode_batch(topic, sequence, timestamps, values):
+    """ Return the topic prefixed batch message for the timestamps and the
+    corresponding rows of values.
+    """
+    timestamps = numpy.asarray(timestamps, dtype="<f8")
+    values = numpy.asarray(values, dtype="<f8").reshape(len(timestamps), -1)
+    header = BATCH_HEADER.pack(BATCH_MARKER, sequence, values.shape[0],
+                               values.shape[1])
+    return "%s %s%s%s" % (topic, header, timestamps.tostring(),
+                          values.tostring())
+
+
+def decode_batch(message):
+    """ Return a tuple of (timestamps, values, sequence) from a batch
+    message, where values has one row per timestamp.
+    """
+    topic, payload = message.split(" ", 1)
+    marker, sequence, rows, columns = BATCH_HEADER.unpack_from(payload)
+
+    offset = BATCH_HEADER.size
+    timestamps = numpy.frombuffer(payload, dtype="<f8", count=rows,
+                                  offset=offset)
+    offset += timestamps.nbytes
+    values = numpy.frombuffer(payload, dtype="<f8", count=rows * columns,
+                              offset=offset).reshape(rows, columns)
+    return timestamps, values, sequence
+
+
+def decode(message):
+    """ Return a tuple of (values, sequence, send_time) from a text,
+    binary or batch message. Sequence and send time are None for plain
+    text messages without them. Batch messages return the values and time
+    of the last sample.
+    """
+    topic, payload = message.split(" ", 1)
+
+    if payload.startswith(BATCH_MARKER):
+        timestamps, values, sequence = decode_batch(message)
+        return values[-1].tolist(), sequence, timestamps[-1]
+
+    if payload.startswith(BINARY_MARKER):
+        marker, sequence, send_time, count = \
+            BINARY_HEADER.unpack_from(payload)
+        values = numpy.frombuffer(payload, dtype="<f8", count=count,
+                                  offset=BINARY_HEADER.size)
+        return values.tolist(), sequence, send_time
+
+    fields = payload.split(" ")
+    values = [float(item) for item in fields[0].split(",")]
+    if len(fields) >= 3:
+        return values, int(fields[1]), float(fields[2])
+
+    return values, None, None
+
+
+class BatchPublisher(object):
+    """ Collect timestamped samples and publish them as batch messages on a
+    PUB socket, whenever batch_size samples are collected or batch_interval
+    seconds have passed since the last publish.
+    """
+    def __init__(self, address="tcp://127.0.0.1:6546", topic="fastpm100",
+                 batch_size=1000, batch_interval=0.05):
+        super(BatchPublisher, self).__init__()
+        log.debug("%s setup", self.__class__.__name__)
+
+        self.topic = topic
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+
+        self.sequence = 0
+        self.timestamps = []
+        self.values = []
+        self.flush_time = time.time()
+
+        self.context = zmq.Context()
+        self.socket = self.context.socket(zmq.PUB)
+        log.debug("Publish batches on %s, topic: %s", address, topic)
+        self.socket.bind(address)
+
+    def add(self, timestamp, value):
+        """ Collect a single sample, where the value is a number or a
+        sequence of numbers, and publish the batch if it is due.
+        """
+        self.timestamps.append(timestamp)
+        self.values.append(value)
+
+        if len(self.timestamps) >= self.batch_size \
+           or timestamp - self.flush_time >= self.batch_interval:
+            self.flush()
+
+    def flush(self):
+        """ Publish any collected samples.
+        """
+        self.flush_time = time.time()
+        if not self.timestamps:
+            return
+
+        message = encode_batch(self.topic, self.sequence, self.timestamps,
+                               self.values)
+        self.socket.send(message)
+
+        self.sequence += 1
+        self.timestamps = []
+        self.values = []
+
+    def close(self):
+        """ Publish the remaining samples, then release the socket.
+        """
+        self.flush()
+        self.socket.close(linger=100)
+        self.context.term()
+
+
+class SequenceTracker(object):
+    """ Account for lost, duplicated and out of order messages from the
+    sequence numbers of a single publisher. A sequence number that was
+    counted as lost and arrives late is moved from lost to out of order.
+    The latest window sequence numbers are remembered to tell duplicates.
+
+    A jump backwards by more than max_reorder is treated as a publisher
+    restart, not as reordering, even when the slow joiner loss of the new
+    subscription skips its first messages. So is a jump back to one of the
+    first restart_margin numbers from at least that far ahead, as
+    publishers number their messages from zero, which catches a restart
+    soon after the previous one.
+    """
+    def __init__(self, window=1024, max_reorder=16, restart_margin=8):
+        super(SequenceTracker, self).__init__()
+        self.window = window
+        self.max_reorder = max_reorder
+        self.restart_margin = restart_margin
+        self.reset()
+
+        self.received = 0
+        self.lost = 0
+        self.duplicated = 0
+        self.out_of_order = 0
+        self.restarts = 0
+
+    def reset(self):
+        """ Forget the sequence history, the next number is accepted as the
+        start of a new stream.
+        """
+        self.last = None
+        self.recent = set()
+
+    def update(self, sequence):
+        """ Count the sequence number of the latest message.
+        """
+        self.received += 1
+
+        if self.last is None:
+            self.last = sequence
+            self.recent.add(sequence)
+            return
+
+        if sequence > self.last:
+            self.lost += sequence - self.last - 1
+            self.last = sequence
+
+        elif self.is_restart(sequence):
+            self.restarts += 1
+            self.reset()
+            self.last = sequence
+
+        elif sequence in self.recent:
+            self.duplicated += 1
+            return
+
+        else:
+            self.out_of_order += 1
+            self.lost = max(0, self.lost - 1)
+
+        self.recent.add(sequence)
+        if len(self.recent) > 2 * self.window:
+            floor = self.last - self.window
+            self.recent = set([seq for seq in self.recent if seq > floor])
+
+    def is_restart(self, sequence):
+        """ Return True if a sequence number below the latest starts a new
+        stream of the publisher.
+        """
+        jump = self.last - sequence
+        if jump > self.max_reorder:
+            return True
+
+        return sequence < self.restart_margin and jump >= self.restart_margin
+
+    def stats(self):
+        """ Return the counters as a dictionary suitable for pickling across
+        processes.
+        """
+        return {"received": self.received,
+                "lost": self.lost,
+                "duplicated": self.duplicated,
+                "out_of_order": self.out_of_order,
+                "restarts": self.restarts}
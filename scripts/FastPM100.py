@@ -2,6 +2,7 @@
 """
 
 import sys
+import json
 import logging
 import argparse
 import multiprocessing
@@ -10,6 +11,12 @@ from PySide import QtGui, QtCore
 
 from fastpm100 import control
 from fastpm100 import applog
+from fastpm100 import ingest
+from fastpm100 import history
+from fastpm100 import metrics
+from fastpm100 import discovery
+from fastpm100 import lowjitter
+from fastpm100 import profiling
 
 log = logging.getLogger(__name__)
 
@@ -39,6 +46,17 @@ class FastPM100Application(object):
         # transform the geometry arg into a list from a comma separated string
         parts = self.args.geometry.split(",")
         self.args.geometry = map(int, parts)
+
+        self.args.view = [history.parse_view(text)
+                          for text in self.args.view]
+
+        self.args.sources = \
+            [ingest.parse_source("zmq", spec)
+             for spec in self.args.zmq_source] \
+            + [ingest.parse_source("serial", spec)
+               for spec in self.args.serial_source] \
+            + [ingest.parse_source("tail", spec)
+               for spec in self.args.tail_source]
         return self.args
 
     def create_parser(self):
@@ -56,7 +74,8 @@ class FastPM100Application(object):
         parser.add_argument("-c", "--controller", type=str,
                             default="Controller", help=control_str)
 
-        device_str = "Specify main controller data source"
+        device_str = "Specify main controller data source, with options" \
+                     " like ThorlabsMeter:serial_number=P2000343"
         parser.add_argument("-d", "--device", type=str,
                             default="ThorlabsMeter", help=device_str)
 
@@ -72,12 +91,170 @@ class FastPM100Application(object):
         parser.add_argument("-u", "--update", type=int,
                             default=0, help=update_str)
 
+        view_str = "With the DashboardController, a window of SIZE values" \
+                   " updated every UPDATE ms at an optional geometry as" \
+                   " SIZE,UPDATE[,X,Y,W,H][@SOURCE], repeat for more." \
+                   " Defaults to the three windows of" \
+                   " TripleVisualizer.bat"
+        parser.add_argument("--view", type=str, action="append",
+                            default=[], help=view_str)
+
         filename_str = "Filename of csv data to pre-load"
         parser.add_argument("-f", "--filename", type=str,
                             default=None, help=filename_str)
 
+        publish_str = "Also publish every sample read on this zmq address," \
+                      " e.g. tcp://127.0.0.1:6546"
+        parser.add_argument("-p", "--publish", type=str,
+                            default=None, help=publish_str)
+
+        choices_str = "Comma separated devices to offer for switching" \
+                      " while running, with the default controller"
+        parser.add_argument("--choices", type=str,
+                            default="SimulatedPM100,SimulatedLaserPM100,"
+                                    "ThorlabsMeter",
+                            help=choices_str)
+
+        backend_str = "Acquire on a process, a thread, or auto for a" \
+                      " thread with devices that wait on I/O"
+        parser.add_argument("--backend", type=str, default="process",
+                            choices=["process", "thread", "auto"],
+                            help=backend_str)
+
+        benchmark_str = "Run for this many seconds, print the data, render" \
+                        " and skip rates, cpu and peak memory, then exit"
+        parser.add_argument("-b", "--benchmark", type=float,
+                            default=None, help=benchmark_str)
+
+        output_str = "Also write the benchmark results to this json file"
+        parser.add_argument("--benchmark-output", type=str,
+                            default=None, help=output_str)
+
+        profile_str = "Write a cProfile stats file per process to this" \
+                      " directory on exit"
+        parser.add_argument("--profile", type=str,
+                            default=None, help=profile_str)
+
+        metrics_group = parser.add_argument_group("metrics export options")
+        metrics_group.add_argument("--metrics-file", type=str, default=None,
+                                   help="Append metrics every second to this"
+                                        " json lines file")
+        metrics_group.add_argument("--metrics-address", type=str,
+                                   default=None,
+                                   help="Publish metrics on this zmq address")
+        metrics_group.add_argument("--metrics-port", type=int, default=None,
+                                   help="Serve Prometheus text metrics on"
+                                        " this local http port")
+
+        jitter_group = parser.add_argument_group("low jitter options")
+        jitter_group.add_argument("--low-jitter", action="store_true",
+                                  help="Pin, raise the priority of and"
+                                       " control garbage collection in the"
+                                       " acquisition process, Linux only")
+        jitter_group.add_argument("--cpu", type=int, action="append",
+                                  default=[],
+                                  help="Pin acquisition to this cpu, repeat"
+                                       " for more")
+        jitter_group.add_argument("--nice", type=int, default=-10,
+                                  help="Niceness change of the acquisition"
+                                       " process, negative is higher"
+                                       " priority")
+
+        log_group = parser.add_argument_group("log options")
+        log_group.add_argument("--log-level", type=str, default="DEBUG",
+                               help="Discard records below this level in"
+                                    " every process")
+        log_group.add_argument("--log-max-mb", type=float, default=10.0,
+                               help="Rotate the log file at this size")
+        log_group.add_argument("--log-when", type=str, default=None,
+                               help="Rotate the log file by time instead,"
+                                    " for example midnight or H")
+        log_group.add_argument("--log-backups", type=int, default=5,
+                               help="Previous log files to keep")
+        log_group.add_argument("--no-console", action="store_true",
+                               help="Do not echo log records to stdout")
+
+        zmq_group = parser.add_argument_group("zmq device options")
+        zmq_group.add_argument("--address", type=str, default=None,
+                               help="Publisher ip address")
+        zmq_group.add_argument("--port", type=str, default=None,
+                               help="Publisher port")
+        zmq_group.add_argument("--rcvhwm", type=int, default=None,
+                               help="Receive high water mark in messages")
+        zmq_group.add_argument("--rcvbuf", type=int, default=None,
+                               help="Kernel receive buffer size in bytes")
+        zmq_group.add_argument("--conflate", action="store_true",
+                               help="Keep only the most recent message")
+        zmq_group.add_argument("--reconnect-ivl", type=int, default=None,
+                               help="Reconnect interval in ms")
+        zmq_group.add_argument("--reconnect-ivl-max", type=int,
+                               default=None,
+                               help="Maximum reconnect backoff in ms")
+        zmq_group.add_argument("--receive-timeout", type=int, default=None,
+                               help="Show a gap after this many ms without"
+                                    " data")
+        zmq_group.add_argument("--heartbeat-timeout", type=float,
+                               default=None,
+                               help="Resubscribe after this many seconds"
+                                    " without data")
+
+        ingest_group = parser.add_argument_group(
+            "dashboard ingest options, instead of the device")
+        ingest_group.add_argument("--zmq-source", type=str, action="append",
+                                  default=[],
+                                  help="name=tcp://host:port publisher,"
+                                       " repeat for more, select in a view"
+                                       " with @name")
+        ingest_group.add_argument("--serial-source", type=str,
+                                  action="append", default=[],
+                                  help="name=port serial port of csv lines")
+        ingest_group.add_argument("--tail-source", type=str,
+                                  action="append", default=[],
+                                  help="name=filename csv file to follow")
+
         return parser
 
+    def zmq_options(self):
+        """ Return the keyword arguments for zmq devices from the command
+        line options that were specified.
+        """
+        options = {"ip_address": self.args.address,
+                   "port": self.args.port,
+                   "rcvhwm": self.args.rcvhwm,
+                   "rcvbuf": self.args.rcvbuf,
+                   "reconnect_ivl": self.args.reconnect_ivl,
+                   "reconnect_ivl_max": self.args.reconnect_ivl_max,
+                   "receive_timeout": self.args.receive_timeout,
+                   "heartbeat_timeout": self.args.heartbeat_timeout}
+        if self.args.conflate:
+            options["conflate"] = True
+
+        return dict([(key, value) for key, value in options.items()
+                     if value is not None])
+
+    def metrics_exporter(self):
+        """ Return a metrics exporter if any export option was specified.
+        """
+        if self.args.metrics_file is None \
+           and self.args.metrics_address is None \
+           and self.args.metrics_port is None:
+            return None
+
+        args = self.args
+        return metrics.MetricsExporter(filename=args.metrics_file,
+                                       publish_address=args.metrics_address,
+                                       http_port=args.metrics_port)
+
+    def low_jitter(self):
+        """ Return the low jitter settings for the acquisition processes,
+        or None if not requested.
+        """
+        if not self.args.low_jitter:
+            return None
+
+        return lowjitter.LowJitter(cpus=self.args.cpu or None,
+                                   niceness=self.args.nice)
+
     def run(self):
         """ This is the application code that is called by the main
         function. The architectural idea is to have as little code in
@@ -86,7 +263,16 @@ class FastPM100Application(object):
         """
         self.app = QtGui.QApplication([])
 
-        self.main_logger = applog.MainLogger()
+        # Before any process starts, so they all inherit it
+        if self.args.profile is not None:
+            profiling.enable(self.args.profile)
+
+        self.main_logger = applog.MainLogger(
+            level=self.args.log_level.upper(),
+            max_bytes=int(self.args.log_max_mb * 1024 * 1024),
+            backup_count=self.args.log_backups,
+            when=self.args.log_when,
+            console=not self.args.no_console)
 
 
         title = "%s updated every %s ms for %s reads" \
@@ -98,7 +284,12 @@ class FastPM100Application(object):
                              device_name="DualTriValueZMQ",
                              history_size=self.args.size,
                              title=title,
-                             update_time_interval=self.args.update)
+                             update_time_interval=self.args.update,
+                             device_kwargs=self.zmq_options(),
+                             publish_address=self.args.publish,
+                             metrics_exporter=self.metrics_exporter(),
+                             low_jitter=self.low_jitter(),
+                             backend=self.args.backend)
 
         elif self.args.controller == "AllController":
             cc = control.AllController
@@ -108,19 +299,85 @@ class FastPM100Application(object):
                              title=title,
                              geometry=self.args.geometry,
                              filename=self.args.filename,
-                             update_time_interval=self.args.update)
+                             update_time_interval=self.args.update,
+                             device_kwargs=self.zmq_options(),
+                             publish_address=self.args.publish,
+                             metrics_exporter=self.metrics_exporter(),
+                             low_jitter=self.low_jitter(),
+                             backend=self.args.backend)
+        elif self.args.controller == "DashboardController":
+            cc = control.DashboardController
+            app_control = cc(self.main_logger.log_queue,
+                             view_specs=self.args.view,
+                             sources=self.args.sources,
+                             device_name="AllValueZMQ",
+                             title=title,
+                             filename=self.args.filename,
+                             device_kwargs=self.zmq_options(),
+                             publish_address=self.args.publish,
+                             metrics_exporter=self.metrics_exporter(),
+                             low_jitter=self.low_jitter(),
+                             backend=self.args.backend)
         else:
+            specs = [discovery.parse_spec(self.args.device)]
+            device_name, spec_kwargs = discovery.resolve(specs)[0]
+
+            device_kwargs = {}
+            if "ZMQ" in device_name:
+                device_kwargs = self.zmq_options()
+            device_kwargs.update(spec_kwargs)
+
             cc = control.Controller
             app_control = cc(self.main_logger.log_queue,
-                             device_name=self.args.device,
+                             device_name=device_name,
                              history_size=self.args.size,
                              title=title,
-                             update_time_interval=self.args.update)
+                             update_time_interval=self.args.update,
+                             device_kwargs=device_kwargs,
+                             publish_address=self.args.publish,
+                             metrics_exporter=self.metrics_exporter(),
+                             device_choices=self.args.choices.split(","),
+                             low_jitter=self.low_jitter(),
+                             backend=self.args.backend)
 
 
         app_control.control_exit_signal.exit.connect(self.closeEvent)
 
-        sys.exit(self.app.exec_())
+        if self.args.benchmark is not None:
+            app_control.start_benchmark(self.args.benchmark)
+
+        exit_code = self.app.exec_()
+
+        if app_control.benchmark_results is not None:
+            self.report_benchmark(app_control.benchmark_results)
+
+        sys.exit(exit_code)
+
+    def report_benchmark(self, results):
+        """ Print the benchmark results of the controller, and save them to
+        the json output file if specified.
+        """
+        report = {"controller": self.args.controller,
+                  "device": results["device"],
+                  "size": self.args.size,
+                  "update": self.args.update,
+                  "results": results}
+
+        print "Data FPS:   %0.1f" % results["data_fps"]
+        print "Render FPS: %0.1f" % results["render_fps"]
+        print "Skip FPS:   %0.1f" % results["skip_fps"]
+        for name in ["view", "acquisition"]:
+            cpu = results["cpu_percent"][name]
+            peak = results["peak_memory"][name]
+            if cpu is not None:
+                print "%s CPU: %0.1f%%" % (name.capitalize(), cpu)
+            if peak is not None:
+                print "%s peak RSS: %0.1f MB" % (name.capitalize(), peak / 1e6)
+        print json.dumps(report, sort_keys=True)
+
+        if self.args.benchmark_output is not None:
+            with open(self.args.benchmark_output, "w") as json_file:
+                json.dump(report, json_file, indent=2, sort_keys=True)
 
 
     def closeEvent(self):
@@ -0,0 +1,173 @@
+""" FastPM100Headless - acquire at full rate without a display. Record,
+summarize and republish every sample read from one or more devices.
+"""
+
+import sys
+import logging
+import argparse
+import multiprocessing
+
+from fastpm100 import headless
+from fastpm100 import applog
+from fastpm100 import lowjitter
+from fastpm100 import profiling
+
+log = logging.getLogger(__name__)
+
+class FastPM100HeadlessApplication(object):
+    """ Run the specified devices with no PySide or pyqtgraph import, and
+    log rate summaries until the duration elapses or Ctrl+C is pressed.
+    """
+    def __init__(self):
+        super(FastPM100HeadlessApplication, self).__init__()
+        log.debug("startup")
+        self.parser = self.create_parser()
+        self.args = None
+
+    def parse_args(self, argv):
+        """ Handle any bad arguments, then set defaults.
+        """
+        log.debug("Process args: %s", argv)
+        self.args = self.parser.parse_args(argv)
+        if not self.args.device:
+            self.args.device = ["ThorlabsMeter"]
+        return self.args
+
+    def create_parser(self):
+        """ Create the parser with arguments specific to this
+        application.
+        """
+        desc = "acquire from specified devices without a display"
+        parser = argparse.ArgumentParser(description=desc)
+
+        device_str = "Data source, repeat for more devices, with options" \
+                     " like ThorlabsMeter:serial_number=P2000343"
+        parser.add_argument("-d", "--device", type=str, action="append",
+                            default=[], help=device_str)
+
+        duration_str = "Seconds to acquire for, forever if not specified"
+        parser.add_argument("-t", "--duration", type=float,
+                            default=None, help=duration_str)
+
+        record_str = "Directory to write a csv file per device"
+        parser.add_argument("-r", "--record", type=str,
+                            default=None, help=record_str)
+
+        publish_str = "Republish devices on consecutive ports from this one"
+        parser.add_argument("-p", "--publish-port", type=int,
+                            default=None, help=publish_str)
+
+        summary_str = "Seconds between rate summaries"
+        parser.add_argument("-s", "--summary", type=float,
+                            default=5.0, help=summary_str)
+
+        batch_str = "Maximum samples per batch from each device"
+        parser.add_argument("-b", "--batch-size", type=int,
+                            default=1000, help=batch_str)
+
+        queue_str = "Batches held per device before dropping"
+        parser.add_argument("-q", "--queue-size", type=int,
+                            default=100, help=queue_str)
+
+        backend_str = "Acquire on a process, a thread, or auto for a" \
+                      " thread with devices that wait on I/O"
+        parser.add_argument("--backend", type=str, default="process",
+                            choices=["process", "thread", "auto"],
+                            help=backend_str)
+
+        profile_str = "Write a cProfile stats file per process to this" \
+                      " directory on exit"
+        parser.add_argument("--profile", type=str,
+                            default=None, help=profile_str)
+
+        jitter_group = parser.add_argument_group("low jitter options")
+        jitter_group.add_argument("--low-jitter", action="store_true",
+                                  help="Pin, raise the priority of and"
+                                       " control garbage collection in the"
+                                       " acquisition process, Linux only")
+        jitter_group.add_argument("--cpu", type=int, action="append",
+                                  default=[],
+                                  help="Pin acquisition to this cpu, repeat"
+                                       " for more")
+        jitter_group.add_argument("--nice", type=int, default=-10,
+                                  help="Niceness change of the acquisition"
+                                       " process, negative is higher"
+                                       " priority")
+
+        log_group = parser.add_argument_group("log options")
+        log_group.add_argument("--log-level", type=str, default="DEBUG",
+                               help="Discard records below this level in"
+                                    " every process")
+        log_group.add_argument("--log-max-mb", type=float, default=10.0,
+                               help="Rotate the log file at this size")
+        log_group.add_argument("--log-when", type=str, default=None,
+                               help="Rotate the log file by time instead,"
+                                    " for example midnight or H")
+        log_group.add_argument("--log-backups", type=int, default=5,
+                               help="Previous log files to keep")
+        log_group.add_argument("--no-console", action="store_true",
+                               help="Do not echo log records to stdout")
+
+        return parser
+
+    def low_jitter(self):
+        """ Return the low jitter settings for the acquisition processes,
+        or None if not requested.
+        """
+        if not self.args.low_jitter:
+            return None
+
+        return lowjitter.LowJitter(cpus=self.args.cpu or None,
+                                   niceness=self.args.nice)
+
+    def run(self):
+        """ Acquire until done, then stop the devices and the logger.
+        """
+        if self.args.profile is not None:
+            profiling.enable(self.args.profile)
+
+        self.main_logger = applog.MainLogger(
+            level=self.args.log_level.upper(),
+            max_bytes=int(self.args.log_max_mb * 1024 * 1024),
+            backup_count=self.args.log_backups,
+            when=self.args.log_when,
+            console=not self.args.no_console)
+
+        acquisition = headless.HeadlessAcquisition(
+            self.main_logger.log_queue,
+            device_names=self.args.device,
+            record_directory=self.args.record,
+            publish_port=self.args.publish_port,
+            batch_size=self.args.batch_size,
+            queue_size=self.args.queue_size,
+            summary_interval=self.args.summary,
+            low_jitter=self.low_jitter(),
+            backend=self.args.backend)
+
+        try:
+            acquisition.run(self.args.duration)
+        finally:
+            acquisition.close()
+            self.main_logger.close()
+
+def main(argv=None):
+    """ main calls the wrapper code around the application objects with
+    as little framework as possible.
+    """
+    argv = argv[1:]
+    log.debug("Arguments: %s", argv)
+
+    exit_code = 0
+    try:
+        go_app = FastPM100HeadlessApplication()
+        go_app.parse_args(argv)
+        go_app.run()
+
+    except SystemExit, exc:
+        exit_code = exc.code
+
+    return exit_code
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main(sys.argv))
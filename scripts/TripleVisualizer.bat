@@ -1,24 +1,14 @@
 REM TripleVisualizer.bat
 REM Command line 
 
-REM All components visualized, as fast as possible, for 3000 reads, top
-REM of screen
+REM All components visualized in three windows over one acquisition
+REM process and one history: as fast as possible for 3000 reads at the top
+REM of screen, every 10 seconds for one day in the middle and every 60
+REM seconds for 100 days at the bottom. Each view is --view
+REM SIZE,UPDATE,X,Y,W,H
 start "" python -u FastPM100.py ^
-     --controller AllController ^
-     --geometry 0,25,1920,333
-
-REM All components visualized, every 10 seconds, for one day, middle of
-REM screen
-start "" python -u FastPM100.py ^
-    --controller AllController ^
-    --update 10000 --size 8640 ^
-    --filename "../../BoardTester/scripts/combined_log.csv" ^
-    --geometry 0,385,1920,333
-
-REM All components visualized, every 60 seconds, for 100 days, bottom of
-REM screen
-start "" python -u FastPM100.py ^
-    --controller AllController ^
-    --update 60000 --size 144000 ^
+    --controller DashboardController ^
     --filename "../../BoardTester/scripts/combined_log.csv" ^
-    --geometry 0,740,1920,333
+    --view 3000,0,0,25,1920,333 ^
+    --view 8640,10000,0,385,1920,333 ^
+    --view 144000,60000,0,740,1920,333
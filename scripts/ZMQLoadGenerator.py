@@ -0,0 +1,102 @@
+""" Publish a deterministic, high rate zmq stream for throughput testing of
+the FastPM100 zmq devices and controllers. For example, 10k six channel
+binary messages per second for one minute:
+
+    python -u scripts/ZMQLoadGenerator.py --rate 10000 --binary --duration 60
+"""
+
+import sys
+import logging
+import argparse
+
+from fastpm100 import loadgen
+
+log = logging.getLogger(__name__)
+
+
+class ZMQLoadGeneratorApplication(object):
+    """ Parse the load options, publish until the duration has elapsed or
+    the user presses Ctrl+C, then print the achieved rate.
+    """
+    def __init__(self):
+        super(ZMQLoadGeneratorApplication, self).__init__()
+        self.parser = self.create_parser()
+        self.args = None
+
+    def parse_args(self, argv):
+        """ Handle any bad arguments, then set defaults.
+        """
+        self.args = self.parser.parse_args(argv)
+        return self.args
+
+    def create_parser(self):
+        """ Create the parser with arguments specific to this
+        application.
+        """
+        desc = "publish a seeded multi-channel signal at a fixed rate"
+        parser = argparse.ArgumentParser(description=desc)
+
+        parser.add_argument("-p", "--port", type=str, default="6545",
+                            help="Publisher port")
+
+        parser.add_argument("-t", "--topic", type=str,
+                            default="temperatures_and_power",
+                            help="Topic prefix of every message")
+
+        parser.add_argument("-r", "--rate", type=int, default=1000,
+                            help="Messages per second, up to 100000")
+
+        parser.add_argument("-c", "--channels", type=int, default=6,
+                            help="Number of values in each message")
+
+        parser.add_argument("-b", "--binary", action="store_true",
+                            help="Send binary float64 messages")
+
+        parser.add_argument("-n", "--no-sequence", action="store_true",
+                            help="Omit sequence numbers from text messages")
+
+        parser.add_argument("-s", "--seed", type=int, default=0,
+                            help="Random seed of the generated signal")
+
+        parser.add_argument("-d", "--duration", type=float, default=None,
+                            help="Seconds to publish, forever by default")
+
+        parser.add_argument("--hwm", type=int, default=None,
+                            help="Publisher send high water mark")
+
+        return parser
+
+    def run(self):
+        """ Create the generator and publish with rate reports.
+        """
+        generator = loadgen.LoadGenerator(port=self.args.port,
+                                          topic=self.args.topic,
+                                          rate=self.args.rate,
+                                          channels=self.args.channels,
+                                          binary=self.args.binary,
+                                          sequence=not self.args.no_sequence,
+                                          seed=self.args.seed,
+                                          send_hwm=self.args.hwm)
+        try:
+            summary = generator.run(duration=self.args.duration)
+            print "Sent %(sent)s messages in %(elapsed).1fs, " \
+                  "%(rate).0f msg/s" % summary
+        except KeyboardInterrupt:
+            print "Sent %s messages" % generator.sent
+        finally:
+            generator.close()
+
+
+def main(argv=None):
+    """ Wrap the application object with as little framework as possible.
+    """
+    logging.basicConfig(level=logging.INFO,
+                        format="%(name)s %(levelname)-8s %(message)s")
+
+    go_app = ZMQLoadGeneratorApplication()
+    go_app.parse_args(argv[1:])
+    go_app.run()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
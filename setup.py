@@ -17,6 +17,11 @@ requires = [
     "pyserial",
     ]
 
+# Simulated VISA meters of tests/pm100_sim.yaml
+tests_requires = [
+    "pyvisa-sim",
+    ]
+
 setup(name="fastpm100",
       version="0.0",
       description="Minimal PySide testable application",
@@ -31,4 +36,6 @@ setup(name="fastpm100",
       zip_safe=False,
       test_suite="fastpm100",
       install_requires=requires,
+      tests_require=tests_requires,
+      extras_require={"test": tests_requires},
       )
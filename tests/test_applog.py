@@ -126,3 +126,179 @@ class TestLogFile():
 
         root_log.debug("%s Sub process debug log info", proc_name)
 
+
+    def test_level_filters_sub_process_records(self):
+        assert applog.delete_log_file_if_exists() == True
+
+        main_logger = applog.MainLogger(level=logging.INFO)
+
+        log_queue = main_logger.log_queue
+        sub_proc = multiprocessing.Process(target=self.level_worker_process,
+                                           args=(log_queue,))
+        sub_proc.start()
+        sub_proc.join()
+
+        main_logger.close()
+        time.sleep(0.5) # required to let file creation happen
+
+        log_text = applog.get_text_from_log()
+        assert "Sub process info entry" in log_text
+        assert "Sub process debug entry" not in log_text
+        applog.explicit_log_close()
+
+    def test_batched_sub_process_records_all_written(self):
+        assert applog.delete_log_file_if_exists() == True
+
+        main_logger = applog.MainLogger()
+
+        log_queue = main_logger.log_queue
+        sub_proc = multiprocessing.Process(target=self.many_worker_process,
+                                           args=(log_queue,))
+        sub_proc.start()
+        sub_proc.join()
+
+        main_logger.close()
+        time.sleep(0.5) # required to let file creation happen
+
+        log_text = applog.get_text_from_log()
+        for count in range(50):
+            assert "Batched entry %s\n" % count in log_text
+        applog.explicit_log_close()
+
+    def test_previous_log_rotated_to_backup(self):
+        assert applog.delete_log_file_if_exists() == True
+        backup = "%s.1" % applog.get_location()
+        if os.path.exists(backup):
+            os.remove(backup)
+
+        for run in range(2):
+            main_logger = applog.MainLogger(console=False)
+            logging.getLogger().info("Run %s entry", run)
+            main_logger.close()
+            applog.explicit_log_close()
+
+        with open(backup) as backup_file:
+            assert "Run 0 entry" in backup_file.read()
+
+        log_text = applog.get_text_from_log()
+        assert "Run 1 entry" in log_text
+        assert "Run 0 entry" not in log_text
+        os.remove(backup)
+
+    def level_worker_process(self, log_queue):
+        applog.process_log_configure(log_queue)
+        root_log = logging.getLogger()
+        root_log.debug("Sub process debug entry")
+        root_log.info("Sub process info entry")
+
+    def many_worker_process(self, log_queue):
+        """ Exit straight after logging, so the last batch is only written
+        by the flush on exit.
+        """
+        applog.process_log_configure(log_queue)
+        root_log = logging.getLogger()
+        for count in range(50):
+            root_log.info("Batched entry %s", count)
+
+
+@pytest.mark.skipif(pytest.config.getoption("--appveyor"),
+                    reason="need --appveyor option to disable tests")
+class TestFileHandler():
+    def test_writes_buffered_until_flush_interval(self, tmpdir):
+        filename = str(tmpdir.join("buffered.txt"))
+        handler = applog.create_file_handler(filename)
+        handler.flush_interval = 10.0
+        handler.last_flush = time.time()
+
+        record = logging.LogRecord("test", logging.INFO, __file__, 1,
+                                   "buffered entry", (), None)
+        handler.handle(record)
+        assert "buffered entry" not in open(filename).read()
+
+        handler.close()
+        assert "buffered entry" in open(filename).read()
+
+    def test_rotates_at_max_bytes(self, tmpdir):
+        filename = str(tmpdir.join("rotated.txt"))
+        handler = applog.create_file_handler(filename, max_bytes=1000,
+                                             backup_count=2)
+        message = "entry %s " + "x" * 50
+        for count in range(100):
+            record = logging.LogRecord("test", logging.INFO, __file__, 1,
+                                       message, (count,), None)
+            handler.handle(record)
+        handler.close()
+
+        assert os.path.getsize(filename) <= 1000
+        assert os.path.exists(filename + ".1")
+        assert os.path.exists(filename + ".2")
+        assert not os.path.exists(filename + ".3")
+
+
+class FakeQueue(list):
+    def put_nowait(self, item):
+        self.append(item)
+
+
+@pytest.mark.skipif(pytest.config.getoption("--appveyor"),
+                    reason="need --appveyor option to disable tests")
+class TestQueueHandler():
+    def make_record(self, msg, created=0.0, level=logging.DEBUG,
+                    name="test"):
+        record = logging.LogRecord(name, level, __file__, 1, msg,
+                                   (), None)
+        record.created = created
+        return record
+
+    def test_records_put_as_one_list_on_flush(self):
+        log_queue = FakeQueue()
+        handler = applog.QueueHandler(log_queue, flush_interval=10.0)
+        for count in range(3):
+            handler.handle(self.make_record("entry %s" % count))
+
+        assert log_queue == []
+        handler.flush()
+        assert len(log_queue) == 1
+        assert [record.msg for record in log_queue[0]] == \
+            ["entry 0", "entry 1", "entry 2"]
+        handler.close()
+
+    def test_full_buffer_and_errors_flush_immediately(self):
+        log_queue = FakeQueue()
+        handler = applog.QueueHandler(log_queue, flush_interval=10.0,
+                                      capacity=2)
+        handler.handle(self.make_record("first"))
+        handler.handle(self.make_record("second"))
+        assert len(log_queue) == 1
+
+        handler.handle(self.make_record("problem", level=logging.ERROR))
+        assert len(log_queue) == 2
+        handler.close()
+
+    def test_unbatched_puts_each_record(self):
+        log_queue = FakeQueue()
+        handler = applog.QueueHandler(log_queue, flush_interval=0)
+        handler.handle(self.make_record("entry %s"))
+        assert log_queue[0].msg == "entry %s"
+
+    def test_rate_limit_drops_repeats_and_notes_count(self):
+        rate_filter = applog.RateLimitFilter(rate=2, interval=1.0)
+        passed = [rate_filter.filter(self.make_record("same", 0.1 * count))
+                  for count in range(5)]
+        assert passed == [True, True, False, False, False]
+
+        # Different messages are limited separately
+        assert rate_filter.filter(self.make_record("other", 0.5)) == True
+
+        record = self.make_record("same", 1.5)
+        assert rate_filter.filter(record) == True
+        assert record.msg == "same [3 similar suppressed]"
+
+    def test_rate_limit_passes_every_event(self):
+        rate_filter = applog.RateLimitFilter(rate=2, interval=1.0)
+        records = [self.make_record("acquisition", 0.1 * count,
+                                    name="fastpm100.events")
+                   for count in range(5)]
+        assert [rate_filter.filter(record) for record in records] \
+            == [True] * 5
+        assert [record.msg for record in records] == ["acquisition"] * 5
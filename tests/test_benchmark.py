@@ -0,0 +1,111 @@
+""" Run the benchmarks briefly to show they measure, save and compare.
+"""
+
+import pytest
+
+from fastpm100 import benchmark, applog
+
+import logging
+log = logging.getLogger(__name__)
+
+class TestCompare:
+
+    def report(self, reads, latency):
+        return {"results": {"read_rate": {"reads_per_second": reads},
+                            "read_latency": {"p50_ms": latency,
+                                             "samples": 10}}}
+
+    def test_within_tolerance_is_not_a_regression(self):
+        baseline = self.report(1000.0, 1.0)
+        current = self.report(950.0, 1.05)
+        assert benchmark.compare(baseline, current) == []
+
+    def test_lower_rates_and_longer_times_are_regressions(self):
+        baseline = self.report(1000.0, 1.0)
+        current = self.report(800.0, 2.0)
+        regressions = benchmark.compare(baseline, current)
+        assert ("read_rate", "reads_per_second", 1000.0, 800.0) \
+            in regressions
+        assert ("read_latency", "p50_ms", 1.0, 2.0) in regressions
+
+    def test_save_and_load(self, tmpdir):
+        filename = str(tmpdir.join("results.json"))
+        benchmark.save(self.report(1000.0, 1.0), filename)
+        assert benchmark.load(filename) == self.report(1000.0, 1.0)
+
+@pytest.mark.skipif(pytest.config.getoption("--appveyor"),
+                    reason="need --appveyor option to disable tests")
+class TestAcquisitionBenchmarks:
+
+    @pytest.fixture(scope="function")
+    def log_queue(self, request):
+        assert applog.delete_log_file_if_exists() == True
+        main_logger = applog.MainLogger()
+
+        def close_logger():
+            main_logger.close()
+            applog.explicit_log_close()
+        request.addfinalizer(close_logger)
+        return main_logger.log_queue
+
+    def test_read_rate(self, log_queue):
+        results = benchmark.measure_read_rate(log_queue, duration=1.0)
+        assert results["reads_per_second"] >= 1000
+
+    def test_read_latency_without_render(self, log_queue):
+        results = benchmark.measure_read_latency(log_queue, duration=1.0,
+                                                 render=False)
+        assert results["samples"] >= 100
+        assert 0 < results["p50_ms"] <= results["max_ms"]
+
+    def test_process_and_thread_backends(self, log_queue):
+        for backend in ("process", "thread"):
+            results = benchmark.measure_backend(log_queue, backend,
+                                                duration=1.0)
+            assert results["samples"] >= 100
+            assert results["startup_ms"] > 0
+            assert results["memory_bytes"] is not None
+            assert results["reads_per_second"] >= 1000
+
+    def test_ingest_from_many_publishers(self, log_queue):
+        results = benchmark.measure_ingest(log_queue, publishers=3,
+                                           rate=200, duration=1.0)
+        assert results["samples_per_second"] >= 300
+        assert results["lost_fraction"] < 0.5
+
+    def test_shared_history_store(self):
+        results = benchmark.measure_history_store(reads=20000)
+        assert results["shared_reads_per_second"] > 0
+        assert results["separate_reads_per_second"] > 0
+        assert results["shared_memory_bytes"] \
+            <= results["separate_memory_bytes"]
+        assert results["shared_decimate_ms"] > 0
+
+    def test_read_latency_to_set_data(self, log_queue, qtbot):
+        results = benchmark.measure_read_latency(log_queue, duration=1.0)
+        assert results["samples"] >= 10
+        assert results["p50_ms"] > 0
+
+@pytest.mark.skipif(pytest.config.getoption("--appveyor"),
+                    reason="need --appveyor option to disable tests")
+class TestRenderBenchmarks:
+
+    def test_render_cost_per_history_size(self, qtbot):
+        results = benchmark.measure_render(history_sizes=(300, 3000),
+                                           repeats=5)
+        assert sorted(results.keys()) == ["all_300_ms", "all_3000_ms",
+                                          "strip_300_ms", "strip_3000_ms"]
+        assert min(results.values()) > 0
+
+    def test_preload_csv_time(self):
+        results = benchmark.measure_preload_csv(rows=2000,
+                                                target_rows=50000)
+        assert results["preload_seconds"] > 0
+        assert results["preload_seconds_scaled"] > results["preload_seconds"]
+        assert results["preload_seconds_target"] \
+            > results["preload_seconds_scaled"]
+
+        # Parsing into a single array grows about linearly
+        assert 0.5 < results["preload_scaling_exponent"] < 1.5
+        assert results["preload_seconds_per_million_rows"] \
+            > results["preload_seconds_target"]
@@ -0,0 +1,81 @@
+""" Single producer buffer semantics, across threads and alone.
+"""
+
+import time
+import Queue
+import threading
+
+import pytest
+
+from fastpm100 import buffers
+
+import logging
+log = logging.getLogger(__name__)
+
+@pytest.mark.skipif(pytest.config.getoption("--appveyor"),
+                    reason="need --appveyor option to disable tests")
+class TestSingleProducerBuffer:
+
+    def test_bounded_put_and_get(self):
+        buff = buffers.SingleProducerBuffer(maxsize=2)
+        assert buff.empty()
+
+        buff.put(1)
+        buff.put_nowait(2)
+        assert buff.full()
+        assert buff.qsize() == 2
+
+        with pytest.raises(Queue.Full):
+            buff.put(3, block=False)
+        with pytest.raises(Queue.Full):
+            buff.put(3, timeout=0.01)
+
+        assert buff.get() == 1
+        assert buff.get_nowait() == 2
+        with pytest.raises(Queue.Empty):
+            buff.get(block=False)
+
+    def test_unbounded_never_full(self):
+        buff = buffers.SingleProducerBuffer()
+        for value in range(1000):
+            buff.put(value, block=False)
+        assert not buff.full()
+        assert buff.qsize() == 1000
+
+    def test_get_times_out(self):
+        buff = buffers.SingleProducerBuffer()
+        start_time = time.time()
+        with pytest.raises(Queue.Empty):
+            buff.get(timeout=0.05)
+        assert time.time() - start_time >= 0.05
+
+    def test_blocked_wait_polls_at_most_every_poll_interval(self):
+        buff = buffers.SingleProducerBuffer(poll_interval=0.001)
+        polls = []
+
+        def empty():
+            polls.append(time.time())
+            return True
+
+        with pytest.raises(Queue.Empty):
+            buff.wait(empty, True, 0.1, Queue.Empty)
+
+        # A poll every 1 ms after the first few, sleeps only run long
+        assert len(polls) <= 110
+
+    def test_items_arrive_in_order_across_threads(self):
+        buff = buffers.SingleProducerBuffer(maxsize=10)
+        count = 10000
+
+        def produce():
+            for value in range(count):
+                buff.put(value, timeout=5.0)
+
+        producer = threading.Thread(target=produce)
+        producer.start()
+
+        received = [buff.get(timeout=5.0) for value in range(count)]
+        producer.join()
+
+        assert received == range(count)
+        assert buff.empty()
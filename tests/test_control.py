@@ -10,7 +10,7 @@ import pytest
 
 from PySide import QtTest, QtCore
 
-from fastpm100 import control, applog
+from fastpm100 import control, applog, history, ingest
 
 
 @pytest.mark.skipif(pytest.config.getoption("--appveyor"),
@@ -107,6 +107,69 @@ class TestControl:
         sfps_val = simulate_main.form.ui.labelSkipFPS.text()
         assert sfps_val != "0.0"
 
+    def test_benchmark_reports_rates_and_closes(self, simulate_main, qtbot):
+        qtbot.wait(1000)
+
+        close_signal = simulate_main.control_exit_signal.exit
+        with qtbot.wait_signal(close_signal, timeout=3000):
+            simulate_main.start_benchmark(1.0)
+
+        results = simulate_main.benchmark_results
+        assert results["device"] == "SimulatedPM100"
+        assert results["duration"] >= 1.0
+        assert results["data_fps"] >= 1000
+        assert results["render_fps"] > 0
+        assert results["skip_fps"] == \
+            results["data_fps"] - results["render_fps"]
+        assert results["cpu_percent"]["view"] > 0
+        assert results["cpu_percent"]["acquisition"] > 0
+        assert results["peak_memory"]["acquisition"] > 0
+
+    def test_benchmark_of_thread_backend_has_no_acquisition_usage(
+            self, qtbot, request):
+        assert applog.delete_log_file_if_exists() == True
+        main_logger = applog.MainLogger()
+        app_control = control.Controller(main_logger.log_queue,
+                                         backend="thread")
+        qtbot.addWidget(app_control.form)
+
+        def control_close():
+            app_control.close()
+            main_logger.close()
+            applog.explicit_log_close()
+
+        request.addfinalizer(control_close)
+
+        close_signal = app_control.control_exit_signal.exit
+        with qtbot.wait_signal(close_signal, timeout=3000):
+            app_control.start_benchmark(1.0)
+
+        results = app_control.benchmark_results
+        assert results["data_fps"] > 0
+        assert results["cpu_percent"]["acquisition"] is None
+        assert results["peak_memory"]["acquisition"] is None
+
+    def test_state_label_shows_acquisition_state(self, simulate_main, qtbot):
+        qtbot.wait(1500)
+        assert simulate_main.form.ui.labelState.text() == "running"
+
+        simulate_main.device.proc.terminate()
+        qtbot.wait(2500)
+        assert simulate_main.device.restarts == 1
+        assert simulate_main.form.ui.labelState.text() == "running"
+
+    def test_switch_device_keeps_history(self, simulate_main, qtbot):
+        qtbot.wait(1000)
+        history = len(simulate_main.current)
+        pid = simulate_main.device.proc.pid
+
+        assert simulate_main.switch_device("SimulatedLaserPM100") == True
+        assert simulate_main.switch_device("SimulatedLaserPM100") == False
+        qtbot.wait(1000)
+
+        assert simulate_main.device.proc.pid == pid
+        assert len(simulate_main.current) >= history
+
     def test_toolbar_button_status_on_startup(self, simulate_main, qtbot):
 
         QtTest.QTest.qWaitForWindowShown(simulate_main.form)
@@ -290,3 +353,92 @@ class TestAllControl:
         QtTest.QTest.qWaitForWindowShown(simulate_reload_one_day_main.form)
         qtbot.wait(3000)
 
+
+
+@pytest.mark.skipif(pytest.config.getoption("--appveyor"),
+                    reason="need --appveyor option to disable tests")
+class TestDashboardControl:
+
+    @pytest.fixture(scope="function")
+    def simulate_dashboard_main(self, qtbot, request):
+        """ Setup the dashboard with the three views of
+        TripleVisualizer.bat, preloaded from the temperature logger csv.
+        """
+        assert applog.delete_log_file_if_exists() == True
+
+        main_logger = applog.MainLogger()
+        views = [history.parse_view(text) for text in
+                 ["300,0,100,100,800,250", "8640,10000,100,400,800,250",
+                  "144000,60000,100,700,800,250"]]
+        app_control = control.DashboardController(main_logger.log_queue,
+                                                  view_specs=views,
+                                                  filename="tests/combined_log.csv")
+
+        for view in app_control.dashboard_views:
+            qtbot.addWidget(view.form)
+
+        def control_close():
+            app_control.close()
+            main_logger.close()
+            applog.explicit_log_close()
+
+        request.addfinalizer(control_close)
+
+        return app_control
+
+    def test_one_acquisition_for_every_view(self, simulate_dashboard_main,
+                                            qtbot):
+        dashboard = simulate_dashboard_main
+        assert len(dashboard.dashboard_views) == 3
+        assert dashboard.device.device_name == "AllValueZMQ"
+        assert [level.interval for level in dashboard.store.levels] \
+            == [0, 10000, 60000]
+
+    def test_views_draw_their_preloaded_level(self, simulate_dashboard_main,
+                                              qtbot):
+        dashboard = simulate_dashboard_main
+        QtTest.QTest.qWaitForWindowShown(dashboard.form)
+
+        day_view = dashboard.dashboard_views[1]
+        curve = day_view.form.plots[0][1]
+        assert len(curve.yData) <= day_view.spec.max_points
+        assert day_view.form.ui.labelMinimum.text().endswith(" mw")
+
+    def test_views_of_ingest_sources(self, qtbot, request, tmpdir):
+        assert applog.delete_log_file_if_exists() == True
+        main_logger = applog.MainLogger()
+
+        filename = str(tmpdir.join("lab.csv"))
+        with open(filename, "w") as csv_file:
+            for value in range(10):
+                csv_file.write("%s\n" % ",".join([str(value)] * 6))
+
+        sources = [ingest.CSVTailSource("lab", filename, from_start=True)]
+        views = [history.parse_view("300,0@lab"),
+                 history.parse_view("10,1000")]
+        dashboard = control.DashboardController(main_logger.log_queue,
+                                                view_specs=views,
+                                                sources=sources,
+                                                backend="thread")
+
+        def control_close():
+            dashboard.close()
+            main_logger.close()
+            applog.explicit_log_close()
+
+        request.addfinalizer(control_close)
+
+        assert dashboard.device.device_name == "IngestEngine"
+        assert dashboard.stores.keys() == ["lab"]
+        qtbot.wait_until(lambda: dashboard.reported_frames == 10,
+                         timeout=5000)
+        assert dashboard.store.latest(0)[0].tolist() == range(10)
+
+    def test_close_any_view_emits_control_signal(self,
+                                                 simulate_dashboard_main,
+                                                 qtbot):
+        dashboard = simulate_dashboard_main
+        close_signal = dashboard.control_exit_signal.exit
+        with qtbot.wait_signal(close_signal, timeout=1000):
+            dashboard.dashboard_views[2].form.close()
+        assert dashboard.continue_loop == False
@@ -4,6 +4,7 @@ devices.
 """
 
 import time
+import numpy
 import pytest
 
 from fastpm100 import devices, applog
@@ -55,6 +56,174 @@ class TestSimulatedPM100Device:
         applog.explicit_log_close()
 
 
+@pytest.mark.skipif(pytest.config.getoption("--appveyor"),
+                    reason="need --appveyor option to disable tests")
+class TestSimulatedLaserPM100Device:
+
+    def test_seeded_traces_are_repeatable(self):
+        first = devices.PowerTraceGenerator(seed=42).block(10000)
+        second = devices.PowerTraceGenerator(seed=42).block(10000)
+        assert numpy.array_equal(first, second)
+
+        other = devices.PowerTraceGenerator(seed=43).block(10000)
+        assert not numpy.array_equal(first, other)
+
+    def test_trace_has_pulses_and_dropouts(self):
+        generator = devices.PowerTraceGenerator(sample_rate=1000, seed=1,
+                                                dropout_rate=10.0)
+        trace = generator.block(10000)
+
+        assert len(trace) == 10000
+        assert trace.min() == 0.0
+        assert trace.max() >= 55.0
+
+        generator = devices.PowerTraceGenerator(sample_rate=1000, seed=1,
+                                                pulse_frequency=None,
+                                                dropout_rate=0.0)
+        assert generator.block(10000).min() > 0.0
+
+    def test_small_blocks_without_dropouts(self):
+        generator = devices.PowerTraceGenerator(sample_rate=100000, seed=1,
+                                                pulse_frequency=None,
+                                                dropout_rate=0.0)
+        for count in range(10):
+            assert generator.block(100).min() > 0.0
+
+        device = devices.SimulatedLaserPM100(sample_rate=100000, seed=1,
+                                             block_size=100,
+                                             pulse_frequency=None,
+                                             dropout_rate=0.0)
+        assert min([device.read() for count in range(300)]) > 0.0
+        applog.explicit_log_close()
+
+    def test_read_block_returns_timestamps_and_values(self):
+        device = devices.SimulatedLaserPM100(sample_rate=None, seed=1,
+                                             block_size=500)
+        stamps, values = device.read_block()
+        assert len(stamps) == 500
+        assert len(values) == 500
+        assert stamps[-1] >= stamps[0]
+        applog.explicit_log_close()
+
+    def test_sample_rate_is_regulated(self):
+        device = devices.SimulatedLaserPM100(sample_rate=1000, seed=1)
+        result = device.read()
+        assert result != None
+
+        start_time = time.time()
+        for count in range(2000):
+            device.read()
+        time_diff = time.time() - start_time
+
+        assert time_diff >= 1.5
+        assert time_diff <= 4.0
+        applog.explicit_log_close()
+
+
+@pytest.mark.skipif(pytest.config.getoption("--appveyor"),
+                    reason="need --appveyor option to disable tests")
+class TestErrorClassification:
+
+    def test_connection_data_and_fatal_errors(self):
+        assert devices.classify_error(IOError("unplugged")) == "connection"
+        assert devices.classify_error(OSError(19, "No device")) \
+            == "connection"
+        assert devices.classify_error(ValueError("bad float")) == "data"
+        assert devices.classify_error(NameError("bug")) == "fatal"
+
+    def test_unplugged_simulated_meter(self, tmpdir):
+        unplug_file = str(tmpdir.join("unplugged"))
+        device = devices.SimulatedUnplugPM100(unplug_file)
+        assert device.read() >= 123.0
+
+        open(unplug_file, "w").close()
+        with pytest.raises(IOError):
+            device.read()
+        with pytest.raises(IOError):
+            devices.SimulatedUnplugPM100(unplug_file)
+
+
+@pytest.mark.skipif(pytest.config.getoption("--appveyor"),
+                    reason="need --appveyor option to disable tests")
+class TestSimulatedVisaPM100:
+    """ Exercise the VISA code path against the pyvisa-sim resources in
+    tests/pm100_sim.yaml, so no hardware is required.
+    """
+    visa_library = "tests/pm100_sim.yaml@sim"
+
+    def meter(self, **kwargs):
+        pytest.importorskip("pyvisa_sim")
+        return devices.ThorlabsMeter(backend="visa",
+                                     visa_library=self.visa_library,
+                                     **kwargs)
+
+    def test_select_meter_by_serial_number(self):
+        device = self.meter(serial_number="P2000002")
+        assert device.read() == 2.0
+
+        device = self.meter(serial_number="P2000001")
+        assert device.read() == 1.0
+        applog.explicit_log_close()
+
+    def test_unknown_serial_number_raises(self):
+        with pytest.raises(ValueError):
+            self.meter(serial_number="P9999999")
+        applog.explicit_log_close()
+
+    def test_pipelined_read_matches_synchronous(self):
+        device = self.meter(serial_number="P2000001", pipelined=True)
+        assert device.read() == 1.0
+        assert device.read() == 1.0
+        applog.explicit_log_close()
+
+    def test_configure_while_pipelined(self):
+        device = self.meter(serial_number="P2000001", pipelined=True)
+        assert device.read() == 1.0
+
+        settings = device.configure(wavelength=532.0)
+        assert settings["wavelength"] == 532.0
+        assert device.read() == 1.0
+        assert device.read() == 1.0
+
+        # The initiated conversion is the only response waiting
+        assert float(device.fetch_pending()) == 1.0e-3
+        assert float(device.power_meter.query("SENS:CORR:WAV?")) == 532.0
+        applog.explicit_log_close()
+
+    def record_commands(self, device):
+        """ Return the list of the VISA writes and reads of the device from
+        now on, as tuples of the method name and command. A query is a
+        write followed by a read.
+        """
+        commands = []
+        meter = device.power_meter
+
+        def recorder(name, method):
+            def recorded(*args):
+                commands.append((name,) + args)
+                return method(*args)
+            return recorded
+
+        for name in ["write", "read"]:
+            setattr(meter, name, recorder(name, getattr(meter, name)))
+        return commands
+
+    def test_pipelined_read_requests_the_next_result(self):
+        device = self.meter(pipelined=True)
+        commands = self.record_commands(device)
+        device.read()
+        device.read()
+        assert commands == [("read",), ("write", "MEAS:POW?"),
+                            ("read",), ("write", "MEAS:POW?")]
+
+        # The synchronous read waits for the result of its own request
+        device = self.meter(pipelined=False)
+        commands = self.record_commands(device)
+        device.read()
+        assert commands == [("write", "MEAS:POW?"), ("read",)]
+        applog.explicit_log_close()
+
+
 @pytest.mark.skipif(not pytest.config.getoption("--hardware"),
                     reason="need --hardware option to run")
 class TestSlapChopDevice:
@@ -0,0 +1,175 @@
+""" Discover meters behind fake USBTMC nodes, parse device specs and
+resolve serial numbers to addresses.
+"""
+
+import os
+import tty
+import time
+import platform
+import threading
+
+import pytest
+
+from fastpm100 import discovery
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class FakeMeter(object):
+    """ Answer the identity queries of a meter on a pseudo terminal, after
+    a delay, with a symlink to it named like a USBTMC node.
+    """
+    def __init__(self, node, serial_number, delay=0.2):
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        os.symlink(os.ttyname(self.slave), node)
+
+        self.serial_number = serial_number
+        self.delay = delay
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def run(self):
+        try:
+            while True:
+                command = os.read(self.master, 1024)
+                time.sleep(self.delay)
+                if command.startswith("*IDN?"):
+                    os.write(self.master, "Thorlabs,PM100USB,%s,1.6.0\n"
+                             % self.serial_number)
+                elif command.startswith("SYST:SENS:IDN?"):
+                    os.write(self.master, "S121C,77%s,01-Jan-2016,1,18,289\n"
+                             % self.serial_number[-1])
+        except OSError:
+            pass
+
+    def close(self):
+        os.close(self.master)
+        os.close(self.slave)
+
+
+@pytest.mark.skipif(pytest.config.getoption("--appveyor"),
+                    reason="need --appveyor option to disable tests")
+class TestSpecs:
+
+    def test_parse_name_only(self):
+        assert discovery.parse_spec("ThorlabsMeter") == ("ThorlabsMeter", {})
+
+    def test_parse_options(self):
+        name, kwargs = discovery.parse_spec("ThorlabsMeter:serial_number="
+                                            "P2000343,wavelength=633.0,"
+                                            "pipelined=True")
+        assert name == "ThorlabsMeter"
+        assert kwargs == {"serial_number": "P2000343", "wavelength": 633.0,
+                          "pipelined": True}
+
+    def test_parse_visa_address(self):
+        name, kwargs = discovery.parse_spec(
+            "ThorlabsMeter:address=USB0::0x1313::0x8072::P2000343::INSTR")
+        assert kwargs["address"] == "USB0::0x1313::0x8072::P2000343::INSTR"
+
+    def test_parse_numeric_serial_number_as_string(self):
+        name, kwargs = discovery.parse_spec("ThorlabsMeter:serial_number="
+                                            "0123456")
+        assert kwargs["serial_number"] == "0123456"
+
+        name, kwargs = discovery.parse_spec("ThorlabsMeter:serial_number="
+                                            "2000343,address=0x1313")
+        assert kwargs == {"serial_number": "2000343", "address": "0x1313"}
+
+    def test_parse_bad_option(self):
+        with pytest.raises(ValueError):
+            discovery.parse_spec("ThorlabsMeter:serial_number")
+
+    def test_parse_identity(self):
+        identity = discovery.parse_identity("Thorlabs,PM100USB,P2000343,"
+                                            "1.6.0\n")
+        assert identity == {"manufacturer": "Thorlabs",
+                            "model": "PM100USB",
+                            "serial_number": "P2000343",
+                            "firmware": "1.6.0"}
+
+    def test_nodes_in_numeric_order(self, tmpdir):
+        for number in (10, 2, 0):
+            tmpdir.join("usbtmc%s" % number).write("")
+        nodes = discovery.list_usbtmc(str(tmpdir.join("usbtmc*")))
+        assert [os.path.basename(node) for node in nodes] \
+            == ["usbtmc0", "usbtmc2", "usbtmc10"]
+
+    def test_resolve_without_serial_skips_discovery(self):
+        specs = [("SimulatedPM100", {}), ("ThorlabsMeter", {"address": "x"})]
+        assert discovery.resolve(specs) == specs
+
+
+@pytest.mark.skipif(pytest.config.getoption("--appveyor"),
+                    reason="need --appveyor option to disable tests")
+@pytest.mark.skipif("Linux" not in platform.platform(),
+                    reason="pseudo terminals are only tested on Linux")
+class TestUSBTMCDiscovery:
+
+    @pytest.fixture(scope="function")
+    def meters(self, request, tmpdir):
+        meters = [FakeMeter(str(tmpdir.join("usbtmc%s" % index)),
+                            "P200000%s" % (index + 1))
+                  for index in range(4)]
+
+        def close_meters():
+            for meter in meters:
+                meter.close()
+        request.addfinalizer(close_meters)
+        return str(tmpdir.join("usbtmc*"))
+
+    def test_identify_all_in_parallel(self, meters):
+        start_time = time.time()
+        found = discovery.discover(backend="usbtmc", pattern=meters)
+        elapsed = time.time() - start_time
+
+        assert [meter["serial_number"] for meter in found] \
+            == ["P2000001", "P2000002", "P2000003", "P2000004"]
+        assert found[0]["sensor"] == "S121C 771"
+        assert found[2]["address"].endswith("usbtmc2")
+
+        # Two queries of 0.2 seconds per meter, sequentially 1.6 seconds
+        assert elapsed < 1.2
+
+    def test_unanswered_node_reported(self, meters, tmpdir):
+        tmpdir.mkdir("usbtmc9")
+
+        found = discovery.discover(backend="usbtmc", pattern=meters)
+        assert len(found) == 5
+        assert "error" in found[-1]
+        assert discovery.find(found, "P2000004")["address"] \
+            == found[3]["address"]
+
+    def test_resolve_serial_numbers(self, meters):
+        specs = [discovery.parse_spec("ThorlabsMeter:serial_number=P2000003"),
+                 discovery.parse_spec("ThorlabsMeter:serial_number=P2000001"),
+                 discovery.parse_spec("ThorlabsMeter:serial_number=P9")]
+        resolved = discovery.resolve(specs, backend="usbtmc",
+                                     pattern=meters)
+
+        assert resolved[0][1]["address"].endswith("usbtmc2")
+        assert resolved[0][1]["backend"] == "usbtmc"
+        assert resolved[1][1]["address"].endswith("usbtmc0")
+        assert "address" not in resolved[2][1]
+        assert "address" not in specs[0][1]
+
+
+@pytest.mark.skipif(pytest.config.getoption("--appveyor"),
+                    reason="need --appveyor option to disable tests")
+class TestVisaDiscovery:
+
+    visa_library = "tests/pm100_sim.yaml@sim"
+
+    def test_identify_simulated_meters(self):
+        pytest.importorskip("pyvisa_sim")
+        found = discovery.discover(backend="visa",
+                                   visa_library=self.visa_library)
+
+        serials = sorted([meter["serial_number"] for meter in found])
+        assert serials == ["P2000001", "P2000002"]
+        meter = discovery.find(found, "P2000001")
+        assert meter["sensor"] == "S121C 1234567"
+        assert meter["address"] == "USB0::0x1313::0x8072::P2000001::INSTR"
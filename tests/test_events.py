@@ -0,0 +1,114 @@
+""" Performance events travel from any process through the log queue into
+their own json lines file, and not into the text log.
+"""
+
+import os
+import time
+import json
+import logging
+import multiprocessing
+import pytest
+
+from fastpm100 import applog, events, wrapper
+
+
+def delete_events_file():
+    if os.path.exists(events.get_location()):
+        os.remove(events.get_location())
+
+
+@pytest.mark.skipif(pytest.config.getoption("--appveyor"),
+                    reason="need --appveyor option to disable tests")
+class TestEvents:
+
+    def test_events_written_to_own_file(self):
+        assert applog.delete_log_file_if_exists() == True
+        delete_events_file()
+
+        main_logger = applog.MainLogger(console=False)
+        events.emit("parent_rate", rate=10.5)
+
+        sub_proc = multiprocessing.Process(target=self.worker_process,
+                                           args=(main_logger.log_queue,))
+        sub_proc.start()
+        sub_proc.join()
+
+        main_logger.close()
+        applog.explicit_log_close()
+
+        found = dict([(event["name"], event) for event in events.read()])
+        assert sorted(found.keys()) == ["child_gap", "parent_rate"]
+        assert found["parent_rate"]["values"] == {"rate": 10.5}
+        assert found["parent_rate"]["process"] == "MainProcess"
+        assert found["child_gap"]["values"] == {"max_gap_ms": 2.5}
+
+        log_text = applog.get_text_from_log()
+        assert "parent_rate" not in log_text
+        assert "child_gap" not in log_text
+
+    def test_events_recorded_above_log_level(self):
+        delete_events_file()
+
+        main_logger = applog.MainLogger(level=logging.WARNING, console=False)
+        events.emit("filtered_rate", rate=1)
+        main_logger.close()
+        applog.explicit_log_close()
+
+        assert len(list(events.read(names=["filtered_rate"]))) == 1
+
+    def test_acquisition_rates_and_run_report(self):
+        delete_events_file()
+
+        main_logger = applog.MainLogger(console=False)
+        sub_proc = wrapper.SubProcess(main_logger.log_queue)
+
+        # The rate is sampled when a result is delivered
+        start_time = time.time()
+        while time.time() - start_time < 2.5:
+            sub_proc.read(timeout=0.1)
+        sub_proc.close()
+        main_logger.close()
+        applog.explicit_log_close()
+
+        table = events.columns(events.read(names=["acquisition"]))
+        assert len(table["time"]) >= 1
+        assert min(table["reads_per_second"]) > 1000
+        assert table["device"][0] == "SimulatedPM100"
+
+        report = list(events.read(names=["run_report"]))[0]
+        assert report["values"]["reads"] > 0
+
+    def worker_process(self, log_queue):
+        applog.process_log_configure(log_queue)
+        events.emit("child_gap", max_gap_ms=2.5)
+
+
+class TestReader:
+
+    def write_events(self, filename):
+        with open(filename, "w") as event_file:
+            for count in range(3):
+                event = {"time": count, "process": "Process-1",
+                         "name": "acquisition",
+                         "values": {"reads_per_second": count * 10.0}}
+                event_file.write(json.dumps(event) + "\n")
+            event = {"time": 3, "process": "MainProcess", "name": "view",
+                     "values": {"render_fps": 30}}
+            event_file.write(json.dumps(event) + "\n")
+            event_file.write('{"time": 4, "process"')
+
+    def test_read_skips_partial_line_and_filters(self, tmpdir):
+        filename = str(tmpdir.join("events.jsonl"))
+        self.write_events(filename)
+
+        assert len(list(events.read(filename))) == 4
+        assert len(list(events.read(filename, names=["view"]))) == 1
+
+    def test_columns(self, tmpdir):
+        filename = str(tmpdir.join("events.jsonl"))
+        self.write_events(filename)
+
+        table = events.columns(events.read(filename))
+        assert table["time"] == [0, 1, 2, 3]
+        assert table["reads_per_second"] == [0.0, 10.0, 20.0, None]
+        assert table["render_fps"] == [None, None, None, 30]
@@ -0,0 +1,197 @@
+""" Acquire without a display, and process every sample read into recorders
+and statistics.
+"""
+
+import os
+import sys
+import time
+import subprocess
+
+import numpy
+import pytest
+
+from fastpm100 import headless, applog, wrapper
+
+import logging
+log = logging.getLogger(__name__)
+
+class TestRunningStatistics:
+
+    def test_batches_combine_into_overall_statistics(self):
+        stats = headless.RunningStatistics()
+        stats.update([[1.0, 10.0], [2.0, 20.0]])
+        stats.update([[3.0, numpy.nan]])
+
+        summary = stats.summary()
+        assert summary["count"] == [3, 2]
+        assert summary["mean"] == [2.0, 15.0]
+        assert summary["min"] == [1.0, 10.0]
+        assert summary["max"] == [3.0, 20.0]
+
+    def test_empty_statistics(self):
+        stats = headless.RunningStatistics()
+        stats.update([[numpy.nan]])
+        assert stats.summary()["count"] == []
+
+class TestCSVRecorder:
+
+    def test_rows_are_timestamp_then_values(self, tmpdir):
+        filename = str(tmpdir.join("record.csv"))
+        recorder = headless.CSVRecorder(filename)
+        recorder.write(numpy.array([1.0, 2.0]),
+                       numpy.array([[3.0, 4.0], [5.0, 6.0]]))
+        recorder.close()
+
+        rows = numpy.loadtxt(filename, delimiter=",")
+        assert rows.tolist() == [[1.0, 3.0, 4.0], [2.0, 5.0, 6.0]]
+        assert recorder.rows == 2
+
+class TestHeadless:
+
+    def test_no_qt_import(self):
+        code = "import sys; import fastpm100.headless;" \
+               " sys.exit('PySide' in sys.modules" \
+               " or 'pyqtgraph' in sys.modules)"
+        assert subprocess.call([sys.executable, "-c", code]) == 0
+
+    @pytest.mark.skipif(pytest.config.getoption("--appveyor"),
+                        reason="need --appveyor option to disable tests")
+    def test_batch_mode_delivers_every_sample(self, request):
+        assert applog.delete_log_file_if_exists() == True
+
+        main_logger = applog.MainLogger()
+        sub_proc = wrapper.SubProcess(main_logger.log_queue, batch_size=1000)
+
+        def close_sub_proc():
+            sub_proc.close()
+            main_logger.close()
+            applog.explicit_log_close()
+        request.addfinalizer(close_sub_proc)
+
+        batches = []
+        start_time = time.time()
+        while time.time() - start_time < 1.0:
+            result = sub_proc.read()
+            if result is not None:
+                batches.append(result)
+
+        values = numpy.concatenate([batch[1][1] for batch in batches])
+        assert len(values) >= 1000
+        assert values.shape[1] == 1
+        assert (numpy.diff(values[:, 0]) > 0).all()
+
+        # The read count of each batch accounts for every sample in it
+        assert batches[-1][2]["dropped"] == 0
+        assert batches[-1][0] == len(values)
+
+    @pytest.mark.skipif(pytest.config.getoption("--appveyor"),
+                        reason="need --appveyor option to disable tests")
+    def test_full_queue_drops_are_counted(self, request):
+        assert applog.delete_log_file_if_exists() == True
+
+        main_logger = applog.MainLogger()
+        sub_proc = wrapper.SubProcess(main_logger.log_queue, batch_size=10,
+                                      queue_size=2)
+
+        def close_sub_proc():
+            sub_proc.close()
+            main_logger.close()
+            applog.explicit_log_close()
+        request.addfinalizer(close_sub_proc)
+
+        time.sleep(1.0)
+        first = sub_proc.read()
+        second = sub_proc.read()
+        time.sleep(0.1)
+        latest = sub_proc.read()
+        assert first is not None and second is not None
+        assert latest[2]["dropped"] > 0
+
+    @pytest.mark.skipif(pytest.config.getoption("--appveyor"),
+                        reason="need --appveyor option to disable tests")
+    def test_acquisition_records_and_summarizes(self, request, tmpdir):
+        assert applog.delete_log_file_if_exists() == True
+
+        main_logger = applog.MainLogger()
+        acquisition = headless.HeadlessAcquisition(
+            main_logger.log_queue,
+            device_names=["SimulatedPM100", "SimulatedLaserPM100"],
+            device_kwargs={"SimulatedPM100": {"sleep_factor": 0.0001}},
+            record_directory=str(tmpdir), summary_interval=0.5)
+
+        def close_acquisition():
+            acquisition.close()
+            main_logger.close()
+            applog.explicit_log_close()
+        request.addfinalizer(close_acquisition)
+
+        acquisition.run(duration=1.5)
+        summaries = acquisition.summary()
+
+        assert [entry["device"] for entry in summaries] \
+            == ["SimulatedPM100", "SimulatedLaserPM100"]
+        for entry in summaries:
+            assert entry["samples"] >= 1000
+            assert entry["count"][0] == entry["samples"]
+
+        acquisition.poll()
+        for source in acquisition.sources:
+            source["recorder"].csv_file.flush()
+            rows = numpy.loadtxt(source["recorder"].filename, delimiter=",")
+            assert len(rows) == source["samples"]
+
+    @pytest.mark.skipif(pytest.config.getoption("--appveyor"),
+                        reason="need --appveyor option to disable tests")
+    def test_close_records_every_delivered_sample(self, request, tmpdir):
+        assert applog.delete_log_file_if_exists() == True
+
+        main_logger = applog.MainLogger()
+        acquisition = headless.HeadlessAcquisition(
+            main_logger.log_queue,
+            device_kwargs={"SimulatedPM100": {"sleep_factor": 0.0001}},
+            record_directory=str(tmpdir), batch_size=100000)
+
+        def close_logger():
+            main_logger.close()
+            applog.explicit_log_close()
+        request.addfinalizer(close_logger)
+
+        acquisition.run(duration=0.5)
+        acquisition.close()
+
+        source = acquisition.sources[0]
+        report = source["device"].report
+        assert report["dropped"] == 0
+        assert source["samples"] == report["delivered"] > 0
+        rows = numpy.loadtxt(source["recorder"].filename, delimiter=",")
+        assert len(rows) == source["samples"]
+        assert source["statistics"].summary()["count"][0] \
+            == source["samples"]
+
+    @pytest.mark.skipif(pytest.config.getoption("--appveyor"),
+                        reason="need --appveyor option to disable tests")
+    def test_device_specs_with_options(self, request, tmpdir):
+        assert applog.delete_log_file_if_exists() == True
+
+        main_logger = applog.MainLogger()
+        acquisition = headless.HeadlessAcquisition(
+            main_logger.log_queue,
+            device_names=["SimulatedLaserPM100:seed=1,sample_rate=1000",
+                          "SimulatedLaserPM100:seed=2,sample_rate=2000"],
+            record_directory=str(tmpdir), summary_interval=0.5)
+
+        def close_acquisition():
+            acquisition.close()
+            main_logger.close()
+            applog.explicit_log_close()
+        request.addfinalizer(close_acquisition)
+
+        acquisition.run(duration=1.5)
+        summaries = acquisition.summary()
+
+        assert [entry["device"] for entry in summaries] \
+            == ["SimulatedLaserPM100:seed=1,sample_rate=1000",
+                "SimulatedLaserPM100:seed=2,sample_rate=2000"]
+        assert summaries[1]["samples"] > summaries[0]["samples"] * 1.5
+        assert sorted(os.listdir(str(tmpdir))) \
+            == ["0_SimulatedLaserPM100.csv", "1_SimulatedLaserPM100.csv"]
@@ -0,0 +1,169 @@
+""" Shared dashboard history: rolling windows, interval averages, csv preload
+and decimation for drawing.
+"""
+
+import numpy
+import pytest
+
+from fastpm100 import history
+
+import logging
+log = logging.getLogger(__name__)
+
+NAN = float("nan")
+
+def reading(value):
+    return [value] * len(history.CHANNELS)
+
+@pytest.mark.skipif(pytest.config.getoption("--appveyor"),
+                    reason="need --appveyor option to disable tests")
+class TestRingHistory:
+
+    def test_latest_in_time_order_after_wrap(self):
+        ring = history.RingHistory(size=4, channels=2)
+        assert ring.latest().shape == (2, 0)
+
+        for value in range(6):
+            ring.append([value, -value])
+
+        assert len(ring) == 4
+        assert ring.latest()[0].tolist() == [2, 3, 4, 5]
+        assert ring.latest()[1].tolist() == [-2, -3, -4, -5]
+        assert ring.latest(size=2)[0].tolist() == [4, 5]
+
+    def test_extend_keeps_the_latest(self):
+        ring = history.RingHistory(size=4, channels=1)
+        ring.append([0])
+        ring.extend(numpy.array([[1, 2, 3]]))
+        assert ring.latest()[0].tolist() == [0, 1, 2, 3]
+
+        ring.extend(numpy.array([[4, 5, 6, 7, 8, 9]]))
+        assert ring.latest()[0].tolist() == [6, 7, 8, 9]
+
+@pytest.mark.skipif(pytest.config.getoption("--appveyor"),
+                    reason="need --appveyor option to disable tests")
+class TestHistoryStore:
+
+    def store(self, texts):
+        store = history.HistoryStore([history.parse_view(text)
+                                      for text in texts])
+        store.start(0.0)
+        return store
+
+    def test_one_level_per_interval_sized_for_largest_view(self):
+        store = self.store(["3000,0", "100,1000", "500,1000", "50,60000"])
+        assert [(level.interval, level.history.size)
+                for level in store.levels] \
+            == [(0, 3000), (1000, 500), (60000, 50)]
+
+        # The minute level is fed the second bins, not every read
+        assert store.fed == store.levels[:2]
+        assert store.levels[1].parents == [store.levels[2]]
+
+    def test_realtime_level_keeps_every_read(self):
+        store = self.store(["3,0"])
+        for value in range(5):
+            assert store.add(reading(value)) == True
+            assert store.update(now=0.0) == []
+        assert store.latest(0)[2].tolist() == [2, 3, 4]
+
+    def test_interval_averages_skip_nan(self):
+        store = self.store(["10,1000"])
+        assert store.add(reading(1.0)) == False
+        store.add(reading(3.0))
+        store.add(reading(NAN))
+        assert store.update(now=0.5) == []
+        assert store.update(now=1.0) == [1000]
+        assert store.latest(1000)[0].tolist() == [2.0]
+
+        # A bin without readings is a gap in the line
+        assert store.update(now=2.0) == [1000]
+        assert numpy.isnan(store.latest(1000)[0][-1])
+
+    def test_coarse_level_averages_every_read_of_its_bins(self):
+        store = self.store(["10,1000", "10,3000"])
+        for second in range(6):
+            for count in range(second + 1):
+                store.add(reading(float(second)))
+            store.update(now=second + 1.0)
+
+        assert store.latest(1000)[0].tolist() == [0, 1, 2, 3, 4, 5]
+        # Weighted by the reads, not the mean of the bin means
+        assert store.latest(3000)[0].tolist() \
+            == pytest.approx([8.0 / 6, 62.0 / 15])
+
+    def test_add_rows_of_a_batch(self):
+        store = self.store(["3,0", "10,1000"])
+        rows = numpy.array([reading(1.0), reading(NAN), reading(3.0),
+                            reading(5.0)])
+        assert store.add_rows(rows[:0]) == False
+        assert store.add_rows(rows) == True
+
+        assert store.latest(0)[0].tolist()[1:] == [3.0, 5.0]
+        assert store.update(now=1.0) == [1000]
+        assert store.latest(1000)[:, 0].tolist() == reading(3.0)
+
+    def test_stall_closes_a_single_bin(self):
+        store = self.store(["10,1000"])
+        store.add(reading(1.0))
+        assert store.update(now=3.5) == [1000]
+        assert store.update(now=3.9) == []
+        store.add(reading(2.0))
+        assert store.update(now=4.0) == [1000]
+        assert store.latest(1000)[0].tolist() == [1.0, 2.0]
+
+    def test_preload_csv_once_for_every_level(self):
+        block = history.load_csv("tests/combined_log.csv")
+        assert block.shape == (len(history.CHANNELS), 8998)
+
+        store = self.store(["3000,0", "8640,10000", "144000,60000"])
+        store.preload(block, interval=10000)
+
+        assert len(store.levels[0].history) == 0
+        assert store.latest(10000).tolist() == block[:, -8640:].tolist()
+
+        minutes = store.latest(60000)
+        assert minutes.shape == (len(history.CHANNELS), 8998 // 6)
+        assert minutes[:, -1] == pytest.approx(block[:, -6:].mean(axis=1))
+
+    def test_load_min_columns(self):
+        block = history.load_csv("tests/combined_log.csv", name="Min")
+        assert block[:, 0].tolist() == pytest.approx(
+            [31.7498613963, 29.6610617573, 68.2415068, 25.75, 31.0, 3267.0])
+
+@pytest.mark.skipif(pytest.config.getoption("--appveyor"),
+                    reason="need --appveyor option to disable tests")
+class TestDecimate:
+
+    def test_short_histories_are_unchanged(self):
+        block = numpy.arange(10.0).reshape(1, 10)
+        positions, values = history.decimate(block, 100)
+        assert positions.tolist() == range(10)
+        assert values is block
+
+    def test_keeps_peaks_and_gaps(self):
+        block = numpy.zeros((2, 1000))
+        block[0, 123] = 5.0
+        block[0, 456] = -5.0
+        block[1, 500:600] = NAN
+
+        positions, values = history.decimate(block, 100)
+        assert values.shape == (2, 100)
+        assert positions.shape == (100,)
+        assert positions[-1] == 999
+        assert values[0].max() == 5.0
+        assert values[0].min() == -5.0
+        assert numpy.isnan(values[1]).sum() == 10
+
+    def test_parse_view(self):
+        view = history.parse_view("8640,10000,0,385,1920,333")
+        assert (view.size, view.interval) == (8640, 10000)
+        assert view.geometry == [0, 385, 1920, 333]
+        assert view.max_points == 3840
+
+        assert history.parse_view("3000,0").geometry == [0, 0, 1920, 333]
+        assert history.parse_view("3000,0").source is None
+        view = history.parse_view("3000,0,0,25,1920,333@lab=x")
+        assert (view.source, view.geometry) == ("lab=x", [0, 25, 1920, 333])
+        with pytest.raises(ValueError):
+            history.parse_view("3000,0,1")
@@ -0,0 +1,283 @@
+""" Ingest from several zmq publishers, serial ports and followed csv files
+in a single engine, on a thread and on a process.
+"""
+
+import os
+import time
+import platform
+import threading
+
+import zmq
+import numpy
+import pytest
+
+from fastpm100 import applog, ingest, zmqstream
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class Publisher(object):
+    """ Publish numbered text messages of three values from a thread.
+    """
+    def __init__(self, port, offset=0.0, rate=500):
+        self.context = zmq.Context()
+        self.socket = self.context.socket(zmq.PUB)
+        self.socket.bind("tcp://127.0.0.1:%s" % port)
+        self.offset = offset
+        self.rate = rate
+        self.running = True
+        self.thread = threading.Thread(target=self.run)
+        self.thread.start()
+
+    def run(self):
+        sequence = 0
+        while self.running:
+            values = [self.offset + 1, self.offset + 2, self.offset + 3]
+            self.socket.send(zmqstream.encode_text("temperatures_and_power",
+                                                   values, sequence))
+            sequence += 1
+            time.sleep(1.0 / self.rate)
+
+    def close(self):
+        self.running = False
+        self.thread.join()
+        self.socket.close(linger=0)
+        self.context.term()
+
+
+@pytest.mark.skipif(pytest.config.getoption("--appveyor"),
+                    reason="need --appveyor option to disable tests")
+class TestSources:
+
+    def test_csv_parser_skips_columns(self):
+        parser = ingest.CSVParser(skip_columns=1)
+        assert parser("2016-03-14 17:05:38,1.5,2.5") == [1.5, 2.5]
+        with pytest.raises(ValueError):
+            parser("Timestamp,CCD Min,CCD Max")
+
+    def test_lines_split_across_reads(self):
+        source = ingest.Source("test", ingest.CSVParser())
+        source.parse_lines("1,2\n3,", 10.0)
+        source.parse_lines("4\nheader,line\n5,6,7\n", 11.0)
+
+        timestamps, values = source.take_batch()
+        assert timestamps.tolist() == [10.0, 11.0]
+        assert values.tolist() == [[1, 2], [3, 4]]
+        assert source.messages == 4
+        assert source.errors == 2
+        assert source.take_batch() is None
+
+    def test_zmq_batch_messages_keep_timestamps(self):
+        source = ingest.ZMQSource("test", "tcp://127.0.0.1:1")
+        message = zmqstream.encode_batch("fastpm100", 7, [1.0, 2.0],
+                                         [[10.0], [20.0]])
+        source.parse(message, 99.0)
+        source.parse(zmqstream.encode_text("fastpm100", [30.0], 8), 99.0)
+
+        timestamps, values = source.take_batch()
+        assert timestamps.tolist() == [1.0, 2.0, 99.0]
+        assert values[:, 0].tolist() == [10.0, 20.0, 30.0]
+        assert source.sequence.stats()["received"] == 2
+
+    def test_batch_message_of_another_width_adds_no_rows(self):
+        source = ingest.ZMQSource("test", "tcp://127.0.0.1:1")
+        source.parse(zmqstream.encode_text("fastpm100", [1.0, 2.0], 1), 9.0)
+        message = zmqstream.encode_batch("fastpm100", 2, [10.0, 11.0],
+                                         [[3.0], [4.0]])
+        source.parse(message, 12.0)
+
+        assert source.errors == 1
+        timestamps, values = source.take_batch()
+        assert timestamps.tolist() == [9.0]
+        assert values.tolist() == [[1.0, 2.0]]
+
+    def test_duplicate_names_rejected(self):
+        sources = [ingest.CSVTailSource("same", "a.csv"),
+                   ingest.CSVTailSource("same", "b.csv")]
+        with pytest.raises(ValueError):
+            ingest.IngestEngine(None, sources)
+
+
+@pytest.mark.skipif(pytest.config.getoption("--appveyor"),
+                    reason="need --appveyor option to disable tests")
+class TestIngestEngine:
+
+    @pytest.fixture(scope="function")
+    def log_queue(self, request):
+        assert applog.delete_log_file_if_exists() == True
+        main_logger = applog.MainLogger()
+
+        def close_logger():
+            main_logger.close()
+            applog.explicit_log_close()
+        request.addfinalizer(close_logger)
+        return main_logger.log_queue
+
+    def collect(self, engine, names, samples=10, timeout=5.0):
+        """ Read until every named source delivered at least the number of
+        samples, and return the values of each concatenated.
+        """
+        collected = dict([(name, []) for name in names])
+        start_time = time.time()
+        while time.time() - start_time < timeout:
+            result = engine.read(timeout=0.1)
+            if result is None:
+                continue
+
+            for name, (timestamps, values) in result[1].items():
+                assert len(timestamps) == values.shape[0]
+                collected[name].append(values)
+
+            counts = [sum([len(values) for values in collected[name]])
+                      for name in names]
+            if min(counts) >= samples:
+                return dict([(name, numpy.concatenate(collected[name]))
+                             for name in names])
+
+        raise NameError("Not enough samples from %s" % names)
+
+    def test_many_zmq_sources_in_one_thread(self, request, log_queue):
+        publishers = [Publisher(6620 + index, offset=10.0 * index)
+                      for index in range(3)]
+        sources = [ingest.ZMQSource("board%s" % index,
+                                    "tcp://127.0.0.1:%s" % (6620 + index))
+                   for index in range(3)]
+        engine = ingest.IngestEngine(log_queue, sources, backend="thread")
+
+        def close_all():
+            engine.close()
+            for publisher in publishers:
+                publisher.close()
+        request.addfinalizer(close_all)
+
+        values = self.collect(engine, ["board0", "board1", "board2"], 50)
+        assert numpy.all(values["board0"][:, 0] == 1.0)
+        assert numpy.all(values["board2"][:, 2] == 23.0)
+
+        engine.close()
+        report = engine.report["sources"]
+        assert report["board1"]["samples"] >= 50
+        assert report["board1"]["sequence"]["received"] >= 50
+        assert report["board1"]["errors"] == 0
+
+    def test_state_from_source_connections(self, request, log_queue,
+                                           tmpdir):
+        filename = str(tmpdir.join("later.csv"))
+        engine = ingest.IngestEngine(log_queue,
+                                     [ingest.CSVTailSource("later", filename)],
+                                     backend="thread", max_backoff=0.1)
+        request.addfinalizer(engine.close)
+        assert engine.device_name == "IngestEngine"
+
+        with open(filename, "w") as csv_file:
+            csv_file.write("1,2\n")
+        start_time = time.time()
+        while engine.poll_state() != "running" or not engine.source_stats:
+            engine.read(timeout=0.1)
+            assert time.time() - start_time < 5.0
+
+        engine.close()
+        assert engine.poll_state() == "stopped"
+
+    def test_csv_tail_follows_and_restarts(self, request, log_queue, tmpdir):
+        filename = str(tmpdir.join("combined.csv"))
+        with open(filename, "w") as csv_file:
+            csv_file.write("Timestamp,Power\n0,99.0\n")
+
+        engine = ingest.IngestEngine(log_queue,
+                                     [ingest.CSVTailSource("log", filename)],
+                                     backend="thread")
+        request.addfinalizer(engine.close)
+        time.sleep(0.2)
+
+        with open(filename, "a") as csv_file:
+            for row in range(10):
+                csv_file.write("%s,%s\n" % (row, row + 0.5))
+        values = self.collect(engine, ["log"], 10)["log"]
+        assert values[:, 1].tolist() == [row + 0.5 for row in range(10)]
+
+        with open(filename, "w") as csv_file:
+            csv_file.write("0,1.0\n")
+        values = self.collect(engine, ["log"], 1)["log"]
+        assert values[:, 1].tolist() == [1.0]
+
+    def test_missing_file_retried(self, request, log_queue, tmpdir):
+        filename = str(tmpdir.join("later.csv"))
+        source = ingest.CSVTailSource("later", filename)
+        engine = ingest.IngestEngine(log_queue, [source], backend="thread",
+                                     max_backoff=0.2)
+        request.addfinalizer(engine.close)
+        time.sleep(0.5)
+
+        with open(filename, "w") as csv_file:
+            csv_file.write("1.0,2.0\n")
+        values = self.collect(engine, ["later"], 1)["later"]
+        assert values.tolist() == [[1.0, 2.0]]
+        assert source.reconnects >= 1
+
+    @pytest.mark.skipif("Linux" not in platform.platform(),
+                        reason="pseudo terminals are only tested on Linux")
+    def test_serial_port_polled(self, request, log_queue):
+        master, slave = os.openpty()
+        port = os.ttyname(slave)
+        engine = ingest.IngestEngine(log_queue,
+                                     [ingest.SerialSource("serial", port)],
+                                     backend="thread")
+
+        def close_all():
+            engine.close()
+            os.close(master)
+            os.close(slave)
+        request.addfinalizer(close_all)
+        time.sleep(0.2)
+
+        os.write(master, "25.5,31.0,0.2\n25.6,")
+        os.write(master, "31.1,0.3\n")
+        values = self.collect(engine, ["serial"], 2)["serial"]
+        assert values.tolist() == [[25.5, 31.0, 0.2], [25.6, 31.1, 0.3]]
+
+    def test_rows_received_up_to_close_are_read(self, request, log_queue,
+                                                tmpdir):
+        # More rows than the pipe of the results queue holds
+        filename = str(tmpdir.join("log.csv"))
+        with open(filename, "w") as csv_file:
+            for row in range(50000):
+                csv_file.write("%s,%s\n" % (row, row + 0.5))
+
+        source = ingest.CSVTailSource("log", filename, from_start=True)
+        engine = ingest.IngestEngine(log_queue, [source],
+                                     batch_interval=10.0)
+        request.addfinalizer(engine.close)
+        time.sleep(0.5)
+        assert engine.read() is None
+
+        engine.close()
+        assert engine.proc.exitcode == 0
+        values = self.collect(engine, ["log"], 50000)["log"]
+        assert values[:, 0].tolist() == range(50000)
+        assert engine.read() is None
+
+    def test_process_backend(self, request, log_queue, tmpdir):
+        publisher = Publisher(6630)
+        filename = str(tmpdir.join("combined.csv"))
+        open(filename, "w").close()
+
+        sources = [ingest.ZMQSource("board", "tcp://127.0.0.1:6630"),
+                   ingest.CSVTailSource("log", filename)]
+        engine = ingest.IngestEngine(log_queue, sources)
+
+        def close_all():
+            engine.close()
+            publisher.close()
+        request.addfinalizer(close_all)
+        time.sleep(0.5)
+
+        with open(filename, "a") as csv_file:
+            csv_file.write("1,2\n3,4\n")
+        values = self.collect(engine, ["board", "log"], 2)
+        assert values["log"].tolist() == [[1, 2], [3, 4]]
+        assert engine.proc.pid != os.getpid()
+
+        result = engine.read(timeout=1.0)
+        assert result[2]["sources"]["board"]["connected"]
@@ -0,0 +1,78 @@
+""" Run the zmq load generator against a local subscriber and verify the
+achieved rate and the deterministic signal.
+"""
+
+import zmq
+import time
+import threading
+import pytest
+
+from fastpm100 import loadgen, zmqstream
+
+import logging
+log = logging.getLogger(__name__)
+
+
+@pytest.mark.skipif(pytest.config.getoption("--appveyor"),
+                    reason="need --appveyor option to disable tests")
+class TestLoadGenerator:
+
+    def publish_and_receive(self, port, **kwargs):
+        """ Publish for one second from a generator with the specified
+        options, return the summary and every message received.
+        """
+        generator = loadgen.LoadGenerator(port=port, **kwargs)
+
+        context = zmq.Context()
+        socket = context.socket(zmq.SUB)
+        socket.setsockopt(zmq.RCVTIMEO, 500)
+        socket.connect("tcp://127.0.0.1:%s" % port)
+        socket.setsockopt(zmq.SUBSCRIBE, "temperatures_and_power")
+        time.sleep(0.5)
+
+        messages = []
+        def receive():
+            try:
+                while True:
+                    messages.append(socket.recv())
+            except zmq.Again:
+                pass
+
+        receiver = threading.Thread(target=receive)
+        receiver.start()
+
+        summary = generator.run(duration=1.0)
+        receiver.join()
+
+        generator.close()
+        socket.close()
+        context.term()
+        return summary, messages
+
+    def test_rate_and_sequence_numbers(self):
+        summary, messages = self.publish_and_receive("6551", rate=1000,
+                                                     seed=1)
+        assert summary["rate"] >= 900
+        assert summary["rate"] <= 1100
+        assert len(messages) == summary["sent"]
+
+        values, first, send_time = zmqstream.decode(messages[0])
+        values, last, send_time = zmqstream.decode(messages[-1])
+        assert len(values) == 6
+        assert last - first == len(messages) - 1
+
+    def test_binary_channels(self):
+        summary, messages = self.publish_and_receive("6552", rate=1000,
+                                                     channels=12,
+                                                     binary=True)
+        values, sequence, send_time = zmqstream.decode(messages[-1])
+        assert len(values) == 12
+
+    def test_seeded_signal_is_repeatable(self):
+        first = loadgen.LoadGenerator(port="6553", seed=5)
+        second = loadgen.LoadGenerator(port="6554", seed=5)
+
+        assert (first.next_block() == second.next_block()).all()
+
+        first.close()
+        second.close()
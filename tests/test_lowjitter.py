@@ -0,0 +1,71 @@
+""" Low jitter settings for the acquisition process: cpu pinning, priority
+and garbage collection at safe points.
+"""
+
+import gc
+import time
+import platform
+import pytest
+
+from fastpm100 import applog, lowjitter, wrapper
+
+linux_only = pytest.mark.skipif("Linux" not in platform.platform(),
+                                reason="cpu pinning is Linux only")
+
+
+@pytest.mark.skipif(pytest.config.getoption("--appveyor"),
+                    reason="need --appveyor option to disable tests")
+class TestLowJitter:
+
+    @linux_only
+    def test_affinity_round_trip(self):
+        cpus = lowjitter.get_affinity()
+        assert len(cpus) >= 1
+
+        lowjitter.set_affinity(cpus[:1])
+        try:
+            assert lowjitter.get_affinity() == cpus[:1]
+        finally:
+            lowjitter.set_affinity(cpus)
+
+    def test_gc_collected_only_at_safe_points(self):
+        settings = lowjitter.LowJitter(niceness=None, full_interval=2)
+        applied = settings.apply()
+        try:
+            assert applied["gc_disabled"] == True
+            assert not gc.isenabled()
+
+            settings.safe_point()
+            settings.safe_point()
+            report = settings.report()
+            assert report["collections"] == 2
+            assert report["max_collect_ms"] >= 0
+        finally:
+            settings.restore()
+
+        assert gc.isenabled()
+
+    @linux_only
+    def test_acquisition_report_includes_jitter(self, request):
+        main_logger = applog.MainLogger(console=False)
+
+        def close_logger():
+            main_logger.close()
+            applog.explicit_log_close()
+        request.addfinalizer(close_logger)
+
+        cpus = lowjitter.get_affinity()[-1:]
+        settings = lowjitter.LowJitter(cpus=cpus, niceness=None)
+        sub_proc = wrapper.SubProcess(main_logger.log_queue, batch_size=1000,
+                                      low_jitter=settings)
+
+        start_time = time.time()
+        while time.time() - start_time < 1.5:
+            sub_proc.read(timeout=0.1)
+        sub_proc.close()
+
+        report = sub_proc.report
+        assert report["low_jitter"]["applied"]["cpus"] == cpus
+        assert report["low_jitter"]["collections"] >= 1
+        assert report["gap_ms"]["p50"] > 0
+        assert report["jitter_ms"] >= 0
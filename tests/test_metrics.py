@@ -0,0 +1,183 @@
+""" Collect and export latency histograms, counters and gauges.
+"""
+
+import json
+import time
+import urllib2
+
+import zmq
+import pytest
+
+from fastpm100 import metrics, wrapper, applog
+
+import logging
+log = logging.getLogger(__name__)
+
+class TestRegistry:
+
+    def test_histogram_buckets_and_quantiles(self):
+        histogram = metrics.Histogram(bounds=(1.0, 10.0, 100.0))
+        for seconds in [0.0005, 0.0005, 0.005, 0.5]:
+            histogram.observe(seconds)
+
+        snapshot = histogram.snapshot()
+        assert snapshot["count"] == 4
+        assert snapshot["buckets"] == [2, 1, 0, 1]
+        assert snapshot["max_ms"] == 500.0
+        assert snapshot["p50_ms"] == 1.0
+        assert snapshot["p99_ms"] == 500.0
+
+    def test_empty_histogram_has_no_quantiles(self):
+        assert metrics.Histogram().quantile(0.5) is None
+
+    def test_registry_snapshot(self):
+        registry = metrics.Registry()
+        registry.increment("dropped", 10)
+        registry.increment("dropped")
+        registry.set_gauge("queue_occupancy", 3)
+        registry.observe("read", 0.001)
+
+        snapshot = registry.snapshot()
+        assert snapshot["counters"] == {"dropped": 11}
+        assert snapshot["gauges"] == {"queue_occupancy": 3}
+        assert snapshot["histograms"]["read"]["count"] == 1
+
+    def test_prometheus_text(self):
+        registry = metrics.Registry()
+        registry.increment("dropped", 2)
+        registry.observe("read", 0.001)
+        text = metrics.prometheus_text({"acquisition": registry.snapshot()})
+
+        assert 'fastpm100_dropped_total{process="acquisition"} 2' in text
+        assert 'fastpm100_read_ms_bucket{process="acquisition",le="+Inf"} 1' \
+            in text
+        assert 'fastpm100_read_ms_count{process="acquisition"} 1' in text
+
+class TestRunStatistics:
+
+    def test_reads_gaps_and_exceptions(self):
+        run_stats = metrics.RunStatistics()
+        run_stats.read(0.0, 0.001)
+        run_stats.read(0.001, 0.002)
+        run_stats.read(0.5, 0.501)
+        run_stats.exception(ValueError("timeout"))
+        run_stats.delivered = 2
+        run_stats.skipped = 3
+        run_stats.dropped = 1
+
+        report = run_stats.report()
+        assert report["reads"] == 3
+        assert report["read_time_ms"]["max"] == pytest.approx(1.0)
+        assert report["max_gap_ms"] == pytest.approx(499.0)
+        assert report["exceptions"] == 1
+        assert report["last_exception"] == "ValueError: timeout"
+        assert report["delivered"] == 2
+        assert report["skipped"] == 3
+        assert report["dropped"] == 1
+
+    def test_gap_distribution_tracked_on_request(self):
+        assert "gap_ms" not in metrics.RunStatistics().report()
+
+        run_stats = metrics.RunStatistics(track_gaps=True)
+        for count in range(100):
+            run_stats.read(count * 0.0009, count * 0.0009)
+        run_stats.read(0.2, 0.2)
+
+        report = run_stats.report()
+        assert report["gap_ms"]["p50"] == pytest.approx(0.9, rel=0.02)
+        assert report["gap_ms"]["max"] > 100.0
+        assert report["jitter_ms"] > 0
+
+    def test_jitter_resolves_small_changes(self):
+        jitters = []
+        for late in (1.2, 1.3):
+            run_stats = metrics.RunStatistics(track_gaps=True)
+            now = 0.0
+            for count in range(2000):
+                now += late / 1000.0 if count % 100 == 0 else 0.001
+                run_stats.read(now, now)
+            jitters.append(run_stats.report()["jitter_ms"])
+
+        assert jitters[0] == pytest.approx(0.2, abs=0.03)
+        assert jitters[1] == pytest.approx(0.3, abs=0.03)
+
+    def test_interval_reads_and_gap_reset(self):
+        run_stats = metrics.RunStatistics()
+        run_stats.read(0.0, 0.001)
+        run_stats.read(0.1, 0.101)
+        assert run_stats.interval() == (2, pytest.approx(100.0))
+
+        run_stats.read(0.102, 0.103)
+        assert run_stats.interval() == (1, pytest.approx(2.0))
+        assert run_stats.report()["max_gap_ms"] == pytest.approx(100.0)
+
+class TestExporter:
+
+    def snapshots(self):
+        registry = metrics.Registry()
+        registry.increment("skipped", 5)
+        return {"view": registry.snapshot()}
+
+    def test_json_lines_file(self, tmpdir):
+        filename = str(tmpdir.join("metrics.jsonl"))
+        exporter = metrics.MetricsExporter(filename=filename)
+        exporter.export(self.snapshots())
+        exporter.export(self.snapshots())
+        exporter.close()
+
+        lines = open(filename).readlines()
+        assert len(lines) == 2
+        record = json.loads(lines[0])
+        assert record["processes"]["view"]["counters"]["skipped"] == 5
+
+    @pytest.mark.skipif(pytest.config.getoption("--appveyor"),
+                        reason="need --appveyor option to disable tests")
+    def test_zmq_and_http_endpoints(self):
+        exporter = metrics.MetricsExporter(
+            publish_address="tcp://127.0.0.1:6581", http_port=6582)
+        try:
+            context = zmq.Context()
+            socket = context.socket(zmq.SUB)
+            socket.setsockopt(zmq.SUBSCRIBE, "metrics")
+            socket.setsockopt(zmq.RCVTIMEO, 1000)
+            socket.connect("tcp://127.0.0.1:6581")
+            time.sleep(0.5)
+
+            exporter.export(self.snapshots())
+            topic, payload = socket.recv().split(" ", 1)
+            assert json.loads(payload)["processes"]["view"]["counters"] \
+                == {"skipped": 5}
+            socket.close()
+            context.term()
+
+            text = urllib2.urlopen("http://127.0.0.1:6582/metrics").read()
+            assert 'fastpm100_skipped_total{process="view"} 5' in text
+        finally:
+            exporter.close()
+
+@pytest.mark.skipif(pytest.config.getoption("--appveyor"),
+                    reason="need --appveyor option to disable tests")
+class TestAcquisitionMetrics:
+
+    def test_sub_process_reports_read_latency(self, request):
+        assert applog.delete_log_file_if_exists() == True
+
+        main_logger = applog.MainLogger()
+        sub_proc = wrapper.SubProcess(main_logger.log_queue,
+                                      collect_metrics=True)
+
+        def close_sub_proc():
+            sub_proc.close()
+            main_logger.close()
+            applog.explicit_log_close()
+        request.addfinalizer(close_sub_proc)
+
+        time.sleep(1.5)
+        sub_proc.read(timeout=1.0)
+        result = sub_proc.read(timeout=1.0)
+
+        snapshot = result[2]["metrics"]
+        assert snapshot["histograms"]["read"]["count"] >= 1000
+        assert snapshot["counters"]["skipped"] >= 1000
+        assert snapshot["gauges"]["memory"] > 0
+        assert result[2]["read_time"] <= time.time()
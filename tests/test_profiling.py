@@ -0,0 +1,79 @@
+""" Profile each process when enabled, and call straight through when not.
+"""
+
+import os
+import glob
+import time
+import pstats
+
+import pytest
+
+from fastpm100 import profiling, wrapper, applog
+
+import logging
+log = logging.getLogger(__name__)
+
+def busy(count):
+    return sum(range(count))
+
+class TestProfiler:
+
+    @pytest.fixture(autouse=True)
+    def environment(self, request):
+        """ Restore the profile directory variable after each test, as
+        profiling.enable sets it for every process started after it.
+        """
+        previous = os.environ.pop(profiling.ENVIRONMENT, None)
+
+        def restore():
+            os.environ.pop(profiling.ENVIRONMENT, None)
+            if previous is not None:
+                os.environ[profiling.ENVIRONMENT] = previous
+        request.addfinalizer(restore)
+
+    def test_disabled_by_default(self):
+        profiler = profiling.Profiler("view")
+        assert not profiler.enabled
+        assert profiler.runcall(busy, 10) == 45
+        assert profiler.dump() is None
+
+    def test_accumulates_calls_into_stats_file(self, tmpdir):
+        profiling.enable(str(tmpdir))
+        profiler = profiling.Profiler("view")
+        assert profiler.enabled
+
+        for count in range(3):
+            profiler.runcall(busy, 100)
+
+        filename = profiler.dump()
+        assert filename == str(tmpdir.join("view_%s.prof" % os.getpid()))
+
+        stats = pstats.Stats(filename)
+        calls = [value[1] for key, value in stats.stats.items()
+                 if key[2] == "busy"]
+        assert calls == [3]
+
+    def test_profiled_decorator(self, tmpdir):
+        profiling.enable(str(tmpdir))
+        assert profiling.profiled("worker")(busy)(10) == 45
+        assert len(tmpdir.listdir()) == 1
+
+    @pytest.mark.skipif(pytest.config.getoption("--appveyor"),
+                        reason="need --appveyor option to disable tests")
+    def test_every_process_writes_stats_on_exit(self, tmpdir):
+        assert applog.delete_log_file_if_exists() == True
+        profiling.enable(str(tmpdir))
+
+        main_logger = applog.MainLogger()
+        sub_proc = wrapper.SubProcess(main_logger.log_queue)
+        time.sleep(1.0)
+
+        sub_proc.close()
+        # Exited on its own after writing the stats, not terminated
+        assert sub_proc.proc.exitcode == 0
+        main_logger.close()
+        applog.explicit_log_close()
+
+        names = sorted([os.path.basename(name).split("_")[0]
+                        for name in glob.glob(str(tmpdir.join("*.prof")))])
+        assert names == ["acquisition", "log"]
@@ -0,0 +1,76 @@
+""" Acquire through the streaming iterator api, as from a script or notebook.
+"""
+
+import time
+
+import numpy
+import pytest
+
+from fastpm100 import stream, applog
+
+import logging
+log = logging.getLogger(__name__)
+
+@pytest.mark.skipif(pytest.config.getoption("--appveyor"),
+                    reason="need --appveyor option to disable tests")
+class TestStream:
+
+    @pytest.fixture(autouse=True)
+    def log_file(self, request):
+        assert applog.delete_log_file_if_exists() == True
+        request.addfinalizer(applog.explicit_log_close)
+
+    def test_context_manager_collects_every_sample(self):
+        with stream.Stream() as power:
+            timestamps, values = power.collect(1.0)
+
+            assert power.samples == len(timestamps)
+            assert power.dropped == 0
+
+        assert power.device is None
+        assert power.main_logger is None
+
+        assert len(timestamps) >= 1000
+        assert values.shape == (len(timestamps), 1)
+        assert (numpy.diff(timestamps) >= 0).all()
+        assert (numpy.diff(values[:, 0]) > 0).all()
+
+    def test_iteration_stops_after_duration(self):
+        with stream.Stream("SimulatedLaserPM100") as power:
+            start_time = time.time()
+            batches = list(power.batches(duration=0.5))
+
+        assert time.time() - start_time < 1.5
+        assert len(batches) >= 1
+        for timestamps, values in batches:
+            assert len(timestamps) == len(values)
+
+    def test_slow_reader_drops_in_bounded_mode(self):
+        with stream.Stream(batch_size=10, queue_size=2) as power:
+            time.sleep(0.5)
+            power.collect(0.1)
+            assert power.dropped > 0
+
+    def test_slow_reader_loses_nothing_in_lossless_mode(self):
+        with stream.Stream(batch_size=10, queue_size=2,
+                           lossless=True) as power:
+            time.sleep(0.5)
+            timestamps, values = power.collect(0.5)
+
+        assert power.dropped == 0
+
+        # SimulatedPM100 increments by one step per read, any larger gap
+        # is a dropped sample
+        steps = numpy.diff(values[:, 0])
+        assert steps.max() < 1.5 * steps.min()
+
+        # Acquisition waited for the reader
+        assert timestamps[1] - timestamps[0] < 0.1
+        assert numpy.diff(timestamps).max() >= 0.4
+
+    def test_shared_log_queue_is_left_open(self):
+        main_logger = applog.MainLogger()
+        with stream.Stream(log_queue=main_logger.log_queue) as power:
+            assert power.main_logger is None
+            power.collect(0.2)
+        main_logger.close()
@@ -60,3 +60,25 @@ class TestThorlabsPM100:
         # second.
         assert delta_time <= 4.0
         assert delta_time >= 2.0
+
+    def test_settings_cached_on_host(self):
+        device = devices.ThorlabsMeter(average_count=1, auto_range=True)
+        assert device.settings["wavelength"] == 785.0
+        assert device.settings["average_count"] == 1
+        assert device.settings["auto_range"] == True
+
+        settings = device.configure(power_range=0.1)
+        assert settings["power_range"] == 0.1
+        assert settings["auto_range"] == False
+        applog.explicit_log_close()
+
+    def test_pipelined_read_looks_real(self):
+        device = devices.ThorlabsMeter(pipelined=True)
+        result = device.read()
+
+        assert result != 0
+        assert result != None
+
+        new_result = device.read()
+        assert result != new_result
+        applog.explicit_log_close()
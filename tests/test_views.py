@@ -31,6 +31,18 @@ class TestStripChart:
         assert strip_form.width() >= 900
         assert strip_form.height() >= 318
 
+    def test_form_has_stream_delivery_labels(self, strip_form, qtbot):
+        assert strip_form.ui.labelLost.text() == "0"
+        assert strip_form.ui.labelDuplicate.text() == "0"
+        assert strip_form.ui.labelOutOfOrder.text() == "0"
+
+    def test_form_shows_every_stream_label(self, strip_form, qtbot):
+        frame = strip_form.ui.frameRight
+        assert frame.height() >= frame.layout().sizeHint().height()
+
+        bottom = strip_form.ui.labelMemory.geometry().bottom()
+        assert bottom <= frame.contentsRect().bottom()
+
     def test_form_has_pyqtgraph_widget(self, strip_form, qtbot):
         assert strip_form.ui.plot.width() >= 700
         assert strip_form.ui.plot.height() >= 300
@@ -2,8 +2,10 @@
 device objects. This includes long druation reads and performance metrics.
 """
 
+import os
 import time
 import Queue
+import numpy
 import pytest
 
 from fastpm100 import wrapper, applog, devices
@@ -143,6 +145,274 @@ class TestWrapper:
         assert skip_count >= 5
         assert skip_count <= 15
 
+    def test_device_kwargs_are_passed_to_device(self, request):
+        """ The sleep factor of the simulated device regulates the rate in
+        the same way as the wrapper delay time.
+        """
+        assert applog.delete_log_file_if_exists() == True
+
+        main_logger = applog.MainLogger()
+        sub_proc = wrapper.SubProcess(main_logger.log_queue,
+                                      device_kwargs={"sleep_factor": 0.1})
+
+        def close_sub_proc():
+            sub_proc.close()
+            main_logger.close()
+            applog.explicit_log_close()
+        request.addfinalizer(close_sub_proc)
+
+        time.sleep(1.0)
+        first_result = self.read_while_none(sub_proc)
+        time.sleep(1.0)
+
+        second_result = self.read_while_none(sub_proc)
+        skip_count = second_result[0] - first_result[0]
+        assert skip_count >= 5
+        assert skip_count <= 15
+
+    def test_every_sample_is_rebroadcast(self, request):
+        """ A viewer subscribed to the published batches sees every sample
+        in order, even though the local results queue skips most of them.
+        """
+        assert applog.delete_log_file_if_exists() == True
+
+        main_logger = applog.MainLogger()
+        sub_proc = wrapper.SubProcess(main_logger.log_queue,
+                                      publish_address="tcp://127.0.0.1:6571")
+
+        def close_sub_proc():
+            sub_proc.close()
+            main_logger.close()
+            applog.explicit_log_close()
+        request.addfinalizer(close_sub_proc)
+
+        viewer = devices.RebroadcastZMQ(port="6571")
+
+        blocks = [viewer.read_block() for count in range(10)]
+        timestamps = numpy.concatenate([block[0] for block in blocks])
+        values = numpy.concatenate([block[1] for block in blocks])
+
+        assert len(timestamps) >= 1000
+        assert (numpy.diff(timestamps) >= 0).all()
+
+        # SimulatedPM100 increments on every read
+        assert (numpy.diff(values[:, 0]) > 0).all()
+        assert viewer.stats()["lost"] == 0
+
+    def test_run_report_returned_on_close(self, request):
+        assert applog.delete_log_file_if_exists() == True
+
+        main_logger = applog.MainLogger()
+        sub_proc = wrapper.SubProcess(main_logger.log_queue)
+
+        def close_logger():
+            main_logger.close()
+            applog.explicit_log_close()
+        request.addfinalizer(close_logger)
+
+        time.sleep(1.0)
+        sub_proc.read()
+        sub_proc.close()
+
+        report = sub_proc.report
+        assert report["device"] == "SimulatedPM100"
+        assert report["usage"]["cpu_time"] > 0
+        assert report["reads"] >= 1000
+        assert report["delivered"] >= 1
+        assert report["delivered"] < report["reads"]
+        assert report["delivered"] + report["skipped"] == report["reads"]
+        assert report["dropped"] == 0
+        assert report["exceptions"] == 0
+        assert report["read_time_ms"]["p50"] > 0
+        assert report["max_gap_ms"] >= report["read_time_ms"]["p50"]
+
+    def read_from_device(self, sub_proc, device_name, timeout=5.0):
+        """ Read until a result from the named device arrives.
+        """
+        start_time = time.time()
+        while time.time() - start_time < timeout:
+            result = sub_proc.read(timeout=0.1)
+            if result is not None and result[2]["device"] == device_name:
+                return result
+        raise NameError("No result from %s" % device_name)
+
+    def test_lossless_delivers_every_sample_up_to_close(self, request):
+        main_logger = applog.MainLogger()
+        sub_proc = wrapper.SubProcess(main_logger.log_queue, delay_time=0.001,
+                                      batch_size=1000, batch_interval=0.5,
+                                      lossless=True)
+
+        def close_logger():
+            main_logger.close()
+            applog.explicit_log_close()
+        request.addfinalizer(close_logger)
+
+        samples = 0
+        start_time = time.time()
+        while time.time() - start_time < 1.2:
+            result = sub_proc.read(timeout=0.1)
+            if result is not None:
+                samples += len(result[1][0])
+
+        # Close in the middle of a batch interval
+        sub_proc.close()
+        while True:
+            result = sub_proc.read()
+            if result is None:
+                break
+            samples += len(result[1][0])
+
+        report = sub_proc.report
+        assert report["dropped"] == 0
+        assert report["skipped"] == 0
+        assert report["delivered"] == report["reads"]
+        assert samples == report["reads"]
+
+    def test_switch_device_in_same_process(self, wrapper):
+        first = self.read_from_device(wrapper, "SimulatedPM100")
+        pid = wrapper.proc.pid
+
+        kwargs = {"sample_rate": 1000, "seed": 1}
+        assert wrapper.switch_device("SimulatedLaserPM100", kwargs) == True
+        switched = self.read_from_device(wrapper, "SimulatedLaserPM100")
+
+        assert wrapper.proc.pid == pid
+        assert wrapper.proc.is_alive()
+        assert switched[0] > first[0]
+
+        time.sleep(0.5) # let the log listener write
+        log_text = applog.get_text_from_log()
+        assert "Switched to SimulatedLaserPM100" in log_text
+
+    def test_failed_switch_reopens_previous_device(self, wrapper):
+        self.read_from_device(wrapper, "SimulatedPM100")
+
+        wrapper.switch_device("SimulatedPM100", {"no_such_option": 1})
+        time.sleep(0.5)
+        result = self.read_from_device(wrapper, "SimulatedPM100")
+
+        assert wrapper.proc.is_alive()
+        assert result[1] >= 123.0
+        log_text = applog.get_text_from_log()
+        assert "Open SimulatedPM100 failed, reopen SimulatedPM100" in log_text
+
+    def test_failed_switch_keeps_previous_device_spec(self, wrapper):
+        self.read_from_device(wrapper, "SimulatedPM100")
+
+        assert wrapper.switch_device("SimulatedLaserPM100",
+                                     {"no_such_option": 1}) == True
+        assert wrapper.device_name == "SimulatedPM100"
+        assert wrapper.switch_pending == "SimulatedLaserPM100"
+
+        assert self.wait_for_state(wrapper, "running")
+        start_time = time.time()
+        while wrapper.switch_pending is not None \
+              and time.time() - start_time < 5.0:
+            wrapper.read(timeout=0.1)
+            wrapper.poll_state()
+
+        assert wrapper.switch_pending is None
+        assert wrapper.device_name == "SimulatedPM100"
+        assert wrapper.device_kwargs == {}
+        assert "Switch to SimulatedLaserPM100 failed" in wrapper.state_detail
+
+        # A respawn opens the device that is still running
+        wrapper.proc.terminate()
+        wrapper.proc.join()
+        assert self.wait_for_state(wrapper, "restarting")
+        assert self.wait_for_state(wrapper, "running")
+        assert self.read_from_device(wrapper, "SimulatedPM100")[1] >= 123.0
+
+    def test_switch_confirmed_by_process(self, wrapper):
+        self.read_from_device(wrapper, "SimulatedPM100")
+
+        kwargs = {"sample_rate": 1000, "seed": 1}
+        wrapper.switch_device("SimulatedLaserPM100", kwargs)
+        self.read_from_device(wrapper, "SimulatedLaserPM100")
+        wrapper.poll_state()
+
+        assert wrapper.device_name == "SimulatedLaserPM100"
+        assert wrapper.device_kwargs == kwargs
+        assert wrapper.switch_pending is None
+
+    def wait_for_state(self, sub_proc, state, timeout=5.0):
+        start_time = time.time()
+        while time.time() - start_time < timeout:
+            sub_proc.read(timeout=0.1)
+            if sub_proc.poll_state() == state:
+                return True
+        return False
+
+    def test_unplugged_device_reopened_with_backoff(self, request, tmpdir):
+        assert applog.delete_log_file_if_exists() == True
+
+        unplug_file = str(tmpdir.join("unplugged"))
+        main_logger = applog.MainLogger()
+        sub_proc = wrapper.SubProcess(main_logger.log_queue,
+                                      device_name="SimulatedUnplugPM100",
+                                      device_kwargs={"unplug_file":
+                                                     unplug_file},
+                                      max_backoff=0.2)
+
+        def close_sub_proc():
+            sub_proc.close()
+            main_logger.close()
+            applog.explicit_log_close()
+        request.addfinalizer(close_sub_proc)
+
+        assert self.wait_for_state(sub_proc, "running")
+
+        open(unplug_file, "w").close()
+        assert self.wait_for_state(sub_proc, "reconnecting")
+        assert "Meter unplugged" in sub_proc.state_detail
+        pid = sub_proc.proc.pid
+
+        os.remove(unplug_file)
+        assert self.wait_for_state(sub_proc, "running")
+        assert self.read_while_none(sub_proc, timeout=2.0)[1] >= 123.0
+        assert sub_proc.proc.pid == pid
+
+        sub_proc.close()
+        assert sub_proc.report["exceptions"] >= 1
+
+    def test_dead_process_respawned(self, wrapper):
+        first_pid = wrapper.proc.pid
+        wrapper.proc.terminate()
+        wrapper.proc.join()
+
+        assert self.wait_for_state(wrapper, "restarting")
+        assert wrapper.proc.pid != first_pid
+        assert wrapper.restarts == 1
+        assert self.wait_for_state(wrapper, "running")
+        assert self.read_while_none(wrapper, timeout=2.0)[1] >= 123.0
+
+    def test_read_count_continues_after_respawn(self, wrapper):
+        before = self.read_while_none(wrapper, timeout=2.0)[0]
+        assert before > 0
+        wrapper.proc.terminate()
+        wrapper.proc.join()
+
+        assert self.wait_for_state(wrapper, "restarting")
+        assert self.wait_for_state(wrapper, "running")
+        after = self.read_while_none(wrapper, timeout=2.0)[0]
+        assert after > before
+
+    def test_no_respawn_when_disabled(self, request):
+        main_logger = applog.MainLogger()
+        sub_proc = wrapper.SubProcess(main_logger.log_queue, respawn=False)
+
+        def close_sub_proc():
+            sub_proc.close()
+            main_logger.close()
+            applog.explicit_log_close()
+        request.addfinalizer(close_sub_proc)
+
+        sub_proc.proc.terminate()
+        sub_proc.proc.join()
+        time.sleep(1.1)
+        assert sub_proc.read() is None
+        assert not sub_proc.proc.is_alive()
+
     def test_queue_manual_empty_for_increased_coverage(self):
         """ Manually setup the wrapper process, then change the queue state
         manually to induce exception.
@@ -183,3 +453,94 @@ class TestWrapper:
 
         main_logger.close()
         applog.explicit_log_close()
+
+
+@pytest.mark.skipif(pytest.config.getoption("--appveyor"),
+                    reason="need --appveyor option to disable tests")
+class TestThreadedWrapper:
+
+    @pytest.fixture(scope="function")
+    def threaded(self, request):
+        assert applog.delete_log_file_if_exists() == True
+
+        main_logger = applog.MainLogger()
+        sub_proc = wrapper.create(main_logger.log_queue, backend="thread")
+
+        def close_sub_proc():
+            sub_proc.close()
+            main_logger.close()
+            applog.explicit_log_close()
+        request.addfinalizer(close_sub_proc)
+        return sub_proc
+
+    def read_from_device(self, sub_proc, device_name, timeout=5.0):
+        start_time = time.time()
+        while time.time() - start_time < timeout:
+            result = sub_proc.read(timeout=0.1)
+            if result is not None and result[2]["device"] == device_name:
+                return result
+        raise NameError("No result from %s" % device_name)
+
+    def test_backend_selection(self):
+        assert wrapper.backend_class("SimulatedPM100") == wrapper.SubProcess
+        assert wrapper.backend_class("SimulatedPM100", "thread") \
+            == wrapper.ThreadedSubProcess
+        assert wrapper.backend_class("SimulatedPM100", "auto") \
+            == wrapper.SubProcess
+        assert wrapper.backend_class("TriValueZMQ", "auto") \
+            == wrapper.ThreadedSubProcess
+        assert wrapper.backend_class("ThorlabsMeter", "auto") \
+            == wrapper.ThreadedSubProcess
+
+        with pytest.raises(ValueError):
+            wrapper.backend_class("SimulatedPM100", "fiber")
+
+    def test_read_from_thread(self, threaded):
+        assert isinstance(threaded, wrapper.ThreadedSubProcess)
+        result = self.read_from_device(threaded, "SimulatedPM100")
+        assert result[1] >= 123.0
+        assert threaded.proc.is_alive()
+        assert threaded.poll_state() == "running"
+
+    def test_batches_from_thread(self, request):
+        main_logger = applog.MainLogger()
+        sub_proc = wrapper.create(main_logger.log_queue, backend="thread",
+                                  batch_size=100)
+
+        def close_sub_proc():
+            sub_proc.close()
+            main_logger.close()
+            applog.explicit_log_close()
+        request.addfinalizer(close_sub_proc)
+
+        result = sub_proc.read(timeout=2.0)
+        timestamps, values = result[1]
+        assert len(timestamps) == values.shape[0]
+        assert values.shape[1] == 1
+        assert numpy.all(numpy.diff(timestamps) >= 0)
+
+    def test_switch_device_on_thread(self, threaded):
+        self.read_from_device(threaded, "SimulatedPM100")
+
+        kwargs = {"sample_rate": 1000, "seed": 1}
+        assert threaded.switch_device("SimulatedLaserPM100", kwargs) == True
+        self.read_from_device(threaded, "SimulatedLaserPM100")
+        assert threaded.device_name == "SimulatedLaserPM100"
+
+    def test_failed_switch_on_thread_keeps_device(self, threaded):
+        self.read_from_device(threaded, "SimulatedPM100")
+
+        threaded.switch_device("SimulatedLaserPM100", {"no_such_option": 1})
+        time.sleep(0.5)
+        result = self.read_from_device(threaded, "SimulatedPM100")
+
+        assert threaded.device_name == "SimulatedPM100"
+        assert result[1] >= 123.0
+
+    def test_close_stops_thread_with_report(self, threaded):
+        self.read_from_device(threaded, "SimulatedPM100")
+        threaded.close()
+
+        assert not threaded.proc.is_alive()
+        assert threaded.report["reads"] > 0
+        assert threaded.report["device"] == "SimulatedPM100"
@@ -3,14 +3,16 @@ thorlabs pm100 usb.
 """
 
 import zmq
+import math
 import time
 import pytest
+import threading
 
 from multiprocessing import Process
 
 from PySide import QtCore, QtTest
 
-from fastpm100 import applog, devices
+from fastpm100 import applog, devices, loadgen
 
 @pytest.mark.skipif(not pytest.config.getoption("--network"),
                     reason="need --network option to run")
@@ -103,3 +105,111 @@ class TestAllZMQReads():
 
         print "Full read: %s" % device.read()
         applog.explicit_log_close()
+
+
+@pytest.mark.skipif(pytest.config.getoption("--appveyor"),
+                    reason="need --appveyor option to disable tests")
+class TestZMQSequenceAccounting():
+    """ Publish from a local load generator, so no external publisher is
+    required.
+    """
+    def test_all_values_stream_has_no_losses(self, caplog):
+        generator = loadgen.LoadGenerator(port="6561", rate=1000, seed=1)
+        device = devices.AllValueZMQ(port="6561")
+
+        publisher = threading.Thread(target=generator.run,
+                                     kwargs={"duration": 1.0})
+        publisher.start()
+
+        for count in range(500):
+            values = device.read()
+            assert len(values) == 6
+
+        publisher.join()
+        generator.close()
+
+        stats = device.stats()
+        assert stats["received"] == 500
+        assert stats["lost"] == 0
+        assert stats["duplicated"] == 0
+        applog.explicit_log_close()
+
+    def test_conflated_slow_subscriber_stays_current(self, caplog):
+        generator = loadgen.LoadGenerator(port="6562", rate=2000, seed=1)
+        device = devices.AllValueZMQ(port="6562", conflate=True, rcvhwm=10)
+
+        publisher = threading.Thread(target=generator.run,
+                                     kwargs={"duration": 1.0})
+        publisher.start()
+
+        for count in range(50):
+            values = device.read()
+            time.sleep(0.01)
+
+        publisher.join()
+        generator.close()
+
+        # Messages published while sleeping are dropped, not queued
+        stats = device.stats()
+        assert stats["lost"] >= 100
+        assert stats["latency_max"] <= 100.0
+        assert stats["memory"] > 0
+        applog.explicit_log_close()
+
+    def test_latency_of_the_latest_second_however_often_read(self):
+        device = devices.AllValueZMQ(port="6564")
+        device.account(1, time.time() - 0.010)
+        first = device.stats()
+        assert first["latency"] >= 10.0
+        assert device.stats()["latency"] == first["latency"]
+
+        # A whole second later the period ends with a slower message
+        device.account(2, time.time() - 0.050)
+        device.latency_time -= 1.0
+        period = device.stats()
+        assert period["latency_max"] >= 50.0
+
+        device.account(3, time.time())
+        assert device.stats()["latency"] == period["latency"]
+        assert device.stats()["latency_max"] == period["latency_max"]
+        applog.explicit_log_close()
+
+    def test_publisher_restart_is_a_gap_then_recovers(self, caplog):
+        generator = loadgen.LoadGenerator(port="6563", rate=1000, seed=1)
+        device = devices.AllValueZMQ(port="6563", receive_timeout=100,
+                                     heartbeat_timeout=0.5)
+
+        publisher = threading.Thread(target=generator.run,
+                                     kwargs={"duration": 0.5})
+        publisher.start()
+        publisher.join()
+        generator.close()
+
+        # Drain the queued messages, then the outage shows up as NaN
+        values = device.read()
+        while not math.isnan(values[0]):
+            values = device.read()
+        assert len(values) == 6
+
+        time.sleep(0.5)
+        values = device.read()
+        assert device.stats()["reconnects"] >= 1
+
+        generator = loadgen.LoadGenerator(port="6563", rate=1000, seed=1)
+        publisher = threading.Thread(target=generator.run,
+                                     kwargs={"duration": 2.0})
+        publisher.start()
+
+        values = device.read()
+        start_time = time.time()
+        while math.isnan(values[0]) and time.time() - start_time < 2.0:
+            values = device.read()
+
+        publisher.join()
+        generator.close()
+
+        assert not math.isnan(values[0])
+        stats = device.stats()
+        assert stats["timeouts"] >= 1
+        assert stats["restarts"] == 0
+        applog.explicit_log_close()
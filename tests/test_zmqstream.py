@@ -0,0 +1,145 @@
+""" Encoding and decoding of the text and binary zmq message formats shared
+by the load generator and the zmq devices.
+"""
+
+import pytest
+
+from fastpm100 import zmqstream
+
+
+class TestMessageFormats:
+
+    def test_plain_text_matches_original_format(self):
+        message = zmqstream.encode_text("temperatures_and_power", [1.0, 2.5])
+        assert message == "temperatures_and_power 1.0000,2.5000"
+
+        values, sequence, send_time = zmqstream.decode(message)
+        assert values == [1.0, 2.5]
+        assert sequence == None
+        assert send_time == None
+
+    def test_text_with_sequence_keeps_values_field_first(self):
+        message = zmqstream.encode_text("temps", [1.0, 2.5], 7, 12.5)
+
+        # Existing subscribers only look at the second space delimited field
+        assert message.split(" ")[1] == "1.0000,2.5000"
+
+        values, sequence, send_time = zmqstream.decode(message)
+        assert values == [1.0, 2.5]
+        assert sequence == 7
+        assert send_time == 12.5
+
+    def test_binary_round_trip(self):
+        message = zmqstream.encode_binary("temps", [1.0, 2.5, -3.0], 9, 1.5)
+        assert message.startswith("temps ")
+
+        values, sequence, send_time = zmqstream.decode(message)
+        assert values == [1.0, 2.5, -3.0]
+        assert sequence == 9
+        assert send_time == 1.5
+
+
+    def test_batch_round_trip(self):
+        message = zmqstream.encode_batch("fastpm100", 3, [1.0, 2.0],
+                                         [[1.0, 2.0], [3.0, 4.0]])
+
+        timestamps, values, sequence = zmqstream.decode_batch(message)
+        assert timestamps.tolist() == [1.0, 2.0]
+        assert values.tolist() == [[1.0, 2.0], [3.0, 4.0]]
+        assert sequence == 3
+
+    def test_batch_decodes_as_last_sample(self):
+        message = zmqstream.encode_batch("fastpm100", 3, [1.0, 2.0],
+                                         [5.0, 6.0])
+
+        values, sequence, send_time = zmqstream.decode(message)
+        assert values == [6.0]
+        assert sequence == 3
+        assert send_time == 2.0
+
+
+class TestSequenceTracker:
+
+    def test_in_order_stream_has_no_errors(self):
+        tracker = zmqstream.SequenceTracker()
+        for sequence in range(100):
+            tracker.update(sequence)
+
+        stats = tracker.stats()
+        assert stats["received"] == 100
+        assert stats["lost"] == 0
+        assert stats["duplicated"] == 0
+        assert stats["out_of_order"] == 0
+
+    def test_gaps_duplicates_and_reordering(self):
+        tracker = zmqstream.SequenceTracker()
+        for sequence in [0, 1, 4, 4, 2, 5]:
+            tracker.update(sequence)
+
+        stats = tracker.stats()
+        assert stats["lost"] == 1 # 3 never arrives, 2 arrives late
+        assert stats["duplicated"] == 1
+        assert stats["out_of_order"] == 1
+
+    def test_publisher_restart_is_not_reordering(self):
+        tracker = zmqstream.SequenceTracker(window=10)
+        for sequence in range(1000, 1100):
+            tracker.update(sequence)
+        for sequence in range(5):
+            tracker.update(sequence)
+
+        stats = tracker.stats()
+        assert stats["restarts"] == 1
+        assert stats["out_of_order"] == 0
+        assert stats["lost"] == 0
+
+    def test_restart_within_the_window(self):
+        tracker = zmqstream.SequenceTracker()
+        for sequence in range(50):
+            tracker.update(sequence)
+        for sequence in [0, 1, 2, 4, 5]:
+            tracker.update(sequence)
+
+        stats = tracker.stats()
+        assert stats["restarts"] == 1
+        assert stats["duplicated"] == 0
+        assert stats["out_of_order"] == 0
+        # The loss after the restart is still counted
+        assert stats["lost"] == 1
+
+    def test_restart_with_slow_joiner_loss(self):
+        tracker = zmqstream.SequenceTracker()
+        for sequence in range(50):
+            tracker.update(sequence)
+        for sequence in [30, 31, 32]:
+            tracker.update(sequence)
+
+        stats = tracker.stats()
+        assert stats["restarts"] == 1
+        assert stats["duplicated"] == 0
+        assert stats["out_of_order"] == 0
+        assert stats["lost"] == 0
+
+    def test_late_message_within_max_reorder(self):
+        tracker = zmqstream.SequenceTracker(max_reorder=16)
+        for sequence in range(100):
+            if sequence != 90:
+                tracker.update(sequence)
+        tracker.update(90)
+        tracker.update(99)
+
+        stats = tracker.stats()
+        assert stats["restarts"] == 0
+        assert stats["out_of_order"] == 1
+        assert stats["duplicated"] == 1
+        assert stats["lost"] == 0
+
+    def test_early_reordering_is_not_a_restart(self):
+        tracker = zmqstream.SequenceTracker()
+        for sequence in [0, 1, 3, 4, 2, 5]:
+            tracker.update(sequence)
+
+        stats = tracker.stats()
+        assert stats["restarts"] == 0
+        assert stats["out_of_order"] == 1
+        assert stats["lost"] == 0
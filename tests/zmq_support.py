@@ -6,6 +6,8 @@ import zmq
 import time
 import random
 
+from fastpm100 import zmqstream
+
 context = zmq.Context()
 socket = context.socket(zmq.PUB)
 port = "6545"
@@ -30,12 +32,9 @@ while power_simulate < max_iterations:
     # First generation laser temp and power only
     #str_mesg = ("%s 1,%s,%s" % (topic, ltemp_simulate, power_simulate))
 
-    # All six values
-    str_mesg = ("%s %s,%s,%s,%s,%s,%s" \
-                % (topic, ccd_temp, laser_temp, laser_power,
-                          yellow_t, blue_t, amps
-                  )
-               )
+    # All six values, with sequence number and send time
+    values = [ccd_temp, laser_temp, laser_power, yellow_t, blue_t, amps]
+    str_mesg = zmqstream.encode_text(topic, values, power_simulate)
     print "Send %s" % str_mesg
     socket.send(str_mesg)
     power_simulate += 1